@@ -0,0 +1,366 @@
+"""
+Admission control for the upload endpoints.
+
+A request is admitted only if:
+- its client still has a token in its rate-limit bucket (else 429)
+- a slot is free under the global in-flight cap (else it waits briefly
+  in its priority lane, then 503)
+- its upload fits in the memory budget for buffered bodies (else 503)
+
+Interactive uploads are served ahead of batch work when slots free up,
+and batch work may only use part of the slots, so a large batch can't
+crowd out single uploads.
+
+Rate limits are per client, and the client is the peer address. Behind a
+reverse proxy every request comes from the proxy, so with the defaults
+(RATE_LIMIT_PER_MINUTE=30, RATE_LIMIT_BURST=10) all users would share one
+bucket. Set ADMISSION_TRUST_FORWARDED=true and list the proxy addresses in
+ADMISSION_TRUSTED_PROXIES (IPs or CIDRs, comma-separated) to key buckets by
+the X-Forwarded-For client instead; docker-compose.yml does this for the
+frontend's proxy.
+
+Counters and buckets go through an AdmissionStore. The default keeps
+them in process. With ADMISSION_STORE=database the rate-limit buckets
+live in the application database instead, so every worker process
+enforces the same per-client limit.
+"""
+import os
+import time
+import ipaddress
+import heapq
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, delete, case
+from sqlalchemy.dialects import sqlite, postgresql
+from database import async_session, engine, RateLimitBucket
+from metrics import Counter
+
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+# Fraction of the in-flight slots batch requests may hold at once
+ADMISSION_BATCH_SHARE = float(os.getenv("ADMISSION_BATCH_SHARE", "0.5"))
+ADMISSION_MEMORY_BUDGET_MB = float(os.getenv("ADMISSION_MEMORY_BUDGET_MB", "256"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true"
+# Peers whose X-Forwarded-For is believed; empty trusts every peer
+ADMISSION_TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if network.strip()
+]
+# "memory" (per process) or "database" (rate limits shared by all workers)
+ADMISSION_STORE = os.getenv("ADMISSION_STORE", "memory").lower()
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANE_PRIORITY = {INTERACTIVE: 0, BATCH: 1}
+
+ADMISSION_DECISIONS = Counter("admission_decisions_total", "Upload admission decisions", ("lane", "decision"))
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionStore(ABC):
+    """Where buckets and counters live; async so a networked store can implement it"""
+
+    @abstractmethod
+    async def take_token(self, key: str, rate_per_second: float, burst: int) -> float:
+        """Take one token from key's bucket; return 0 if taken, else seconds until one is available"""
+
+    @abstractmethod
+    async def reserve(self, name: str, amount: float, limit: float) -> bool:
+        """Add amount to counter name if it stays within limit"""
+
+    @abstractmethod
+    async def release(self, name: str, amount: float):
+        ...
+
+    @abstractmethod
+    async def usage(self, name: str) -> float:
+        ...
+
+
+class InMemoryAdmissionStore(AdmissionStore):
+    # Only touched from the event loop, so no locking is needed
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._counters: Dict[str, float] = {}
+
+    async def take_token(self, key: str, rate_per_second: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate_per_second)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            allowed = True
+        else:
+            self._buckets[key] = (tokens, now)
+            allowed = False
+        if len(self._buckets) > self.MAX_BUCKETS:
+            self._evict_full_buckets(now, rate_per_second, burst)
+        return 0.0 if allowed else (1 - tokens) / rate_per_second
+
+    def _evict_full_buckets(self, now: float, rate_per_second: float, burst: int):
+        # A bucket that has refilled completely is the same as no bucket
+        full_after = burst / rate_per_second
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+
+    async def reserve(self, name: str, amount: float, limit: float) -> bool:
+        current = self._counters.get(name, 0.0)
+        if current + amount > limit:
+            return False
+        self._counters[name] = current + amount
+        return True
+
+    async def release(self, name: str, amount: float):
+        self._counters[name] = max(0.0, self._counters.get(name, 0.0) - amount)
+
+    async def usage(self, name: str) -> float:
+        return self._counters.get(name, 0.0)
+
+
+class DatabaseAdmissionStore(InMemoryAdmissionStore):
+    """Token buckets in the rate_limit_buckets table, shared by every worker process.
+
+    In-flight slots and the memory budget stay per process: they protect
+    this process's own memory and threads, and a crashed worker must not
+    leave reservations behind.
+    """
+    # Full buckets are deleted every PRUNE_EVERY takes, by whichever worker reaches it
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        super().__init__()
+        self._takes = 0
+
+    async def take_token(self, key: str, rate_per_second: float, burst: int) -> float:
+        now = time.time()
+        self._takes += 1
+        if self._takes % self.PRUNE_EVERY == 0:
+            await self._prune_full_buckets(now, rate_per_second, burst)
+        refilled = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rate_per_second
+        capped = case((refilled > burst, float(burst)), else_=refilled)
+        async with async_session() as db:
+            await self._ensure_bucket(db, engine.dialect.name, key, burst, now)
+            # Refill and take in one statement so concurrent workers cannot both spend the last token
+            taken = await db.execute(
+                update(RateLimitBucket)
+                .where(RateLimitBucket.key == key, capped >= 1)
+                .values(tokens=capped - 1, updated_at=now)
+            )
+            if taken.rowcount == 1:
+                await db.commit()
+                return 0.0
+            tokens, updated_at = (await db.execute(
+                select(RateLimitBucket.tokens, RateLimitBucket.updated_at).where(RateLimitBucket.key == key)
+            )).one()
+            await db.commit()
+        available = min(burst, tokens + (now - updated_at) * rate_per_second)
+        return max(0.0, (1 - available) / rate_per_second)
+
+    async def _prune_full_buckets(self, now: float, rate_per_second: float, burst: int):
+        # A bucket idle long enough to refill completely is the same as no bucket
+        async with async_session() as db:
+            await db.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at <= now - burst / rate_per_second))
+            await db.commit()
+
+    async def _ensure_bucket(self, db, dialect: str, key: str, burst: int, now: float):
+        values = {"key": key, "tokens": float(burst), "updated_at": now}
+        if dialect == "postgresql":
+            stmt = postgresql.insert(RateLimitBucket).values(**values).on_conflict_do_nothing()
+        else:
+            stmt = sqlite.insert(RateLimitBucket).values(**values).on_conflict_do_nothing()
+        await db.execute(stmt)
+
+
+def build_store() -> AdmissionStore:
+    if ADMISSION_STORE == "database":
+        return DatabaseAdmissionStore()
+    if ADMISSION_STORE != "memory":
+        print(f"[WARNING] Unknown ADMISSION_STORE '{ADMISSION_STORE}', using memory")
+    return InMemoryAdmissionStore()
+
+
+class Ticket:
+    """An admitted request's reservations; release() exactly once when the response is done"""
+
+    def __init__(self, controller: "AdmissionController", lane: str, nbytes: int):
+        self.controller = controller
+        self.lane = lane
+        self.nbytes = nbytes
+        self.released = False
+
+    async def release(self):
+        if not self.released:
+            self.released = True
+            await self.controller._release(self)
+
+
+class AdmissionController:
+    def __init__(self, store: Optional[AdmissionStore] = None, rate_per_minute: float = RATE_LIMIT_PER_MINUTE,
+                 burst: int = RATE_LIMIT_BURST, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 batch_share: float = ADMISSION_BATCH_SHARE, memory_budget_bytes: int = int(ADMISSION_MEMORY_BUDGET_MB * 1024 * 1024),
+                 max_wait: float = ADMISSION_MAX_WAIT_SECONDS):
+        self.store = store or build_store()
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.batch_limit = max(1, int(max_in_flight * batch_share))
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_wait = max_wait
+        # (lane priority, arrival order, lane, future) waiting for a slot
+        self._waiters: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    async def admit(self, client: str, lane: str, nbytes: int) -> Ticket:
+        """Return a Ticket, or raise Rejected with the status code and Retry-After to send"""
+        if self.rate_per_second > 0:
+            wait = await self.store.take_token(f"rate:{client}", self.rate_per_second, self.burst)
+            if wait > 0:
+                self._decide(lane, "rate_limited")
+                raise Rejected(429, "Rate limit exceeded; slow down", max(1, int(wait + 0.999)))
+
+        # A single upload larger than the whole budget is still admitted when nothing else is buffered
+        nbytes = min(nbytes, self.memory_budget_bytes)
+        if not await self.store.reserve("memory", nbytes, self.memory_budget_bytes):
+            self._decide(lane, "memory_full")
+            raise Rejected(503, "Server is buffering too many uploads; try again shortly", ADMISSION_RETRY_AFTER_SECONDS)
+
+        try:
+            await self._acquire_slot(lane)
+        except BaseException:
+            await self.store.release("memory", nbytes)
+            raise
+        self._decide(lane, "admitted")
+        return Ticket(self, lane, nbytes)
+
+    async def _try_slot(self, lane: str) -> bool:
+        if lane == BATCH and not await self.store.reserve("in_flight:batch", 1, self.batch_limit):
+            return False
+        if await self.store.reserve("in_flight", 1, self.max_in_flight):
+            return True
+        if lane == BATCH:
+            await self.store.release("in_flight:batch", 1)
+        return False
+
+    async def _acquire_slot(self, lane: str):
+        # Only jump the queue when nobody with equal or higher priority is already waiting
+        ahead = any(priority <= LANE_PRIORITY[lane] for priority, *_ in self._waiters)
+        if not ahead and await self._try_slot(lane):
+            return
+        if self.max_wait <= 0:
+            self._decide(lane, "busy")
+            raise Rejected(503, "Server is at capacity; try again shortly", ADMISSION_RETRY_AFTER_SECONDS)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (LANE_PRIORITY[lane], next(self._order), lane, future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted just as the wait ran out; keep the slot
+                return
+            future.cancel()
+            self._remove_waiter(entry)
+            self._decide(lane, "busy")
+            raise Rejected(503, "Server is at capacity; try again shortly", ADMISSION_RETRY_AFTER_SECONDS)
+        except asyncio.CancelledError:
+            # Client went away while waiting: give back a slot granted meanwhile
+            if future.done() and not future.cancelled():
+                await self._release_slot(lane)
+            else:
+                future.cancel()
+                self._remove_waiter(entry)
+            raise
+
+    def _remove_waiter(self, entry):
+        try:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+
+    async def _release(self, ticket: Ticket):
+        await self.store.release("memory", ticket.nbytes)
+        await self._release_slot(ticket.lane)
+
+    async def _release_slot(self, lane: str):
+        await self.store.release("in_flight", 1)
+        if lane == BATCH:
+            await self.store.release("in_flight:batch", 1)
+        await self._wake_waiters()
+
+    async def _wake_waiters(self):
+        # Hand free slots to waiters in priority order; a batch waiter over its
+        # share is skipped so an interactive one behind it can still go
+        skipped = []
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            _, _, lane, future = entry
+            if future.done():
+                continue
+            if await self._try_slot(lane):
+                future.set_result(True)
+                continue
+            skipped.append(entry)
+            if lane == INTERACTIVE or not await self.store.usage("in_flight") < self.max_in_flight:
+                break
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    def _decide(self, lane: str, decision: str):
+        ADMISSION_DECISIONS.inc(lane=lane, decision=decision)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": int(await self.store.usage("in_flight")),
+            "max_in_flight": self.max_in_flight,
+            "batch_in_flight": int(await self.store.usage("in_flight:batch")),
+            "batch_limit": self.batch_limit,
+            "buffered_bytes": int(await self.store.usage("memory")),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "waiting": sum(1 for *_, future in self._waiters if not future.done()),
+            "store": type(self.store).__name__,
+            "rate_limit_per_minute": self.rate_per_second * 60,
+            "rate_limit_burst": self.burst
+        }
+
+
+def is_trusted_proxy(host: str) -> bool:
+    if not ADMISSION_TRUSTED_PROXIES:
+        return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in ADMISSION_TRUSTED_PROXIES)
+
+
+def client_key(request) -> str:
+    """Who a request counts against: the X-Forwarded-For client when the peer is a trusted proxy, else the peer address"""
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for")
+    if not ADMISSION_TRUST_FORWARDED or not forwarded or not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    if not hops:
+        return peer
+    if ADMISSION_TRUSTED_PROXIES:
+        # The nearest hop that is not one of our proxies; hops left of it are whatever the client sent
+        for hop in reversed(hops):
+            if not is_trusted_proxy(hop):
+                return hop
+    return hops[0]
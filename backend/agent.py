@@ -1,31 +1,113 @@
 import os
 import base64
 import json
-from typing import Dict, Any, Optional
-from PIL import Image, ImageEnhance, ImageFilter
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union, BinaryIO, Iterator, AsyncIterator
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
 import io
 from langfuse import Langfuse
 from openai import OpenAI
 from groq import Groq
+from backends import BackendRouter, build_backends
+from http_pool import get_http_client, close_http_client, call_with_retries
+from tracing import TraceBuffer
+from translation import Translator, PhraseCache, TRANSLATION_MODEL, TRANSLATION_MAX_TOKENS
+from metrics import STAGE_SECONDS, EXTRACTIONS_IN_FLIGHT, timed_stage
+import tiling
+
+# An image can be given as a path, raw bytes or a binary file-like object
+ImageSource = Union[str, bytes, BinaryIO]
+
+
+def read_image_source(image: ImageSource) -> bytes:
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if isinstance(image, str):
+        with open(image, "rb") as image_file:
+            return image_file.read()
+    image.seek(0)
+    return image.read()
+
+
+def open_image_source(image: ImageSource) -> Image.Image:
+    if isinstance(image, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image))
+    if not isinstance(image, str):
+        image.seek(0)
+    return Image.open(image)
+
+
+def image_source_size(image: ImageSource) -> int:
+    if isinstance(image, (bytes, bytearray)):
+        return len(image)
+    if isinstance(image, str):
+        return os.path.getsize(image)
+    image.seek(0, io.SEEK_END)
+    size = image.tell()
+    image.seek(0)
+    return size
+
+
+def decode_image(image: ImageSource, max_side: int, mode: str = "RGB") -> Image.Image:
+    """Decode an upright image in the given mode with its longest side at most max_side"""
+    img = open_image_source(image)
+    
+    # For JPEGs, let the decoder downscale by a power of two while decoding
+    # instead of materialising the full-resolution bitmap
+    scale = max_side / max(img.size)
+    if scale < 1:
+        img.draft(mode, (int(img.width * scale), int(img.height * scale)))
+    img = ImageOps.exif_transpose(img)
+    
+    if img.mode != mode:
+        img = img.convert(mode)
+    
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return img
 
 
 class HandwritingExtractionAgent:
+    # Bump whenever the extraction prompt changes so cached results are not reused
+    PROMPT_VERSION = "1"
+    
     def __init__(self):
         self.langfuse_public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
         self.langfuse_secret_key = os.getenv("LANGFUSE_SECRET_KEY")
         self.langfuse_host = os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com")
         self.enable_preprocessing = os.getenv("ENABLE_IMAGE_PREPROCESSING", "true").lower() == "true"
+        self.max_image_side = int(os.getenv("IMAGE_MAX_SIDE", "1600"))
+        self.jpeg_quality = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+        
+        # Model calls are blocking HTTP requests, so they run on a bounded
+        # worker pool instead of the event loop (see extract_handwriting_async)
+        self.max_workers = int(os.getenv("EXTRACTION_WORKERS", "4"))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extraction")
+        # Tiles of one page are sent to the model concurrently (see tiling.py)
+        self.tiles_per_page = tiling.tile_count()
+        self.tile_executor = ThreadPoolExecutor(max_workers=self.max_workers * self.tiles_per_page, thread_name_prefix="tile")
+        # Tiled answers differ from whole-page ones, so they are cached separately
+        self.cache_version = self.PROMPT_VERSION
+        if tiling.tiling_enabled():
+            self.cache_version += f"+tiles:{tiling.EXTRACTION_TILES}:{tiling.TILE_ROWS}x{tiling.TILE_COLS}"
         
         self.hf_token = os.getenv("HF_TOKEN")
+        self.hf_base_url = os.getenv("HF_BASE_URL", "https://router.huggingface.co/v1")
+        self.hf_model = os.getenv("HF_MODEL", "Qwen/Qwen2.5-VL-7B-Instruct:hyperbolic")
         if self.hf_token:
+            # Retries are handled by call_with_retries so they share one deadline
             self.hf_client = OpenAI(
-                base_url="https://router.huggingface.co/v1",
+                base_url=self.hf_base_url,
                 api_key=self.hf_token,
+                http_client=get_http_client(),
+                max_retries=0,
             )
         else:
             self.hf_client = None
         
         self.langfuse: Optional[Langfuse] = None
+        self.tracer: Optional[TraceBuffer] = None
         
         if self.langfuse_public_key and self.langfuse_secret_key:
             try:
@@ -34,6 +116,8 @@ class HandwritingExtractionAgent:
                     secret_key=self.langfuse_secret_key,
                     host=self.langfuse_host
                 )
+                self.tracer = TraceBuffer(self.langfuse)
+                self.tracer.start()
                 print("[OK] Langfuse initialized successfully")
             except Exception as e:
                 print(f"[WARNING] Langfuse initialization failed: {e}")
@@ -46,32 +130,35 @@ class HandwritingExtractionAgent:
         else:
             print("[WARNING] HuggingFace token not configured")
         
+        self.vision = BackendRouter(build_backends(self.hf_client, self.hf_model),
+                                    max_workers=self.max_workers * max(2, self.tiles_per_page))
+        print(f"[OK] Vision backends: {self.vision.model_name or 'none'}")
+        
         self.groq_api_key = os.getenv("GROQ_API_KEY")
         if self.groq_api_key:
-            self.groq_client = Groq(api_key=self.groq_api_key)
+            self.groq_client = Groq(api_key=self.groq_api_key, http_client=get_http_client(), max_retries=0)
+            self.translator = Translator(self._complete_translation, PhraseCache())
             print("[OK] Groq API configured for translation")
         else:
             self.groq_client = None
+            self.translator = None
             print("[WARNING] Groq API key not configured")
     
-    def preprocess_image(self, image_path: str) -> Image.Image:
-        """Enhance image quality for better OCR accuracy"""
-        img = Image.open(image_path)
-        
-        # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Enhance contrast
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.5)
-        
-        # Enhance sharpness
-        enhancer = ImageEnhance.Sharpness(img)
-        img = enhancer.enhance(1.3)
-        
-        # Apply slight denoising
-        img = img.filter(ImageFilter.MedianFilter(size=3))
+    def preprocess_image(self, image: ImageSource) -> Image.Image:
+        """Decode, size-bound and (optionally) enhance an image in a single pass"""
+        # Downscale to what the model can use before running any filters
+        return self._enhance(decode_image(image, self.max_image_side))
+    
+    def _enhance(self, img: Image.Image) -> Image.Image:
+        if self.enable_preprocessing:
+            # Enhance contrast
+            img = ImageEnhance.Contrast(img).enhance(1.5)
+            
+            # Enhance sharpness
+            img = ImageEnhance.Sharpness(img).enhance(1.3)
+            
+            # Apply slight denoising
+            img = img.filter(ImageFilter.MedianFilter(size=3))
         
         # Resize if too small (minimum 512px on longest side for better detail)
         width, height = img.size
@@ -84,42 +171,86 @@ class HandwritingExtractionAgent:
         
         return img
     
-    def encode_image(self, image_path: str) -> str:
-        """Encode image to base64, with optional preprocessing"""
-        if self.enable_preprocessing:
-            try:
-                img = self.preprocess_image(image_path)
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=95)
-                image_bytes = buffer.getvalue()
-            except Exception as e:
-                print(f"[WARNING] Image preprocessing failed, using original: {e}")
-                with open(image_path, "rb") as image_file:
-                    image_bytes = image_file.read()
-        else:
-            with open(image_path, "rb") as image_file:
-                image_bytes = image_file.read()
+    def prepare_image(self, image: ImageSource) -> Tuple[bytes, Dict[str, Any]]:
+        """Run the preprocessing pipeline and return JPEG bytes plus size/timing stats"""
+        start = time.perf_counter()
+        original_bytes = image_source_size(image)
+        try:
+            img = self.preprocess_image(image)
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=self.jpeg_quality)
+            image_bytes = buffer.getvalue()
+            size = img.size
+        except Exception as e:
+            print(f"[WARNING] Image preprocessing failed, using original: {e}")
+            image_bytes = read_image_source(image)
+            size = None
         
+        stats = {
+            "original_bytes": original_bytes,
+            "image_bytes": len(image_bytes),
+            "payload_bytes": 4 * ((len(image_bytes) + 2) // 3),
+            "image_size": size,
+            "preprocess_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+        return image_bytes, stats
+    
+    def plan_page_tiles(self, image: ImageSource) -> Tuple[Image.Image, List[tiling.Box]]:
+        """Decode a page with enough pixels that each tile can still fill max_image_side, and cut it (see tiling.py)"""
+        page = decode_image(image, self.max_image_side * max(tiling.TILE_ROWS, tiling.TILE_COLS))
+        return page, tiling.plan_tiles(page)
+    
+    def prepare_tile(self, page: Image.Image, box: tiling.Box) -> bytes:
+        """Crop one tile and preprocess it like a whole image; returns JPEG bytes"""
+        tile = page.crop(box)
+        tile.thumbnail((self.max_image_side, self.max_image_side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        self._enhance(tile).save(buffer, format='JPEG', quality=self.jpeg_quality)
+        return buffer.getvalue()
+    
+    def encode_image(self, image: ImageSource) -> str:
+        """Encode image to base64 after running the preprocessing pipeline"""
+        image_bytes, _ = self.prepare_image(image)
         return base64.b64encode(image_bytes).decode('utf-8')
     
-    def extract_handwriting(self, image_path: str, filename: str, language: str = "English") -> Dict[str, Any]:
-        return self.extract_handwriting_huggingface(image_path, filename, language)
+    def extract_handwriting(self, image: ImageSource, filename: str, language: str = "English") -> Dict[str, Any]:
+        return self.extract_handwriting_huggingface(image, filename, language)
     
-    def extract_handwriting_huggingface(self, image_path: str, filename: str, language: str = "English") -> Dict[str, Any]:
-        """Extract handwriting using HuggingFace Qwen2.5-VL model via OpenAI API"""
-        if not self.hf_client:
-            return {
-                "success": False,
-                "filename": filename,
-                "error": "HuggingFace token not configured",
-                "message": "HF_TOKEN environment variable not set"
-            }
+    async def extract_handwriting_async(self, image: ImageSource, filename: str, language: str = "English") -> Dict[str, Any]:
+        """Run extract_handwriting on the worker pool so the event loop stays responsive.
         
-        try:
-            with open(image_path, "rb") as image_file:
-                image_data = base64.standard_b64encode(image_file.read()).decode("utf-8")
-            
-            prompt = f"""You are an expert OCR system specialized in reading handwritten text with maximum accuracy.
+        At most EXTRACTION_WORKERS extractions run at once; further calls wait for a free worker.
+        """
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        
+        def run():
+            queue_wait = time.perf_counter() - submitted
+            STAGE_SECONDS.observe(queue_wait, stage="queue")
+            with EXTRACTIONS_IN_FLIGHT.track_inprogress():
+                result = self.extract_handwriting(image, filename, language)
+            result.setdefault("timings", {})["queue_ms"] = round(queue_wait * 1000, 1)
+            return result
+        
+        return await loop.run_in_executor(self.executor, run)
+    
+    @property
+    def model_name(self) -> str:
+        return self.vision.model_name
+    
+    def shutdown(self):
+        """Stop accepting work and wait for in-flight extractions to finish"""
+        self.executor.shutdown(wait=True)
+        self.tile_executor.shutdown(wait=True)
+        self.vision.shutdown()
+        if self.translator:
+            self.translator.cache.close()
+        if self.tracer:
+            self.tracer.stop()
+        close_http_client()
+    
+    def build_prompt(self, language: str) -> str:
+        return f"""You are an expert OCR system specialized in reading handwritten text with maximum accuracy.
 
 This document is written in {language}. Please read and extract the text in {language}.
 
@@ -144,70 +275,178 @@ CRITICAL INSTRUCTIONS FOR MAXIMUM ACCURACY:
 IMPORTANT: Read slowly and carefully. Accuracy is more important than speed.
 Return ONLY valid JSON with no additional text, markdown, or explanation before or after.
 The JSON should have descriptive keys based on the actual content structure."""
-            
-            completion = self.hf_client.chat.completions.create(
-                model="Qwen/Qwen2.5-VL-7B-Instruct:hyperbolic",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_data}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-            )
-            
-            extracted_text = completion.choices[0].message.content
-            structured_data = self._parse_json_response(extracted_text)
-            
-            if language.lower() != "english" and self.groq_client:
-                try:
+    
+    def build_tile_prompt(self, language: str, number: int, count: int) -> str:
+        return self.build_prompt(language) + f"""
+
+This image is part {number} of {count} of a larger page, cut into overlapping horizontal or grid sections.
+Extract only what is in this part. Skip text that is cut off at the edges of the image; it is read in full from the neighbouring part."""
+    
+    def _no_backend_result(self, filename: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "filename": filename,
+            "error": "No vision backend configured",
+            "message": "Set HF_TOKEN, or choose backends with VISION_BACKENDS (hf, ollama, mock)"
+        }
+    
+    def _prepare_payload(self, image: ImageSource, filename: str) -> Tuple[str, Dict[str, Any]]:
+        image_bytes, preprocessing = self.prepare_image(image)
+        image_data = base64.standard_b64encode(image_bytes).decode("utf-8")
+        print(f"[OK] Prepared {filename}: {preprocessing['original_bytes']} -> {preprocessing['payload_bytes']} payload bytes "
+              f"in {preprocessing['preprocess_ms']}ms")
+        return image_data, preprocessing
+    
+    def _build_result(self, extracted_text: str, backend, filename: str, language: str, preprocessing: Dict[str, Any],
+                      timings: Dict[str, float]) -> Dict[str, Any]:
+        return self._result_from_data(self._parse_json_response(extracted_text), backend, filename, language, preprocessing, timings)
+    
+    def _result_from_data(self, structured_data: Dict[str, Any], backend, filename: str, language: str,
+                          preprocessing: Dict[str, Any], timings: Dict[str, float]) -> Dict[str, Any]:
+        if language.lower() != "english" and self.groq_client:
+            try:
+                with timed_stage("translate", timings):
                     structured_data = self._translate_json_to_english(structured_data, language)
-                except Exception as e:
-                    print(f"[WARNING] Translation failed: {e}")
-            
-            result = {
-                "success": True,
-                "filename": filename,
-                "extracted_data": structured_data,
-                "message": f"Handwriting extracted successfully using HuggingFace{' and translated to English' if language.lower() != 'english' else ''}"
-            }
-            
-            if self.langfuse:
-                try:
-                    trace = self.langfuse.trace(name="handwriting_extraction_hf")  # type: ignore
-                    trace.update(input={"filename": filename}, output=result)
-                except Exception as e:
-                    print(f"[WARNING] Langfuse trace failed: {e}")
-            
+            except Exception as e:
+                print(f"[WARNING] Translation failed: {e}")
+        
+        return {
+            "success": True,
+            "filename": filename,
+            "extracted_data": structured_data,
+            "preprocessing": preprocessing,
+            "timings": timings,
+            "backend": backend.name,
+            "message": f"Handwriting extracted successfully using {backend.label}{' and translated to English' if language.lower() != 'english' else ''}"
+        }
+    
+    def _error_result(self, error: Exception, filename: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "filename": filename,
+            "error": str(error),
+            "message": "Failed to extract handwriting using the vision backends"
+        }
+    
+    def _trace(self, name: str, filename: str, output: Dict[str, Any]):
+        # Sent to Langfuse by the tracer's background thread, never on the request path
+        if self.tracer:
+            self.tracer.record(name, {"filename": filename}, output)
+    
+    def extract_handwriting_huggingface(self, image: ImageSource, filename: str, language: str = "English") -> Dict[str, Any]:
+        """Extract handwriting through the configured vision backends (HuggingFace Qwen2.5-VL by default)"""
+        if not self.vision.backends:
+            return self._no_backend_result(filename)
+        
+        timings: Dict[str, float] = {}
+        try:
+            if self._should_tile(image):
+                result = self._extract_tiled(image, filename, language, timings)
+            else:
+                with timed_stage("preprocess", timings):
+                    image_data, preprocessing = self._prepare_payload(image, filename)
+                with timed_stage("model", timings):
+                    extracted_text, backend = self.vision.complete(self.build_prompt(language), image_data)
+                result = self._build_result(extracted_text, backend, filename, language, preprocessing, timings)
+            self._trace("handwriting_extraction_hf", filename, result)
             return result
-            
         except Exception as e:
-            error_result = {
-                "success": False,
-                "filename": filename,
-                "error": str(e),
-                "message": "Failed to extract handwriting using HuggingFace"
-            }
-            
-            if self.langfuse:
-                try:
-                    trace = self.langfuse.trace(name="handwriting_extraction_hf_error")  # type: ignore
-                    trace.update(input={"filename": filename}, output=error_result)
-                except:
-                    pass
-            
+            error_result = self._error_result(e, filename)
+            self._trace("handwriting_extraction_hf_error", filename, error_result)
             return error_result
     
+    def _should_tile(self, image: ImageSource) -> bool:
+        if not tiling.tiling_enabled():
+            return False
+        try:
+            # Only reads the header
+            return tiling.should_tile(open_image_source(image).size)
+        except Exception:
+            return False
+    
+    def _extract_tile(self, page: Image.Image, box: tiling.Box, prompt: str) -> Tuple[str, Any, int]:
+        # Each tile is sent as soon as it is ready instead of after the whole page is cut
+        tile = self.prepare_tile(page, box)
+        text, backend = self.vision.complete(prompt, base64.standard_b64encode(tile).decode("utf-8"))
+        return text, backend, len(tile)
+    
+    def _extract_tiled(self, image: ImageSource, filename: str, language: str, timings: Dict[str, float]) -> Dict[str, Any]:
+        """Extract every tile concurrently and merge the answers; a failed tile only loses its own fields"""
+        with timed_stage("preprocess", timings):
+            page, boxes = self.plan_page_tiles(image)
+        
+        with timed_stage("model", timings):
+            futures = [
+                self.tile_executor.submit(self._extract_tile, page, box, self.build_tile_prompt(language, number, len(boxes)))
+                for number, box in enumerate(boxes, 1)
+            ]
+            parts, backend, image_bytes, errors = [], None, [], []
+            for number, future in enumerate(futures, 1):
+                try:
+                    text, backend, size = future.result()
+                    parts.append(self._parse_json_response(text))
+                    image_bytes.append(size)
+                except Exception as e:
+                    print(f"[WARNING] Tile {number}/{len(boxes)} of {filename} failed: {type(e).__name__}: {e}")
+                    errors.append(e)
+        if not parts:
+            raise errors[0]
+        
+        preprocessing = {
+            "original_bytes": image_source_size(image),
+            "image_bytes": sum(image_bytes),
+            "payload_bytes": sum(4 * ((size + 2) // 3) for size in image_bytes),
+            "image_size": page.size,
+            "tiles": boxes,
+            "tiles_failed": len(errors),
+            "preprocess_ms": timings["preprocess_ms"]
+        }
+        print(f"[OK] Extracted {filename} from {len(boxes)} tiles ({len(errors)} failed), "
+              f"{preprocessing['payload_bytes']} payload bytes")
+        return self._result_from_data(tiling.merge_results(parts), backend, filename, language, preprocessing, timings)
+    
+    def stream_extraction(self, image: ImageSource, filename: str, language: str = "English") -> Iterator[Dict[str, Any]]:
+        """Yield {"type": "delta", "text": ...} events as the model answers, then one {"type": "result", ...}"""
+        if not self.vision.backends:
+            yield {"type": "result", "result": self._no_backend_result(filename)}
+            return
+        
+        timings: Dict[str, float] = {}
+        try:
+            with timed_stage("preprocess", timings):
+                image_data, preprocessing = self._prepare_payload(image, filename)
+            pieces = []
+            backend = None
+            with timed_stage("model", timings):
+                for piece, backend in self.vision.stream(self.build_prompt(language), image_data):
+                    pieces.append(piece)
+                    yield {"type": "delta", "text": piece}
+            result = self._build_result("".join(pieces), backend, filename, language, preprocessing, timings)
+            self._trace("handwriting_extraction_hf_stream", filename, result)
+        except Exception as e:
+            result = self._error_result(e, filename)
+            self._trace("handwriting_extraction_hf_error", filename, result)
+        yield {"type": "result", "result": result}
+    
+    async def stream_extraction_async(self, image: ImageSource, filename: str, language: str = "English") -> AsyncIterator[Dict[str, Any]]:
+        """stream_extraction run on the worker pool, with events handed back to the event loop"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        
+        def produce():
+            try:
+                with EXTRACTIONS_IN_FLIGHT.track_inprogress():
+                    for event in self.stream_extraction(image, filename, language):
+                        loop.call_soon_threadsafe(queue.put_nowait, event)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+        
+        producer = loop.run_in_executor(self.executor, produce)
+        while (event := await queue.get()) is not finished:
+            yield event
+        await producer
+    
     def _parse_json_response(self, text: str) -> Dict[str, Any]:
         """Parse JSON from model response, handling markdown code blocks"""
         extracted_text = text.strip()
@@ -227,37 +466,24 @@ The JSON should have descriptive keys based on the actual content structure."""
             return {"raw_text": extracted_text}
     
     def _translate_json_to_english(self, data: Dict[str, Any], source_language: str) -> Dict[str, Any]:
-        """Recursively translate JSON keys and string values to English using Groq API"""
-        if not self.groq_client:
+        """Translate JSON keys and string values to English, sending only uncached phrases to Groq"""
+        if not self.translator:
             return data
         
-        json_str = json.dumps(data, ensure_ascii=False, indent=2)
-        
-        translation_prompt = f"""You are a translation assistant. Translate the following JSON from {source_language} to English.
-
-IMPORTANT RULES:
-1. Translate ONLY the keys (field names) and string values
-2. Keep all numbers, dates, and special characters unchanged
-3. Preserve the exact JSON structure
-4. Return ONLY valid JSON with no additional text before or after
-5. Do not translate values that are already partially in English
-6. If a value is "unreadable", keep it as is
-
-JSON to translate:
-{json_str}"""
-        
         try:
-            response = self.groq_client.chat.completions.create(
-                model="mixtral-8x7b-32768",
-                messages=[
-                    {"role": "user", "content": translation_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=2000
-            )
-            
-            translated_text = response.choices[0].message.content
-            return self._parse_json_response(translated_text)
+            return self.translator.translate(data, source_language)
         except Exception as e:
             print(f"[ERROR] Translation error: {e}")
             return data
+    
+    def _complete_translation(self, prompt: str) -> str:
+        response = call_with_retries(lambda timeout: self.groq_client.chat.completions.create(
+            model=TRANSLATION_MODEL,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=TRANSLATION_MAX_TOKENS,
+            timeout=timeout
+        ))
+        return response.choices[0].message.content
@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from http_pool import get_http_client, call_with_retries
+
+VISION_CIRCUIT_FAILURES = int(os.getenv("VISION_CIRCUIT_FAILURES", "5"))
+VISION_CIRCUIT_RESET_SECONDS = float(os.getenv("VISION_CIRCUIT_RESET_SECONDS", "30"))
+# 0 disables hedging; otherwise start the next backend if the current one
+# has not answered after this many seconds
+VISION_HEDGE_AFTER_SECONDS = float(os.getenv("VISION_HEDGE_AFTER_SECONDS", "0"))
+
+
+class BackendUnavailableError(Exception):
+    pass
+
+
+class VisionBackend(ABC):
+    """A vision-language model that turns a prompt plus a JPEG image into text"""
+
+    name: str = "backend"
+    label: str = "vision backend"
+    model: str = ""
+
+    @abstractmethod
+    def complete(self, prompt: str, image_b64: str) -> str:
+        ...
+
+    def stream(self, prompt: str, image_b64: str) -> Iterator[str]:
+        """Yield the answer in pieces as the model produces it; one piece by default"""
+        yield self.complete(prompt, image_b64)
+
+
+class HFRouterBackend(VisionBackend):
+    name = "hf"
+    label = "HuggingFace"
+
+    def __init__(self, client, model: str):
+        self.client = client
+        self.model = model
+
+    def _messages(self, prompt: str, image_b64: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_b64}"
+                        }
+                    }
+                ]
+            }
+        ]
+
+    def complete(self, prompt: str, image_b64: str) -> str:
+        completion = call_with_retries(lambda timeout: self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(prompt, image_b64),
+            timeout=timeout,
+        ))
+        return completion.choices[0].message.content
+
+    def stream(self, prompt: str, image_b64: str) -> Iterator[str]:
+        # Only opening the stream is retried; once tokens flow a failure is final
+        chunks = call_with_retries(lambda timeout: self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(prompt, image_b64),
+            stream=True,
+            timeout=timeout,
+        ))
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class OllamaBackend(VisionBackend):
+    name = "ollama"
+    label = "Ollama"
+
+    def __init__(self):
+        self.host = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+        self.model = os.getenv("OLLAMA_MODEL", "llava")
+        self.timeout = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))
+        self.temperature = float(os.getenv("OLLAMA_TEMPERATURE", "0.1"))
+        self.num_predict = int(os.getenv("OLLAMA_NUM_PREDICT", "2048"))
+        self.client = get_http_client()
+
+    def _payload(self, prompt: str, image_b64: str, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt, "images": [image_b64]}],
+            "stream": stream,
+            "options": {"temperature": self.temperature, "num_predict": self.num_predict}
+        }
+
+    def complete(self, prompt: str, image_b64: str) -> str:
+        def post(timeout: float):
+            response = self.client.post(f"{self.host}/api/chat", json=self._payload(prompt, image_b64, False), timeout=timeout)
+            response.raise_for_status()
+            return response.json()["message"]["content"]
+
+        return call_with_retries(post, deadline=self.timeout)
+
+    def stream(self, prompt: str, image_b64: str) -> Iterator[str]:
+        with self.client.stream("POST", f"{self.host}/api/chat", json=self._payload(prompt, image_b64, True),
+                                timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                content = message.get("message", {}).get("content")
+                if content:
+                    yield content
+                if message.get("done"):
+                    break
+
+
+class MockBackend(VisionBackend):
+    """Deterministic offline stand-in: the same image always yields the same JSON"""
+
+    name = "mock"
+    label = "mock backend"
+    model = "mock"
+
+    def __init__(self):
+        self.latency = float(os.getenv("MOCK_BACKEND_LATENCY", "0"))
+
+    def complete(self, prompt: str, image_b64: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(image_b64)
+
+    def stream(self, prompt: str, image_b64: str) -> Iterator[str]:
+        answer = self._answer(image_b64)
+        step = max(1, len(answer) // 8)
+        for i in range(0, len(answer), step):
+            if self.latency:
+                time.sleep(self.latency / 8)
+            yield answer[i:i + step]
+
+    def _answer(self, image_b64: str) -> str:
+        digest = hashlib.sha256(image_b64.encode("ascii")).hexdigest()
+        return json.dumps({
+            "Document ID": digest[:12],
+            "Name": "Jane Doe",
+            "Date": "2024-01-15",
+            "Policy Number": f"PN-{int(digest[12:18], 16) % 1000000:06d}"
+        })
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after the reset timeout"""
+
+    def __init__(self, failure_threshold: int = VISION_CIRCUIT_FAILURES, reset_timeout: float = VISION_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half_open":
+                # Only one trial call until it reports back
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class BackendStats:
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.latencies.append(latency)
+            else:
+                self.failures += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BackendRouter:
+    """Calls backends in priority order with circuit breaking, failover and optional hedging"""
+
+    def __init__(self, backends: List[VisionBackend], hedge_after: float = VISION_HEDGE_AFTER_SECONDS, max_workers: int = 8):
+        self.backends = backends
+        self.hedge_after = hedge_after
+        self.breakers = {backend.name: CircuitBreaker() for backend in backends}
+        self.stats_by_backend = {backend.name: BackendStats() for backend in backends}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vision-backend")
+
+    @property
+    def model_name(self) -> str:
+        return "+".join(f"{backend.name}:{backend.model}" for backend in self.backends)
+
+    def _call(self, backend: VisionBackend, prompt: str, image_b64: str) -> str:
+        start = time.perf_counter()
+        try:
+            text = backend.complete(prompt, image_b64)
+        except Exception:
+            self.stats_by_backend[backend.name].record(time.perf_counter() - start, ok=False)
+            self.breakers[backend.name].record_failure()
+            raise
+        self.stats_by_backend[backend.name].record(time.perf_counter() - start, ok=True)
+        self.breakers[backend.name].record_success()
+        return text
+
+    def complete(self, prompt: str, image_b64: str) -> Tuple[str, VisionBackend]:
+        """Return (text, backend) from the first backend to answer successfully"""
+        remaining = list(self.backends)
+        pending: Dict[Any, VisionBackend] = {}
+        last_error: Optional[Exception] = None
+
+        def start_next() -> bool:
+            # Breakers are consulted lazily so a half-open backend is only
+            # marked as trialled when a call is actually made
+            while remaining:
+                backend = remaining.pop(0)
+                if self.breakers[backend.name].allow():
+                    pending[self.executor.submit(self._call, backend, prompt, image_b64)] = backend
+                    return True
+            return False
+
+        if not start_next():
+            raise BackendUnavailableError("No vision backend available (all circuits open or none configured)")
+
+        while pending:
+            hedge_after = self.hedge_after if self.hedge_after > 0 and remaining else None
+            done, _ = wait(list(pending), timeout=hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slow answer: hedge with the next backend and take whichever finishes first
+                start_next()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    return future.result(), backend
+                except Exception as e:
+                    print(f"[WARNING] Vision backend '{backend.name}' failed: {type(e).__name__}: {e}")
+                    last_error = e
+            if not pending:
+                start_next()
+
+        raise last_error or BackendUnavailableError("All vision backends failed")
+
+    def stream(self, prompt: str, image_b64: str) -> Iterator[Tuple[str, VisionBackend]]:
+        """Yield (piece, backend) from the first backend that starts streaming.
+
+        Failover only happens before the first piece arrives; hedging is not
+        used because two streams cannot be merged.
+        """
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            if not self.breakers[backend.name].allow():
+                continue
+            start = time.perf_counter()
+            started = False
+            try:
+                for piece in backend.stream(prompt, image_b64):
+                    started = True
+                    yield piece, backend
+            except Exception as e:
+                self.stats_by_backend[backend.name].record(time.perf_counter() - start, ok=False)
+                self.breakers[backend.name].record_failure()
+                if started:
+                    raise
+                print(f"[WARNING] Vision backend '{backend.name}' failed to stream: {type(e).__name__}: {e}")
+                last_error = e
+                continue
+            self.stats_by_backend[backend.name].record(time.perf_counter() - start, ok=True)
+            self.breakers[backend.name].record_success()
+            return
+        raise last_error or BackendUnavailableError("No vision backend available (all circuits open or none configured)")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        report = []
+        for backend in self.backends:
+            stats = self.stats_by_backend[backend.name]
+            p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+            report.append({
+                "name": backend.name,
+                "model": backend.model,
+                "circuit": self.breakers[backend.name].state,
+                "successes": stats.successes,
+                "failures": stats.failures,
+                "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+            })
+        return report
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def build_backends(hf_client, hf_model: str) -> List[VisionBackend]:
+    """Build backends in the order given by VISION_BACKENDS (e.g. "hf,ollama" or "mock")"""
+    names = [name.strip().lower() for name in os.getenv("VISION_BACKENDS", "hf").split(",") if name.strip()]
+    backends: List[VisionBackend] = []
+    for name in names:
+        if name == "hf":
+            if hf_client:
+                backends.append(HFRouterBackend(hf_client, hf_model))
+            else:
+                print("[WARNING] VISION_BACKENDS includes 'hf' but HF_TOKEN is not set; skipping")
+        elif name == "ollama":
+            backends.append(OllamaBackend())
+        elif name == "mock":
+            backends.append(MockBackend())
+        else:
+            print(f"[WARNING] Unknown vision backend '{name}' ignored")
+    return backends
@@ -0,0 +1,120 @@
+"""
+Bytes and time for a client to stay in sync with GET /forms: reloading every
+page, revalidating the pages it has with If-None-Match, and following
+/forms/changes (changes.py).
+
+The server is filled with --rows forms; after --edits updates and deletes
+each strategy brings a client that held the previous state up to date.
+
+Usage (from the backend directory):
+    python benchmarks/bench_changes.py --rows 100000 --edits 0,10,100,1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+from bench_storage import start_server, stop, fill
+from bench_workers import free_port, wait_until_ready
+
+
+async def reload_all(client, page_size):
+    """Every page, unconditionally; returns (bytes, requests, etags per page)"""
+    received, requests, etags, cursor = 0, 0, [], None
+    while True:
+        params = {"limit": page_size, "sort": "id", **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/forms", params=params)
+        received += len(response.content)
+        requests += 1
+        etags.append((params, response.headers["etag"]))
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return received, requests, etags
+
+
+async def revalidate(client, etags):
+    """Repeat every page with If-None-Match; unchanged pages cost a 304"""
+    received = 0
+    for params, etag in etags:
+        response = await client.get("/forms", params=params, headers={"If-None-Match": etag})
+        received += len(response.content)
+    return received, len(etags)
+
+
+async def follow(client, since, page_size):
+    received, requests, more = 0, 0, True
+    while more:
+        response = await client.get("/forms/changes", params={"since": since, "limit": page_size})
+        received += len(response.content)
+        requests += 1
+        body = response.json()
+        since, more = body["version"], body["more"]
+    return received, requests
+
+
+async def edit(client, ids, count):
+    for form_id in random.sample(ids, count):
+        if random.random() < 0.8:
+            await client.put(f"/forms/{form_id}", json={"data": f'{{"edited": {random.random()}}}'})
+        else:
+            await client.delete(f"/forms/{form_id}")
+            ids.remove(form_id)
+
+
+async def run(url, rows, edit_counts, page_size):
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        ids = list(range(1, rows + 1))
+        for count in edit_counts:
+            _, _, etags = await reload_all(client, page_size)
+            version = int((await client.get("/forms", params={"limit": 1})).headers["x-forms-version"])
+            await edit(client, ids, count)
+
+            results = []
+            for name, action in (
+                ("reload", lambda: reload_all(client, page_size)),
+                ("revalidate", lambda: revalidate(client, etags)),
+                ("changes", lambda: follow(client, version, page_size)),
+            ):
+                start = time.perf_counter()
+                outcome = await action()
+                results.append((name, outcome[0], outcome[1], time.perf_counter() - start))
+            for name, received, requests, seconds in results:
+                print(f"{count:>7}  {name:<11}{received / 1e3:>10.1f}{requests:>9}{seconds * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--edits", default="0,10,100,1000")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_changes_")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = start_server(workdir, port, "text")
+    asyncio.run(wait_until_ready(url, 1))
+    stop(server)
+    fill(os.path.join(workdir, "bench.db"), args.rows, "text")
+
+    server = start_server(workdir, port, "text")
+    try:
+        asyncio.run(wait_until_ready(url, 1))
+        random.seed(0)
+        print(f"{args.rows} rows, pages of {args.page_size}\n")
+        print(f"{'edits':>7}  {'strategy':<11}{'KB':>10}{'requests':>9}{'ms':>10}")
+        asyncio.run(run(url, args.rows, [int(n) for n in args.edits.split(",")], args.page_size))
+    finally:
+        stop(server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Concurrent upload benchmark against the local stub model server.
+
+Fires N extractions at once through the same async path /upload uses and,
+while they are in flight, probes the event loop the way a /health request
+would. With blocking model calls the uploads run back to back and the probe
+stalls; with the worker pool they overlap and the probe stays fast.
+
+Usage (from the backend directory):
+    python benchmarks/bench_concurrent_uploads.py --uploads 8 --latency 0.5
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from stub_server import start_stub_server, stub_base_url
+
+
+def make_sample_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 900), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+async def probe_event_loop(stop: asyncio.Event, delays: list):
+    """Measure how late a trivial coroutine gets scheduled (what /health would see)"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        delays.append(time.perf_counter() - start - 0.01)
+
+
+async def run(args):
+    server = start_stub_server(args.latency)
+    os.environ["HF_TOKEN"] = "stub"
+    os.environ["HF_BASE_URL"] = stub_base_url(server)
+    os.environ["EXTRACTION_WORKERS"] = str(args.workers)
+    os.environ.setdefault("ENABLE_IMAGE_PREPROCESSING", "false")
+
+    from agent import HandwritingExtractionAgent
+    agent = HandwritingExtractionAgent()
+
+    image = make_sample_image()
+
+    stop = asyncio.Event()
+    delays = []
+    probe = asyncio.create_task(probe_event_loop(stop, delays))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        agent.extract_handwriting_async(image, f"form_{i}.jpg")
+        for i in range(args.uploads)
+    ])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+
+    agent.shutdown()
+    server.shutdown()
+
+    ok = sum(1 for r in results if r["success"])
+    serial = args.uploads * args.latency
+    print(f"Uploads:             {args.uploads} ({ok} succeeded)")
+    print(f"Workers:             {args.workers}")
+    print(f"Model latency:       {args.latency:.2f}s")
+    print(f"Wall time:           {elapsed:.2f}s (serial would be ~{serial:.2f}s)")
+    print(f"Overlap factor:      {serial / elapsed:.1f}x")
+    print(f"Max event loop lag:  {max(delays) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""
+Concurrent write throughput benchmark for the persistence layer.
+
+Runs --writers tasks that each save --rows extraction results (one commit
+per row, the way /upload saves), while a reader polls GET /forms-style
+queries. Each journal mode runs in a fresh process against a fresh
+SQLite file, so the WAL/busy_timeout settings from database.py can be
+compared with SQLite's rollback journal.
+
+Usage (from the backend directory):
+    python benchmarks/bench_db_writes.py --writers 8 --rows 50 --modes WAL,DELETE
+    DATABASE_URL=postgresql+asyncpg://... python benchmarks/bench_db_writes.py --modes default
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE_DATA = {"Name": "Jane Doe", "Date": "2024-01-15", "Policy Number": "PN-000123"}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_once(args):
+    from sqlalchemy import select, func
+    from database import init_db, async_session, engine, ExtractionResult
+
+    await init_db()
+    write_latencies = []
+    read_latencies = []
+    errors = []
+    stop = asyncio.Event()
+
+    async def writer(number):
+        for row in range(args.rows):
+            start = time.perf_counter()
+            try:
+                async with async_session() as db:
+                    db.add(ExtractionResult(filename=f"w{number}-{row}.png", json_data=json.dumps(SAMPLE_DATA), file_size=1024))
+                    await db.commit()
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            write_latencies.append(time.perf_counter() - start)
+
+    async def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            async with async_session() as db:
+                await db.execute(select(func.count(ExtractionResult.id)))
+            read_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.005)
+
+    reader_task = asyncio.create_task(reader())
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(number) for number in range(args.writers)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await reader_task
+    await engine.dispose()
+
+    return {
+        "writes": len(write_latencies),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "writes_per_s": len(write_latencies) / elapsed,
+        "write_p50_ms": percentile(write_latencies, 0.5) * 1000 if write_latencies else None,
+        "write_p95_ms": percentile(write_latencies, 0.95) * 1000 if write_latencies else None,
+        "read_p95_ms": percentile(read_latencies, 0.95) * 1000 if read_latencies else None,
+        "reads": len(read_latencies)
+    }
+
+
+def run_mode(mode: str, args) -> dict:
+    env = dict(os.environ)
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    if mode != "default":
+        env["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+        env["SQLITE_JOURNAL_MODE"] = mode
+        env["SQLITE_SYNCHRONOUS"] = "NORMAL" if mode.upper() == "WAL" else "FULL"
+    command = [sys.executable, os.path.abspath(__file__), "--child",
+               "--writers", str(args.writers), "--rows", str(args.rows)]
+    output = subprocess.run(command, env=env, cwd=workdir, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--modes", default="WAL,DELETE", help="SQLite journal modes to compare, or 'default' to use DATABASE_URL as is")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_once(args))))
+        return
+
+    print(f"{args.writers} writers x {args.rows} rows, one commit per row\n")
+    print(f"{'mode':<10}{'writes/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'read p95':>10}{'errors':>8}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        r = run_mode(mode, args)
+        print(f"{mode:<10}{r['writes_per_s']:>10.0f}{r['write_p50_ms']:>9.1f}{r['write_p95_ms']:>9.1f}"
+              f"{r['read_p95_ms'] or 0:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
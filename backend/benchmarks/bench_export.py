@@ -0,0 +1,120 @@
+"""
+Memory and throughput benchmark for GET /forms/export.
+
+Seeds a fresh SQLite database with --forms rows (indexed for search, so
+column discovery works), then streams each export format and reports rows/s,
+output size and the peak Python heap (tracemalloc) while exporting. The
+"all-in-memory" row loads every form in one query and serialises the list,
+the way GET /forms builds its response, for comparison. Peak memory for the
+streaming formats should stay flat as --forms grows.
+
+Usage (from the backend directory):
+    python benchmarks/bench_export.py --forms 10000,50000 --formats jsonl,csv,parquet
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def sample_data(number: int) -> dict:
+    return {
+        "Name": f"Applicant {number}",
+        "Date": "2024-01-15",
+        "Policy Number": f"PN-{number:06d}",
+        "address": {"street": f"{number} Main St", "city": "Springfield"},
+        "items": [{"description": "Consultation", "amount": "120.00"}, {"description": "X-ray", "amount": "80.00"}]
+    }
+
+
+async def seed(forms: int):
+    from database import init_db, async_session, ExtractionResult
+    import search
+
+    await init_db()
+    await search.init_search_index()
+    for start in range(0, forms, 1000):
+        async with async_session() as db:
+            records = [
+                ExtractionResult(filename=f"form-{n}.png", json_data=json.dumps(sample_data(n)), file_size=1024)
+                for n in range(start, min(forms, start + 1000))
+            ]
+            db.add_all(records)
+            await db.flush()
+            for record in records:
+                await search.index_form(db, record.id, record.filename, record.json_data)
+            await db.commit()
+
+
+async def run_export(fmt: str) -> dict:
+    from sqlalchemy import select
+    from database import async_session, ExtractionResult
+    import export
+
+    filters = export.ExportFilter()
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = 0
+    if fmt == "all-in-memory":
+        async with async_session() as db:
+            records = (await db.execute(select(ExtractionResult))).scalars().all()
+        body = json.dumps([
+            {"id": r.id, "form_name": r.filename, "data": r.json_data, "created_at": r.created_at.isoformat()}
+            for r in records
+        ])
+        size = len(body.encode("utf-8"))
+    else:
+        if fmt == "jsonl":
+            stream = export.export_jsonl(filters)
+        else:
+            columns = await export.discover_columns(filters)
+            stream = (export.export_csv if fmt == "csv" else export.export_parquet)(filters, columns)
+        async for chunk in stream:
+            size += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"elapsed_s": elapsed, "bytes": size, "peak_mb": peak / 1024 / 1024}
+
+
+async def run_child(args) -> dict:
+    from database import engine
+
+    await seed(args.forms)
+    results = {fmt: await run_export(fmt) for fmt in args.formats.split(",")}
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--forms", default="10000,50000", help="Comma-separated table sizes to compare")
+    parser.add_argument("--formats", default="jsonl,csv,parquet,all-in-memory")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.forms = int(args.forms)
+        print(json.dumps(asyncio.run(run_child(args))))
+        return
+
+    print(f"{'forms':>8}  {'format':<14}{'rows/s':>9}{'MB out':>9}{'peak MB':>9}")
+    for forms in [int(n) for n in args.forms.split(",") if n.strip()]:
+        workdir = tempfile.mkdtemp(prefix="bench_export_")
+        env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--forms", str(forms), "--formats", args.formats]
+        output = subprocess.run(command, env=env, cwd=workdir, capture_output=True, text=True, check=True).stdout
+        for fmt, r in json.loads(output.strip().splitlines()[-1]).items():
+            print(f"{forms:>8}  {fmt:<14}{forms / r['elapsed_s']:>9.0f}{r['bytes'] / 1024 / 1024:>9.1f}{r['peak_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
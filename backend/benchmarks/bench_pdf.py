@@ -0,0 +1,79 @@
+"""
+PDF throughput benchmark against the local stub model server.
+
+Builds a synthetic multi-page PDF, then measures pages per second for
+rasterisation alone and for the full extract_pdf path (rasterise on the
+process pool, extract pages concurrently, merge).
+
+Usage (from the backend directory):
+    python benchmarks/bench_pdf.py --pages 12 --dpi 150 --latency 0.5
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from stub_server import start_stub_server, stub_base_url
+
+
+def make_sample_pdf(pages: int) -> bytes:
+    images = []
+    for number in range(pages):
+        page = Image.new("RGB", (1240, 1754), "white")
+        draw = ImageDraw.Draw(page)
+        for line in range(30):
+            draw.text((100, 100 + line * 50), f"Page {number + 1} line {line + 1}: Name ____ Date ____", fill="black")
+        images.append(page)
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+async def run(args):
+    server = start_stub_server(args.latency)
+    os.environ["HF_TOKEN"] = "stub"
+    os.environ["HF_BASE_URL"] = stub_base_url(server)
+    os.environ["EXTRACTION_WORKERS"] = str(args.workers)
+    os.environ["PDF_DPI"] = str(args.dpi)
+
+    import pdf
+    from agent import HandwritingExtractionAgent
+    agent = HandwritingExtractionAgent()
+
+    document = make_sample_pdf(args.pages)
+
+    # Warm the process pool so worker start-up is not counted
+    await pdf.rasterise_pdf(make_sample_pdf(1), dpi=args.dpi)
+
+    start = time.perf_counter()
+    pages = await pdf.rasterise_pdf(document, dpi=args.dpi, max_pages=args.pages)
+    raster_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = await pdf.extract_pdf(agent, document, "sample.pdf")
+    total_elapsed = time.perf_counter() - start
+
+    pdf.shutdown_pool()
+    agent.shutdown()
+    server.shutdown()
+
+    print(f"Pages:                 {len(pages)} at {args.dpi} DPI")
+    print(f"Raster workers:        {pdf.PDF_RASTER_WORKERS}")
+    print(f"Rasterise only:        {raster_elapsed:.2f}s ({len(pages) / raster_elapsed:.1f} pages/s)")
+    print(f"End-to-end extraction: {total_elapsed:.2f}s ({len(pages) / total_elapsed:.1f} pages/s)")
+    print(f"Result:                {result['message']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    asyncio.run(run(parser.parse_args()))
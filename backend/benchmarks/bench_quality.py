@@ -0,0 +1,95 @@
+"""
+Latency and verdicts of the local image-quality gate (quality.py).
+
+Draws synthetic handwritten-looking pages (clean, sparse, blank, blurred)
+at --size, JPEG-encodes them like a phone upload, and times quality.assess
+on each next to the full preprocessing pipeline that runs before every
+model call.
+
+Usage (from the backend directory):
+    python benchmarks/bench_quality.py --size 2400x3200 --repeat 20
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def draw_page(size, lines: int, words: int) -> Image.Image:
+    width, height = size
+    page = Image.new("L", size, 235)
+    draw = ImageDraw.Draw(page)
+    for line in range(lines):
+        y = height // 16 + line * (height * 7 // 8) // max(lines, 1)
+        x = width // 16
+        for _ in range(words):
+            length = random.randint(width // 24, width // 8)
+            points = [(x + step * 6, y + random.randint(-height // 130, height // 130)) for step in range(length // 6)]
+            draw.line(points, fill=random.randint(20, 70), width=max(2, width // 480))
+            x += length + width // 40
+    # Paper texture
+    page = Image.blend(page, Image.effect_noise(size, 8), 0.08)
+    return page.convert("RGB")
+
+
+def to_jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="2400x3200", help="Page size in pixels, WIDTHxHEIGHT")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    import quality
+    from agent import decode_image
+
+    random.seed(0)
+    size = tuple(int(n) for n in args.size.split("x"))
+    blur = size[0] / 200
+    cases = {
+        "written page": draw_page(size, 20, 6),
+        "two lines": draw_page(size, 2, 3),
+        "blank": draw_page(size, 0, 0),
+        f"blur r{blur / 2:.0f}": draw_page(size, 20, 6).filter(ImageFilter.GaussianBlur(blur / 2)),
+        f"blur r{blur:.0f}": draw_page(size, 20, 6).filter(ImageFilter.GaussianBlur(blur)),
+    }
+
+    print(f"{size[0]}x{size[1]} JPEG, {args.repeat} runs each, analysed at {quality.QUALITY_ANALYSIS_SIDE}px\n")
+    print(f"{'image':<14}{'verdict':<9}{'ink':>8}{'sharp':>7}{'p50 ms':>8}{'p95 ms':>8}")
+    for name, image in cases.items():
+        data = to_jpeg(image)
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            report = quality.assess(data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{name:<14}{report['verdict']:<9}{report['ink_ratio']:>8.4f}{report['sharpness']:>7.2f}"
+              f"{percentile(latencies, 0.5):>8.1f}{percentile(latencies, 0.95):>8.1f}")
+
+    data = to_jpeg(cases["written page"])
+    latencies = []
+    for _ in range(max(3, args.repeat // 4)):
+        start = time.perf_counter()
+        decode_image(data, int(os.getenv("IMAGE_MAX_SIDE", "1600"))).save(io.BytesIO(), format="JPEG", quality=85)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"\nfor comparison, decode + resize + re-encode for the model: p50 {percentile(latencies, 0.5):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
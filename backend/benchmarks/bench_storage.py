@@ -0,0 +1,165 @@
+"""
+Database size and GET /forms latency for each FORM_STORAGE format (storage.py).
+
+For every format a fresh database is created by the server, filled with
+--rows synthetic extracted forms written the way that format stores them,
+vacuumed, and measured: the bytes taken by extraction_results (from SQLite's
+dbstat table) and by the whole file. The server is then restarted on it and
+every row is read through GET /forms in pages of --page-size, with data as a
+JSON-encoded string (the default) and with data_format=object.
+
+"pretty" is text storage of indent=2 JSON, as forms saved from an editor
+often are; "text" is what extraction itself writes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_storage.py --rows 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+from bench_workers import free_port, wait_until_ready
+
+MODES = ("pretty", "text", "compact", "zlib", "zstd")
+
+
+def make_form(number: int) -> dict:
+    return {
+        "Name": f"Applicant {number}",
+        "Date": f"2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}",
+        "Policy Number": f"PN-{number:06d}",
+        "Address": {"Street": f"{number % 900 + 1} Main Street", "City": "Springfield", "Postcode": f"{10000 + number % 9000}"},
+        "Items": [{"Description": random.choice(["Consultation fee", "X-ray", "Prescription", "Follow-up visit"]),
+                   "Amount": round(random.uniform(5, 500), 2)} for _ in range(random.randint(1, 5))],
+        "Notes": random.choice(["Patient reports mild symptoms; follow-up in two weeks.", "Signed and dated by the applicant.", ""]),
+    }
+
+
+def start_server(workdir: str, port: int, storage: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        TRANSLATION_CACHE_PATH=os.path.join(workdir, "translations.db"),
+        FORM_STORAGE="text" if storage == "pretty" else storage,
+        RATE_LIMIT_PER_MINUTE="0",
+        WEB_CONCURRENCY="1",
+    )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", "1", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def stop(server: subprocess.Popen):
+    server.terminate()
+    server.wait(timeout=30)
+
+
+def fill(path: str, rows: int, storage: str) -> float:
+    """Insert rows as the given format stores them; returns rows per second"""
+    import storage as storage_module
+
+    random.seed(0)
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    batch = []
+    for number in range(rows):
+        form = make_form(number)
+        if storage == "pretty":
+            value = json.dumps(form, indent=2)
+        else:
+            value = storage_module.pack(json.dumps(form), storage)
+        batch.append((f"form_{number:06d}.jpg", value, 1.0, 100000))
+        if len(batch) == 5000 or number == rows - 1:
+            conn.executemany(
+                "INSERT INTO extraction_results (filename, json_data, processing_time, file_size, created_at, updated_at, version) "
+                "VALUES (?, ?, ?, ?, datetime('now'), datetime('now'), 1)", batch)
+            conn.commit()
+            batch = []
+    elapsed = time.perf_counter() - start
+    conn.execute("VACUUM")
+    conn.close()
+    return rows / elapsed
+
+
+def sizes(path: str):
+    conn = sqlite3.connect(path)
+    table = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'extraction_results'").fetchone()[0]
+    conn.close()
+    return table, os.path.getsize(path)
+
+
+async def scan(url: str, page_size: int, data_format: str):
+    """Read every row page by page; returns (seconds, page latencies, bytes)"""
+    latencies, received, cursor = [], 0, None
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120) as client:
+        while True:
+            params = {"limit": page_size, "sort": "id", "data_format": data_format}
+            if cursor:
+                params["cursor"] = cursor
+            page_start = time.perf_counter()
+            response = await client.get(f"{url}/forms", params=params)
+            latencies.append(time.perf_counter() - page_start)
+            response.raise_for_status()
+            received += len(response.content)
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+    return time.perf_counter() - start, latencies, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows, GET /forms pages of {args.page_size}\n")
+    print(f"{'format':<9}{'table MB':>9}{'file MB':>9}{'insert/s':>10}"
+          f"{'string p50 ms':>15}{'scan s':>8}{'object p50 ms':>15}{'scan s':>8}")
+    for storage in args.modes.split(","):
+        workdir = tempfile.mkdtemp(prefix="bench_storage_")
+        path = os.path.join(workdir, "bench.db")
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+
+        # Let the server create the schema, then fill it offline
+        server = start_server(workdir, port, storage)
+        asyncio.run(wait_until_ready(url, 1))
+        stop(server)
+        rate = fill(path, args.rows, storage)
+        table, total = sizes(path)
+
+        server = start_server(workdir, port, storage)
+        try:
+            asyncio.run(wait_until_ready(url, 1))
+            results = {}
+            for data_format in ("string", "object"):
+                # The first pass warms SQLite's page cache
+                asyncio.run(scan(url, args.page_size, data_format))
+                seconds, latencies, _ = asyncio.run(scan(url, args.page_size, data_format))
+                results[data_format] = (statistics.median(latencies) * 1000, seconds)
+        finally:
+            stop(server)
+        print(f"{storage:<9}{table / 1e6:>9.1f}{total / 1e6:>9.1f}{rate:>10.0f}"
+              f"{results['string'][0]:>15.1f}{results['string'][1]:>8.2f}"
+              f"{results['object'][0]:>15.1f}{results['object'][1]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
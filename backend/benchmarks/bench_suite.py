@@ -0,0 +1,289 @@
+"""
+Offline end-to-end benchmark suite.
+
+Starts the local stub server for both the OpenAI-compatible vision API
+(HF_BASE_URL) and the Groq translation API (GROQ_BASE_URL), with
+--latency +/- --jitter seconds per answer, then runs serve.py against it
+on a fresh SQLite database. Each scenario is run at every --concurrency
+level:
+
+  upload            POST /upload, English (vision model only)
+  upload_translate  POST /upload?language=Spanish (vision model + translation;
+                    phrases are cached after the first request, as in production)
+  forms             GET /forms?limit=50 over --seed-forms stored forms
+  preprocess        agent.prepare_image in this process, on worker threads
+  parse             agent._parse_json_response on a fenced model answer
+
+For every level it reports p50/p95/p99 latency, throughput and the peak RSS
+so far (the server's for HTTP scenarios, this process's otherwise). With
+--output the results are written as JSON together with the git commit;
+--compare takes an earlier file and flags anything that got slower by more
+than --threshold.
+
+Usage (from the backend directory):
+    python benchmarks/bench_suite.py --output bench-results/$(git rev-parse --short HEAD).json
+    python benchmarks/bench_suite.py --compare bench-results/abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from stub_server import start_stub_server, stub_base_url, stub_groq_base_url
+from bench_quality import draw_page, to_jpeg
+from bench_workers import free_port, wait_until_ready
+
+SCENARIOS = ("upload", "upload_translate", "forms", "preprocess", "parse")
+HTTP_SCENARIOS = ("upload", "upload_translate", "forms")
+
+SAMPLE_ANSWER = "```json\n" + json.dumps({
+    "Name": "Jane Doe",
+    "Date of Birth": "1980-02-14",
+    "Policy Number": "PN-000123",
+    "Address": {"Street": "12 Main St", "City": "Springfield", "Postcode": "12345"},
+    "Claims": [{"Date": "2024-01-15", "Amount": "120.00", "Description": "Consultation"}] * 5,
+}, indent=2) + "\n```"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb(pid: int = None):
+    """Peak resident set size of pid (Linux only), or of this process"""
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def start_server(port: int, stub, workdir: str, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        HF_TOKEN="stub",
+        HF_BASE_URL=stub_base_url(stub),
+        GROQ_API_KEY="stub",
+        GROQ_BASE_URL=stub_groq_base_url(stub),
+        DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        TRANSLATION_CACHE_PATH=os.path.join(workdir, "translations.db"),
+        EXTRACTION_WORKERS=str(args.extraction_workers),
+        # Every upload should reach the (stub) model
+        CACHE_ENABLED="false",
+        RATE_LIMIT_PER_MINUTE="0",
+        ADMISSION_MAX_IN_FLIGHT="10000",
+        LANGFUSE_PUBLIC_KEY="",
+        PYTHONPATH=BACKEND_DIR,
+    )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", "1", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def run_level(operation, requests: int, concurrency: int) -> dict:
+    """Call operation(number) requests times, at most concurrency at once"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(number):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await operation(number)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def build_operations(client: httpx.AsyncClient, url: str, images, agent):
+    async def upload(number, language="English"):
+        response = await client.post(
+            f"{url}/upload", params={"language": language},
+            files={"file": (f"form-{number}.jpg", images[number % len(images)], "image/jpeg")}
+        )
+        response.raise_for_status()
+
+    async def upload_translate(number):
+        await upload(number, "Spanish")
+
+    async def forms(number):
+        (await client.get(f"{url}/forms", params={"limit": 50})).raise_for_status()
+
+    async def preprocess(number):
+        await asyncio.to_thread(agent.prepare_image, images[number % len(images)])
+
+    async def parse(number):
+        await asyncio.to_thread(agent._parse_json_response, SAMPLE_ANSWER)
+
+    return {"upload": upload, "upload_translate": upload_translate, "forms": forms,
+            "preprocess": preprocess, "parse": parse}
+
+
+async def seed_forms(client: httpx.AsyncClient, url: str, count: int):
+    async def create(number):
+        data = json.loads(SAMPLE_ANSWER.strip("`").removeprefix("json"))
+        data["Policy Number"] = f"PN-{number:06d}"
+        (await client.post(f"{url}/forms", json={"form_name": f"seed-{number}.jpg", "data": json.dumps(data)})).raise_for_status()
+
+    await run_level(create, count, 16)
+
+
+async def run(args) -> dict:
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    random.seed(0)
+    images = [to_jpeg(draw_page((1200, 1600), random.randint(8, 20), random.randint(3, 6))) for _ in range(8)]
+    stub = start_stub_server(args.latency, jitter=args.jitter)
+    os.environ.update(HF_TOKEN="stub", HF_BASE_URL=stub_base_url(stub), LANGFUSE_PUBLIC_KEY="")
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(levels)))
+
+    from agent import HandwritingExtractionAgent
+    agent = HandwritingExtractionAgent()
+
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = start_server(port, stub, workdir, args) if set(scenarios) & set(HTTP_SCENARIOS) else None
+    results = []
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    try:
+        async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+            if server:
+                await wait_until_ready(url, 1)
+            operations = build_operations(client, url, images, agent)
+            print(f"{len(scenarios)} scenarios x concurrency {args.concurrency}, {args.requests} requests per level, "
+                  f"stub latency {args.latency}s +/- {args.jitter}s, {os.cpu_count()} CPU(s)\n")
+            print(f"{'scenario':<18}{'conc':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>7}{'peak MB':>9}")
+            for scenario in scenarios:
+                if scenario == "forms":
+                    await seed_forms(client, url, args.seed_forms)
+                # Warm up connections, caches and lazily created pools
+                await run_level(operations[scenario], 2, 1)
+                for concurrency in levels:
+                    requests = args.requests * (20 if scenario in ("forms", "preprocess", "parse") else 1)
+                    result = await run_level(operations[scenario], requests, concurrency)
+                    result.update(scenario=scenario, concurrency=concurrency,
+                                  peak_rss_mb=peak_rss_mb(server.pid if scenario in HTTP_SCENARIOS else None))
+                    results.append(result)
+                    print(f"{scenario:<18}{concurrency:>5}{result['throughput_rps']:>9.1f}{result['p50_ms'] or 0:>9.1f}"
+                          f"{result['p95_ms'] or 0:>9.1f}{result['p99_ms'] or 0:>9.1f}{result['errors']:>7}"
+                          f"{result['peak_rss_mb'] or 0:>9.1f}")
+                    if result["first_error"]:
+                        print(f"    first error: {result['first_error']}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        agent.shutdown()
+        stub.shutdown()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {name: getattr(args, name) for name in ("concurrency", "requests", "latency", "jitter", "seed_forms", "extraction_workers")},
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    """Print changes against baseline; returns the number of regressions"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    print(f"{'scenario':<18}{'conc':>5}{'req/s':>10}{'p95':>10}{'p99':>10}")
+    regressions = 0
+    for result in current["results"]:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if not old:
+            continue
+        changes = {}
+        for field in ("throughput_rps", "p95_ms", "p99_ms"):
+            if old[field] and result[field] is not None:
+                changes[field] = (result[field] - old[field]) / old[field]
+        slower = changes.get("throughput_rps", 0) < -threshold or changes.get("p95_ms", 0) > threshold
+        regressions += slower
+        print(f"{result['scenario']:<18}{result['concurrency']:>5}"
+              + "".join(f"{changes[field]:>+10.1%}" if field in changes else f"{'-':>10}" for field in ("throughput_rps", "p95_ms", "p99_ms"))
+              + ("   REGRESSION" if slower else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per level (x20 for forms, preprocess and parse)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stub model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Stub latency varies by up to this many seconds")
+    parser.add_argument("--seed-forms", type=int, default=2000, help="Forms stored before the forms scenario")
+    parser.add_argument("--extraction-workers", type=int, default=int(os.getenv("EXTRACTION_WORKERS", "4")))
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\n[OK] Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(report, json.load(baseline), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Single-shot vs tiled extraction (tiling.py) on large, dense forms:
+wall-clock latency and field recall.
+
+Offline (default) the model is simulated. A synthetic A4 page at 300 dpi
+holds --fields small fields, each drawn as fine stripes whose stroke width
+varies from field to field like handwriting does. The simulated reader
+receives exactly the JPEG the agent would send, and reads a field only if
+its stripes still show in that image, so fine writing is lost when a whole
+page is shrunk to IMAGE_MAX_SIDE and kept when a tile is. Each call sleeps
+--base-latency plus --per-mp seconds per megapixel received, since vision
+models bill and decode by image size.
+
+With --live DIR the configured backends (HF_TOKEN / VISION_BACKENDS) are
+used on DIR/*.jpg|png, each with a NAME.json of expected field values.
+
+Usage (from the backend directory):
+    python benchmarks/bench_tiling.py --modes single,grid:2x2,layout:3
+    python benchmarks/bench_tiling.py --live ./samples --modes single,grid:2x2
+"""
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image, ImageDraw
+
+from bench_quality import draw_page, to_jpeg
+
+PAGE_SIZE = (2480, 3508)
+FIELD_SIZE = (180, 36)
+STROKES = (2, 3, 4, 6)
+
+
+def draw_form(fields: int):
+    """A dense page of striped fields between lines of writing; returns the page and field boxes"""
+    page = draw_page(PAGE_SIZE, 28, 5)
+    draw = ImageDraw.Draw(page)
+    cols = 4
+    rows = (fields + cols - 1) // cols
+    boxes = {}
+    for index in range(fields):
+        row, col = divmod(index, cols)
+        left = 140 + col * (PAGE_SIZE[0] - 280) // cols
+        top = 160 + row * (PAGE_SIZE[1] - 320) // rows
+        stroke = STROKES[index % len(STROKES)]
+        draw.rectangle((left, top, left + FIELD_SIZE[0], top + FIELD_SIZE[1]), fill=(235, 235, 235))
+        for x in range(left, left + FIELD_SIZE[0] - stroke, 2 * stroke):
+            draw.rectangle((x, top, x + stroke - 1, top + FIELD_SIZE[1]), fill=(30, 30, 30))
+        boxes[f"Field {index + 1:03d}"] = (left, top, left + FIELD_SIZE[0], top + FIELD_SIZE[1], stroke)
+    return page, boxes
+
+
+def count_strokes(crop: Image.Image) -> int:
+    """Dark runs across a field; once strokes blur or alias together the count is wrong"""
+    profile = list(crop.resize((crop.width, 1), Image.Resampling.BOX).tobytes())
+    if not profile:
+        return 0
+    middle = sum(profile) / len(profile)
+    return sum(1 for a, b in zip([255] + profile, profile) if b < middle <= a)
+
+
+class SimulatedReader:
+    """Vision backend stand-in that can only read fields still legible in the image it receives"""
+
+    name = "simulated"
+    label = "simulated reader"
+    model = "simulated"
+
+    def __init__(self, fields, base_latency: float, per_mp: float):
+        self.fields = fields
+        self.base_latency = base_latency
+        self.per_mp = per_mp
+        self.regions = None
+
+    def plan(self, page_size, boxes):
+        """Where each tile sits on the original page; None for whole-page calls"""
+        if not boxes:
+            self.regions = None
+            return
+        scale = PAGE_SIZE[0] / page_size[0]
+        self.regions = [tuple(int(v * scale) for v in box) for box in boxes]
+
+    def complete(self, prompt: str, image_b64: str) -> str:
+        image = Image.open(io.BytesIO(base64.b64decode(image_b64))).convert("L")
+        time.sleep(self.base_latency + self.per_mp * image.width * image.height / 1e6)
+
+        part = re.search(r"part (\d+) of (\d+)", prompt)
+        region = self.regions[int(part.group(1)) - 1] if part and self.regions else (0, 0) + PAGE_SIZE
+        sx = image.width / (region[2] - region[0])
+        sy = image.height / (region[3] - region[1])
+        answer = {"Form Title": "Claim form"}
+        for name, (left, top, right, bottom, stroke) in self.fields.items():
+            if right <= region[0] or left >= region[2] or bottom <= region[1] or top >= region[3]:
+                continue
+            if left < region[0] or right > region[2] or top < region[1] or bottom > region[3]:
+                # Cut by the tile edge
+                answer[name] = "unreadable"
+                continue
+            crop = image.crop((int((left - region[0]) * sx), int((top - region[1]) * sy),
+                               int((right - region[0]) * sx), int((bottom - region[1]) * sy)))
+            legible = count_strokes(crop) == len(range(0, FIELD_SIZE[0] - stroke, 2 * stroke))
+            answer[name] = f"value {name[-3:]}" if legible else "unreadable"
+        return json.dumps(answer)
+
+    def stream(self, prompt: str, image_b64: str):
+        yield self.complete(prompt, image_b64)
+
+
+def configure(mode: str):
+    """Apply a mode (single, grid:RxC or layout:R) to the tiling settings"""
+    import tiling
+    kind, _, shape = mode.partition(":")
+    if kind == "single":
+        tiling.EXTRACTION_TILES = "off"
+        return
+    rows, _, cols = shape.partition("x")
+    tiling.EXTRACTION_TILES = kind
+    tiling.TILE_ROWS = int(rows)
+    tiling.TILE_COLS = int(cols or 1)
+    tiling.TILE_MIN_SIDE = 0
+
+
+def recall(extracted, truth) -> float:
+    values = {re.sub(r"\s+", " ", str(value)).strip().lower() for value in extracted.values()}
+    found = sum(1 for value in truth.values() if re.sub(r"\s+", " ", str(value)).strip().lower() in values)
+    return found / len(truth) if truth else 0.0
+
+
+def run_mode(mode, samples, repeat, reader=None):
+    import tiling
+    from agent import HandwritingExtractionAgent, decode_image
+    from backends import BackendRouter
+
+    configure(mode)
+    agent = HandwritingExtractionAgent()
+    if reader:
+        agent.vision = BackendRouter([reader], max_workers=agent.max_workers * agent.tiles_per_page)
+
+    latencies, preprocess, recalls, tiles = [], [], [], 0
+    for data, truth in samples:
+        if reader:
+            if agent._should_tile(data):
+                page = decode_image(data, agent.max_image_side * max(tiling.TILE_ROWS, tiling.TILE_COLS))
+                reader.plan(page.size, tiling.plan_tiles(page))
+            else:
+                reader.plan(None, None)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = agent.extract_handwriting_huggingface(data, "bench.jpg")
+            latencies.append(time.perf_counter() - start)
+            if not result.get("success"):
+                raise SystemExit(f"{mode}: extraction failed: {result.get('error')}")
+            preprocess.append(result["timings"]["preprocess_ms"])
+            recalls.append(recall(result["extracted_data"], truth))
+            tiles = len(result["preprocessing"].get("tiles", [None]))
+    agent.shutdown()
+    return {
+        "mode": mode,
+        "tiles": tiles,
+        "p50_s": statistics.median(latencies),
+        "max_s": max(latencies),
+        "preprocess_ms": statistics.median(preprocess),
+        "recall": statistics.mean(recalls),
+    }
+
+
+def load_live(directory):
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        stem, ext = os.path.splitext(path)
+        if ext.lower() in (".jpg", ".jpeg", ".png") and os.path.exists(stem + ".json"):
+            with open(path, "rb") as f, open(stem + ".json") as truth:
+                samples.append((f.read(), json.load(truth)))
+    if not samples:
+        raise SystemExit(f"No image + .json pairs in {directory}")
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="single,grid:2x1,grid:2x2,layout:3",
+                        help="Comma-separated: single, grid:ROWSxCOLS, layout:ROWS")
+    parser.add_argument("--fields", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--base-latency", type=float, default=0.8, help="Simulated seconds per model call")
+    parser.add_argument("--per-mp", type=float, default=1.0, help="Simulated seconds per megapixel sent")
+    parser.add_argument("--live", help="Directory of images with NAME.json expected values; uses the real backends")
+    args = parser.parse_args()
+
+    if args.live:
+        samples, reader = load_live(args.live), None
+        print(f"{len(samples)} live samples, {args.repeat} runs each\n")
+    else:
+        # The simulated reader replaces the router's backends after start-up
+        os.environ.setdefault("VISION_BACKENDS", "mock")
+        random.seed(0)
+        page, fields = draw_form(args.fields)
+        samples = [(to_jpeg(page), {name: f"value {name[-3:]}" for name in fields})]
+        reader = SimulatedReader(fields, args.base_latency, args.per_mp)
+        print(f"{PAGE_SIZE[0]}x{PAGE_SIZE[1]} page, {args.fields} fields (strokes {STROKES} px), "
+              f"IMAGE_MAX_SIDE={os.getenv('IMAGE_MAX_SIDE', '1600')}, simulated model "
+              f"{args.base_latency}s + {args.per_mp}s/MP, {args.repeat} runs\n")
+
+    print(f"{'mode':<12}{'tiles':>6}{'p50 s':>8}{'max s':>8}{'prep ms':>9}{'recall':>8}")
+    for mode in args.modes.split(","):
+        row = run_mode(mode.strip(), samples, args.repeat, reader)
+        print(f"{row['mode']:<12}{row['tiles']:>6}{row['p50_s']:>8.2f}{row['max_s']:>8.2f}"
+              f"{row['preprocess_ms']:>9.0f}{row['recall']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Tracing overhead microbenchmark.
+
+Runs the same extractions (mock vision backend, so only local work is
+timed) with tracing off, with the old inline Langfuse calls, and with the
+TraceBuffer, against a fake Langfuse client whose calls take --trace-latency
+seconds. Also times TraceBuffer.record() on its own.
+
+Usage (from the backend directory):
+    python benchmarks/bench_tracing.py --requests 50 --trace-latency 0.05
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+
+class FakeTrace:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def update(self, **kwargs):
+        time.sleep(self.latency / 2)
+
+
+class FakeLangfuse:
+    """Stands in for the Langfuse client; every call costs about one network round trip"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.traces = 0
+
+    def trace(self, name: str):
+        self.traces += 1
+        time.sleep(self.latency / 2)
+        return FakeTrace(self.latency)
+
+    def flush(self):
+        pass
+
+
+def make_sample_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 900), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def measure(agent, image: bytes, requests: int):
+    latencies = []
+    for number in range(requests):
+        start = time.perf_counter()
+        agent.extract_handwriting(image, f"sample-{number}.jpg")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--trace-latency", type=float, default=0.05, help="seconds per fake Langfuse call")
+    args = parser.parse_args()
+
+    os.environ["VISION_BACKENDS"] = "mock"
+    os.environ.pop("LANGFUSE_PUBLIC_KEY", None)
+    from agent import HandwritingExtractionAgent
+    from tracing import TraceBuffer
+
+    agent = HandwritingExtractionAgent()
+    image = make_sample_image()
+    agent.extract_handwriting(image, "warmup.jpg")
+
+    results = {"off": measure(agent, image, args.requests)}
+
+    fake = FakeLangfuse(args.trace_latency)
+
+    def inline_trace(name, filename, output):
+        # What _trace did before the buffer: both calls on the request thread
+        trace = fake.trace(name=name)
+        trace.update(input={"filename": filename}, output=output)
+
+    agent._trace = inline_trace
+    results["inline"] = measure(agent, image, args.requests)
+    del agent._trace
+
+    agent.tracer = TraceBuffer(fake, sample_rate=1.0)
+    agent.tracer.start()
+    results["buffered"] = measure(agent, image, args.requests)
+    agent.tracer.stop(timeout=args.requests * args.trace_latency + 5)
+    stats = agent.tracer.stats()
+
+    record_buffer = TraceBuffer(FakeLangfuse(0), max_queue=100000)
+    output = {"success": True, "filename": "x.jpg", "extracted_data": {"Name": "Jane Doe"}}
+    start = time.perf_counter()
+    for _ in range(100000):
+        record_buffer.record("bench", {"filename": "x.jpg"}, output)
+    record_us = (time.perf_counter() - start) / 100000 * 1e6
+
+    agent.shutdown()
+
+    print(f"{args.requests} extractions, fake Langfuse at {args.trace_latency * 1000:.0f}ms per call\n")
+    print(f"{'tracing':<10}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, (p50, p95) in results.items():
+        print(f"{mode:<10}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}")
+    print(f"\nTraceBuffer.record(): {record_us:.2f}us per call")
+    print(f"Buffered traces delivered: {stats['sent']} sent, {stats['dropped']} dropped, {stats['queued']} still queued")
+
+
+if __name__ == "__main__":
+    main()
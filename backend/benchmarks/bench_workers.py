@@ -0,0 +1,140 @@
+"""
+Worker scaling benchmark: throughput of /upload against serve.py with
+1, 2, 4 ... worker processes.
+
+Each run starts serve.py on a fresh SQLite database, pointed at the local
+stub model server, and fires --requests uploads with --concurrency clients.
+EXTRACTION_WORKERS is kept small per process so a single process saturates
+and the effect of adding processes is visible. Preprocessing is CPU work,
+so scaling flattens once workers outnumber cores.
+
+Usage (from the backend directory):
+    python benchmarks/bench_workers.py --workers 1,2,4 --requests 64 --concurrency 32
+"""
+import argparse
+import asyncio
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from PIL import Image
+
+from stub_server import start_stub_server, stub_base_url
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_image(number: int) -> bytes:
+    # Distinct small images so nothing is served from a cache
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (number % 256, (number * 7) % 256, 128)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def start_server(workers: int, port: int, base_url: str, args) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="bench_workers_")
+    env = dict(
+        os.environ,
+        HF_TOKEN="stub",
+        HF_BASE_URL=base_url,
+        DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        TRANSLATION_CACHE_PATH=os.path.join(workdir, "translations.db"),
+        EXTRACTION_WORKERS=str(args.extraction_workers),
+        CACHE_ENABLED="false",
+        # The generated images are flat colour and would be rejected as blank
+        QUALITY_GATE="off",
+        RATE_LIMIT_PER_MINUTE="0",
+        ADMISSION_MAX_IN_FLIGHT="10000",
+        LANGFUSE_PUBLIC_KEY="",
+        PYTHONPATH=BACKEND_DIR,
+    )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_until_ready(url: str, workers: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    # Give the remaining workers time to finish their lifespan startup
+                    await asyncio.sleep(0.5 * workers)
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def load(url: str, images, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(client, number, image):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(f"{url}/upload", files={"file": (f"form-{number}.jpg", image, "image/jpeg")})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, number, image) for number, image in enumerate(images)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, failures
+
+
+async def run(args):
+    stub = start_stub_server(args.latency)
+    images = [make_image(number) for number in range(args.requests)]
+    print(f"{args.requests} uploads, {args.concurrency} concurrent, {args.latency}s model latency, "
+          f"{args.extraction_workers} extraction threads per worker, {os.cpu_count()} CPU(s)\n")
+    print(f"{'workers':>8}{'req/s':>9}{'p50 s':>8}{'p95 s':>8}{'failed':>8}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(workers, port, stub_base_url(stub), args)
+        try:
+            await wait_until_ready(url, workers)
+            await load(url, images[:workers * 2], args.concurrency)
+            elapsed, latencies, failures = await load(url, images, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        throughput = len(latencies) / elapsed
+        baseline = baseline or throughput
+        latencies.sort()
+        p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else float("nan")
+        print(f"{workers:>8}{throughput:>9.1f}{statistics.median(latencies) if latencies else float('nan'):>8.2f}"
+              f"{p95:>8.2f}{failures:>8}   x{throughput / baseline:.2f}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--extraction-workers", type=int, default=2)
+    asyncio.run(run(parser.parse_args()))
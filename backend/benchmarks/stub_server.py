@@ -0,0 +1,144 @@
+"""
+Local stand-in for the OpenAI-compatible chat completions API.
+Used by the benchmarks so the extraction pipeline can be load-tested
+without calling the hosted HuggingFace router.
+
+Requests under /openai/ (where the Groq SDK sends them, see
+stub_groq_base_url) are answered like the translation model: the JSON
+array of strings in the prompt comes back with each string marked as
+translated.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RESPONSE = {
+    "Name": "Jane Doe",
+    "Date": "2024-01-15",
+    "Policy Number": "PN-000123",
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.5
+    jitter = 0.0
+    error_rate = 0.0
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if request.get("stream"):
+            self._stream_response()
+            return
+
+        time.sleep(self._delay())
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self._answer(request)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _answer(self, request) -> str:
+        if not self.path.startswith("/openai/"):
+            return json.dumps(STUB_RESPONSE)
+        prompt = request["messages"][-1]["content"]
+        phrases = json.loads(prompt.rsplit("Strings to translate:", 1)[-1])
+        return json.dumps([f"{phrase} (en)" for phrase in phrases], ensure_ascii=False)
+
+    def _stream_response(self, chunks: int = 8):
+        """Send the canned answer as SSE chat.completion.chunk events spread over the latency"""
+        content = json.dumps(STUB_RESPONSE)
+        step = max(1, len(content) // chunks)
+        pieces = [content[i:i + step] for i in range(0, len(content), step)]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        delay = self._delay()
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            event = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency: float = 0.5, port: int = 0, error_rate: float = 0.0, jitter: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub server in a background thread; returns the running server.
+
+    Each answer takes latency +/- up to jitter seconds.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency, "jitter": jitter, "error_rate": error_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def stub_groq_base_url(server: ThreadingHTTPServer) -> str:
+    """For GROQ_BASE_URL; the Groq SDK appends /openai/v1/..."""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the stub chat completions server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0, help="answers take latency +/- up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency, args.port, args.error_rate, args.jitter)
+    print(f"[OK] Stub server listening on {stub_base_url(server)} (HF_BASE_URL) and {stub_groq_base_url(server)} (GROQ_BASE_URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
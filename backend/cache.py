@@ -0,0 +1,114 @@
+import os
+import copy
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import select, delete, func
+from database import async_session, CachedExtraction
+from metrics import Counter
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_PERSISTENT_ENTRIES = int(os.getenv("CACHE_MAX_PERSISTENT_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# The persistent tier is trimmed once every this many puts, not on each one
+CACHE_EVICT_EVERY = int(os.getenv("CACHE_EVICT_EVERY", "100"))
+
+CACHE_LOOKUPS = Counter("extraction_cache_lookups_total", "Extraction cache lookups by result", ("result",))
+
+
+def make_cache_key(contents: bytes, language: str, prompt_version: str, model: str) -> str:
+    digest = hashlib.sha256(contents)
+    digest.update(f"|{language.lower()}|{prompt_version}|{model}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Two-tier cache of extracted data: an in-memory LRU in front of the extraction_cache table.
+
+    Callers get their own copy of the data, so changing a result (translation
+    does) cannot change what later hits return.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_persistent_entries: int = CACHE_MAX_PERSISTENT_ENTRIES,
+                 ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_persistent_entries = max_persistent_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._puts_since_eviction = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry:
+            expires_at, data = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_LOOKUPS.inc(result="memory_hit")
+                return copy.deepcopy(data)
+            del self._memory[key]
+
+        async with async_session() as db:
+            record = await db.get(CachedExtraction, key)
+            # created_at is naive UTC, so compare it with naive UTC
+            age = datetime.utcnow() - record.created_at if record else None
+            if record and age <= timedelta(seconds=self.ttl_seconds):
+                record.last_accessed = datetime.utcnow()
+                await db.commit()
+                data = json.loads(record.json_data)
+                self._remember(key, copy.deepcopy(data), time.time() + self.ttl_seconds - age.total_seconds())
+                self.persistent_hits += 1
+                CACHE_LOOKUPS.inc(result="persistent_hit")
+                return data
+
+        self.misses += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def put(self, key: str, data: Dict[str, Any]):
+        self._remember(key, copy.deepcopy(data), time.time() + self.ttl_seconds)
+
+        async with async_session() as db:
+            now = datetime.utcnow()
+            await db.merge(CachedExtraction(cache_key=key, json_data=json.dumps(data), created_at=now, last_accessed=now))
+            await db.commit()
+            # Counting the table on every put costs more than the put itself
+            self._puts_since_eviction += 1
+            if self._puts_since_eviction >= CACHE_EVICT_EVERY:
+                self._puts_since_eviction = 0
+                await self._evict_persistent(db)
+
+    def _remember(self, key: str, data: Dict[str, Any], expires_at: float):
+        self._memory[key] = (expires_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _evict_persistent(self, db):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        await db.execute(delete(CachedExtraction).where(CachedExtraction.created_at < cutoff))
+
+        count = (await db.execute(select(func.count()).select_from(CachedExtraction))).scalar_one()
+        overflow = count - self.max_persistent_entries
+        if overflow > 0:
+            oldest = select(CachedExtraction.cache_key).order_by(CachedExtraction.last_accessed).limit(overflow)
+            await db.execute(delete(CachedExtraction).where(CachedExtraction.cache_key.in_(oldest)))
+        await db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "enabled": CACHE_ENABLED,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.persistent_hits) / lookups, 3) if lookups else 0.0
+        }
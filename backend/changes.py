@@ -0,0 +1,110 @@
+"""
+Form versions, for conditional GETs and the /forms/changes feed.
+
+Every write to extraction_results advances one counter (form_versions) in
+the same transaction and stamps the new value on the row, so versions
+follow commit order. Advancing the counter locks it until the commit, so
+it is done last, after the row and its search index are written. A deleted form leaves a tombstone with its version.
+Form ids are never reused (extraction_results is AUTOINCREMENT), so a
+tombstone stands for one form.
+A client that remembers the last version it has seen asks
+/forms/changes?since=<version> for the rows written and deleted after it.
+
+Tombstones older than FORMS_TOMBSTONE_RETENTION_DAYS are pruned; a client
+asking for changes from before the pruned versions must reload /forms.
+
+ETags are derived from versions, so a 304 can be answered without reading
+or serializing any form data. Only If-None-Match is honoured: HTTP dates
+have whole-second resolution, so If-Modified-Since would miss a write made
+in the same second as the response it revalidates.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update, delete, func
+from database import FormVersion, FormTombstone, ExtractionResult
+
+FORMS_TOMBSTONE_RETENTION_DAYS = int(os.getenv("FORMS_TOMBSTONE_RETENTION_DAYS", "30"))
+
+COUNTER_ID = 1
+
+
+async def next_version(db) -> int:
+    """Advance the counter inside the caller's transaction and return the new version"""
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(FormVersion).where(FormVersion.id == COUNTER_ID).values(version=FormVersion.version + 1, changed_at=now)
+    )
+    if result.rowcount == 0:
+        # Database created without running migration 6
+        db.add(FormVersion(id=COUNTER_ID, version=1, changed_at=now))
+        await db.flush()
+    return (await db.execute(select(FormVersion.version).where(FormVersion.id == COUNTER_ID))).scalar_one()
+
+
+async def stamp(db, record: ExtractionResult):
+    """Give a written row the next version; call it right before committing"""
+    # A form written under the id of a deleted one is no longer deleted
+    await db.execute(delete(FormTombstone).where(FormTombstone.form_id == record.id))
+    record.version = await next_version(db)
+
+
+async def record_deletion(db, form_id: int):
+    """Leave a tombstone for a deleted form, and prune expired ones; call it right before committing"""
+    # merge replaces a tombstone left by an earlier form under the same id
+    await db.merge(FormTombstone(form_id=form_id, version=await next_version(db), deleted_at=datetime.utcnow()))
+
+    cutoff = datetime.utcnow() - timedelta(days=FORMS_TOMBSTONE_RETENTION_DAYS)
+    pruned = (await db.execute(select(func.max(FormTombstone.version)).where(FormTombstone.deleted_at < cutoff))).scalar()
+    if pruned:
+        await db.execute(delete(FormTombstone).where(FormTombstone.version <= pruned))
+        await db.execute(update(FormVersion).where(FormVersion.id == COUNTER_ID).values(pruned_version=pruned))
+
+
+async def current(db) -> Tuple[int, datetime, int]:
+    """(version, time of the last write, oldest version /forms/changes can start from)"""
+    row = (await db.execute(
+        select(FormVersion.version, FormVersion.changed_at, FormVersion.pruned_version).where(FormVersion.id == COUNTER_ID)
+    )).first()
+    if row is None:
+        return 0, datetime(1970, 1, 1), 0
+    return row.version, row.changed_at, row.pruned_version
+
+
+async def changes_since(db, since: int, limit: int, columns) -> Tuple[list, List[int], Optional[int]]:
+    """Rows written and ids deleted after since, at most limit of them in version order.
+
+    columns must include ExtractionResult.version labelled "version". Returns
+    (rows, deleted ids, version of the last change included, or None when there
+    are none). Only a form's latest write is kept, so a form updated twice comes
+    back once.
+    """
+    rows = (await db.execute(
+        select(*columns).where(ExtractionResult.version > since).order_by(ExtractionResult.version).limit(limit)
+    )).mappings().all()
+    tombstones = (await db.execute(
+        select(FormTombstone.form_id, FormTombstone.version)
+        .where(FormTombstone.version > since).order_by(FormTombstone.version).limit(limit)
+    )).all()
+
+    # Merge the two lists by version and keep the first limit changes
+    merged = sorted([(row["version"], row) for row in rows] + [(version, form_id) for form_id, version in tombstones],
+                    key=lambda change: change[0])[:limit]
+    if not merged:
+        return [], [], None
+    written = [change for _, change in merged if not isinstance(change, int)]
+    deleted = [change for _, change in merged if isinstance(change, int)]
+    return written, deleted, merged[-1][0]
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether a conditional GET can be answered with 304"""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
@@ -0,0 +1,192 @@
+"""
+Streaming bulk export of extracted forms as JSONL, CSV or Parquet.
+
+Forms are read in keyset batches of EXPORT_BATCH_SIZE rows, each in its own
+short session, and every batch is encoded and sent before the next is read,
+so memory stays flat however many forms are exported. The nested JSON is
+flattened with the same dotted paths as the search index (applicant.name,
+items.0.qty) and kept apart from the form's own columns, so an extracted
+field called "id" cannot replace the form id: JSONL puts the fields in a
+nested "data" object, CSV and Parquet name their columns data.<path>.
+CSV and Parquet need the column list up front; it comes from the distinct
+paths in form_fields rather than from a pass over the data.
+
+Values keep their JSON types in JSONL. Parquet columns are strings, so
+numbers and booleans are written as their JSON text (true, not True).
+
+Parquet needs pyarrow, which is optional.
+"""
+import io
+import os
+import csv
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlalchemy import select
+from database import async_session, ExtractionResult, FormField
+from search import flatten
+import storage
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+META_COLUMNS = ["id", "form_name", "created_at", "updated_at"]
+FIELD_PREFIX = "data."
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ExportFilter:
+    """The GET /forms filters, applied to both the rows and the column discovery"""
+
+    def __init__(self, name_prefix: Optional[str] = None, created_after: Optional[datetime] = None,
+                 created_before: Optional[datetime] = None):
+        self.name_prefix = name_prefix
+        self.created_after = created_after
+        self.created_before = created_before
+
+    def apply(self, stmt):
+        if self.name_prefix:
+            stmt = stmt.where(ExtractionResult.filename >= self.name_prefix,
+                              ExtractionResult.filename < self.name_prefix + "\uffff")
+        if self.created_after:
+            stmt = stmt.where(ExtractionResult.created_at >= self.created_after)
+        if self.created_before:
+            stmt = stmt.where(ExtractionResult.created_at < self.created_before)
+        return stmt
+
+
+def flatten_form(json_text: str) -> Dict[str, Any]:
+    try:
+        data = storage.loads(json_text)
+    except (TypeError, ValueError):
+        data = {"raw_text": json_text}
+    return {path: value for path, _, value in flatten(data, text=False)}
+
+
+def json_text(value: Any) -> Optional[str]:
+    """A field value for a string column: strings as they are, anything else as JSON"""
+    if value is None or isinstance(value, str):
+        return value
+    return storage.dumps(value).decode("utf-8")
+
+
+async def discover_columns(filters: ExportFilter) -> List[str]:
+    """Every flattened field path present in the selected forms"""
+    stmt = select(FormField.path).distinct().join(ExtractionResult, ExtractionResult.id == FormField.form_id)
+    async with async_session() as db:
+        paths = (await db.execute(filters.apply(stmt))).scalars().all()
+    return sorted(paths)
+
+
+async def iter_batches(filters: ExportFilter, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield lists of {meta columns..., "fields": {path: value}} in id order"""
+    last_id = 0
+    while True:
+        stmt = filters.apply(
+            select(ExtractionResult.id, ExtractionResult.filename, ExtractionResult.json_data,
+                   ExtractionResult.created_at, ExtractionResult.updated_at)
+            .where(ExtractionResult.id > last_id)
+        ).order_by(ExtractionResult.id).limit(batch_size)
+        async with async_session() as db:
+            rows = (await db.execute(stmt)).all()
+        if not rows:
+            return
+        yield [
+            {
+                "id": row.id,
+                "form_name": row.filename,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+                "fields": flatten_form(row.json_data),
+            }
+            for row in rows
+        ]
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].id
+
+
+async def export_jsonl(filters: ExportFilter) -> AsyncIterator[bytes]:
+    async for batch in iter_batches(filters):
+        lines = []
+        for form in batch:
+            form["data"] = form.pop("fields")
+            lines.append(storage.dumps(form))
+        yield b"\n".join(lines) + b"\n"
+
+
+async def export_csv(filters: ExportFilter, columns: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(META_COLUMNS + [FIELD_PREFIX + column for column in columns])
+    async for batch in iter_batches(filters):
+        for form in batch:
+            fields = form["fields"]
+            writer.writerow([form[name] for name in META_COLUMNS] + [json_text(fields.get(column, "")) for column in columns])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def export_parquet(filters: ExportFilter, columns: List[str]) -> AsyncIterator[bytes]:
+    """One row group per batch; the bytes written so far are sent after each one"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [("id", pa.int64()), ("form_name", pa.string()), ("created_at", pa.string()), ("updated_at", pa.string())]
+        + [(FIELD_PREFIX + column, pa.string()) for column in columns]
+    )
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in iter_batches(filters):
+            arrays = {name: [form[name] for form in batch] for name in META_COLUMNS}
+            for column in columns:
+                arrays[FIELD_PREFIX + column] = [json_text(form["fields"].get(column)) for form in batch]
+            writer.write_table(pa.Table.from_pydict(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain.
+
+    tell() keeps counting from the start of the file because the Parquet
+    footer records absolute offsets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
@@ -0,0 +1,194 @@
+import os
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Optional
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "true").lower() == "true"
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "0.5"))
+MODEL_CALL_DEADLINE_SECONDS = float(os.getenv("MODEL_CALL_DEADLINE_SECONDS", "120"))
+
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError"}
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.errors = 0
+        self.responses_by_status: Dict[str, int] = {}
+        self.retries = 0
+        self.retries_exhausted = 0
+        self.deadline_exceeded = 0
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, status: Optional[int]):
+        with self._lock:
+            self.in_flight -= 1
+            if status is None:
+                self.errors += 1
+            else:
+                key = f"{status // 100}xx"
+                self.responses_by_status[key] = self.responses_by_status.get(key, 0) + 1
+
+    def count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+metrics = PoolMetrics()
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """Wraps the pooled transport to count requests, in-flight calls and response classes"""
+
+    def __init__(self, transport: httpx.HTTPTransport):
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        metrics.started()
+        status = None
+        try:
+            response = self.transport.handle_request(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.finished(status)
+
+    def close(self):
+        self.transport.close()
+
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """The process-wide keep-alive pool shared by the HF, Groq and Ollama clients"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            use_http2 = HTTP_ENABLE_HTTP2 and http2_available()
+            transport = httpx.HTTPTransport(
+                http2=use_http2,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            _client = httpx.Client(
+                transport=InstrumentedTransport(transport),
+                timeout=httpx.Timeout(MODEL_CALL_DEADLINE_SECONDS, connect=HTTP_CONNECT_TIMEOUT)
+            )
+            print(f"[OK] HTTP pool ready (max {HTTP_MAX_CONNECTIONS} connections, HTTP/2 {'on' if use_http2 else 'off'})")
+        return _client
+
+
+def close_http_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retries(call: Callable[[float], Any], deadline: float = MODEL_CALL_DEADLINE_SECONDS,
+                      max_retries: int = HTTP_MAX_RETRIES, base_delay: float = HTTP_RETRY_BASE_DELAY) -> Any:
+    """Run call(timeout) until it succeeds, retrying 429/5xx/connection errors with full-jitter backoff.
+
+    The timeout passed to each attempt is whatever is left of the overall deadline.
+    """
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            metrics.count("deadline_exceeded")
+            raise TimeoutError(f"Model call exceeded its {deadline:.0f}s deadline")
+        try:
+            return call(remaining)
+        except Exception as e:
+            if not _is_retryable(e):
+                raise
+            if attempt >= max_retries:
+                metrics.count("retries_exhausted")
+                raise
+            delay = _retry_after(e) or random.uniform(0, base_delay * 2 ** attempt)
+            if time.monotonic() - start + delay >= deadline:
+                metrics.count("deadline_exceeded")
+                raise
+            attempt += 1
+            metrics.count("retries")
+            print(f"[WARNING] Retrying model call after {type(e).__name__} (attempt {attempt}/{max_retries}, {delay:.2f}s)")
+            time.sleep(delay)
+
+
+def pool_stats() -> Dict[str, Any]:
+    stats = {
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive": HTTP_MAX_KEEPALIVE,
+        "http2": HTTP_ENABLE_HTTP2 and http2_available(),
+        "requests": metrics.requests,
+        "in_flight": metrics.in_flight,
+        "max_in_flight": metrics.max_in_flight,
+        "transport_errors": metrics.errors,
+        "responses": dict(metrics.responses_by_status),
+        "retries": metrics.retries,
+        "retries_exhausted": metrics.retries_exhausted,
+        "deadline_exceeded": metrics.deadline_exceeded
+    }
+    if _client is not None:
+        try:
+            # httpcore's pool is not public API; report it when we can
+            connections = _client._transport.transport._pool.connections
+            stats["open_connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+        except AttributeError:
+            pass
+    return stats
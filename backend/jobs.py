@@ -0,0 +1,262 @@
+import os
+import json
+import uuid
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sqlalchemy import select, insert, update, func, literal, or_, and_, LargeBinary
+from database import async_session, ExtractionJob
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+JOB_MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", "2"))
+JOB_RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "2"))
+# A running job whose lease is not renewed for this long is taken over by another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# How often idle workers look for jobs submitted through other processes
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+JobHandler = Callable[[bytes, str, str], Awaitable[Dict[str, Any]]]
+# Saves a successful result inside the transaction that completes the job
+JobSaver = Callable[[Any, ExtractionJob, Dict[str, Any]], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _pending_count():
+    return select(func.count()).select_from(ExtractionJob).where(ExtractionJob.status.in_(["queued", "running"]))
+
+
+def serialize_job(job: ExtractionJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "language": job.language,
+        "attempts": job.attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat()
+    }
+
+
+class JobQueue:
+    """Background extraction queue backed by the extraction_jobs table.
+
+    Jobs are persisted together with the uploaded bytes, and every worker
+    process claims them from the table with a lease, so any process can
+    run a job submitted to another one. A job whose worker died is taken
+    over once its lease expires.
+    """
+
+    def __init__(self, handler: JobHandler, workers: int = JOB_WORKERS, max_depth: int = JOB_QUEUE_MAX_DEPTH,
+                 max_retries: int = JOB_MAX_RETRIES, retry_delay: float = JOB_RETRY_DELAY_SECONDS,
+                 lease_seconds: float = JOB_LEASE_SECONDS, poll_interval: float = JOB_POLL_INTERVAL_SECONDS,
+                 on_complete: Optional[JobSaver] = None):
+        self.handler = handler
+        self.on_complete = on_complete
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        # Only jobs someone is waiting on have an event; the last waiter to leave removes it
+        self._events: Dict[str, asyncio.Event] = {}
+        self._waiters: Dict[str, int] = {}
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        depth = await self.depth()
+        if depth:
+            print(f"[OK] {depth} pending extraction job(s) in the queue")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def depth(self) -> int:
+        """Jobs queued or running, across all worker processes"""
+        async with async_session() as db:
+            return (await db.execute(_pending_count())).scalar_one()
+
+    async def submit(self, contents: bytes, filename: str, language: str) -> Dict[str, Any]:
+        job_id = str(uuid.uuid4())
+        async with async_session() as db:
+            # One statement counts and inserts, so concurrent submits cannot all pass the depth check
+            values = select(
+                literal(job_id), literal("queued"), literal(filename), literal(language), literal(contents, LargeBinary)
+            ).where(_pending_count().scalar_subquery() < self.max_depth)
+            inserted = await db.execute(
+                insert(ExtractionJob).from_select(["id", "status", "filename", "language", "payload"], values)
+            )
+            if inserted.rowcount != 1:
+                await db.rollback()
+                raise QueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+            await db.commit()
+            job = await db.get(ExtractionJob, job_id)
+
+        self._wakeup.set()
+        return serialize_job(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with async_session() as db:
+            job = await db.get(ExtractionJob, job_id)
+            return serialize_job(job) if job else None
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        """Block until the job's status changes or the timeout expires.
+
+        Changes made in this process wake the caller at once; changes made by
+        another worker process are noticed by polling every poll_interval.
+        """
+        event = self._events.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            initial = await self._status(job_id)
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, self.poll_interval))
+                    return
+                except asyncio.TimeoutError:
+                    if await self._status(job_id) != initial:
+                        return
+        finally:
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                self._events.pop(job_id, None)
+            elif self._events.get(job_id) is event:
+                event.clear()
+
+    async def _status(self, job_id: str) -> Optional[str]:
+        async with async_session() as db:
+            return (await db.execute(select(ExtractionJob.status).where(ExtractionJob.id == job_id))).scalar_one_or_none()
+
+    def _notify(self, job_id: str):
+        event = self._events.get(job_id)
+        if event:
+            event.set()
+
+    async def _finish(self, job: ExtractionJob, result: Optional[Dict[str, Any]] = None, **fields) -> bool:
+        """Write the outcome of a run, if this worker still holds the job.
+
+        Once a lease expires another worker may take the job over while the
+        first run is still going; only the worker named in claimed_by writes,
+        and the other run's outcome is dropped. A completed result is saved by
+        on_complete in the same transaction, so it is saved once.
+        """
+        async with async_session() as db:
+            if result is not None:
+                if self.on_complete:
+                    await self.on_complete(db, job, result)
+                fields["result"] = json.dumps(result)
+            finished = await db.execute(
+                update(ExtractionJob)
+                .where(ExtractionJob.id == job.id, ExtractionJob.claimed_by == self.worker_id)
+                .values(claimed_by=None, lease_expires_at=None, updated_at=datetime.utcnow(), **fields)
+            )
+            if finished.rowcount != 1:
+                await db.rollback()
+                print(f"[WARNING] Job {job.id} was taken over by another worker, dropping this run's outcome")
+                return False
+            await db.commit()
+        self._notify(job.id)
+        return True
+
+    async def _claim(self) -> Optional[ExtractionJob]:
+        """Atomically take the oldest runnable job: queued and due, or running with an expired lease"""
+        now = datetime.utcnow()
+        runnable = or_(
+            and_(ExtractionJob.status == "queued", or_(ExtractionJob.run_after.is_(None), ExtractionJob.run_after <= now)),
+            and_(ExtractionJob.status == "running", or_(ExtractionJob.lease_expires_at.is_(None), ExtractionJob.lease_expires_at < now))
+        )
+        async with async_session() as db:
+            candidates = (await db.execute(
+                select(ExtractionJob.id).where(runnable).order_by(ExtractionJob.created_at).limit(self.workers)
+            )).scalars().all()
+            for job_id in candidates:
+                # The WHERE re-checks runnability, so only one process wins each job
+                claimed = await db.execute(
+                    update(ExtractionJob)
+                    .where(ExtractionJob.id == job_id, runnable)
+                    .values(
+                        status="running",
+                        claimed_by=self.worker_id,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        attempts=ExtractionJob.attempts + 1,
+                        updated_at=now
+                    )
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    self._notify(job_id)
+                    return await db.get(ExtractionJob, job_id)
+        return None
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            async with async_session() as db:
+                await db.execute(
+                    update(ExtractionJob)
+                    .where(ExtractionJob.id == job_id, ExtractionJob.claimed_by == self.worker_id)
+                    .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                )
+                await db.commit()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Claiming a job failed: {type(e).__name__}: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Job {job.id} crashed: {type(e).__name__}: {e}")
+
+    async def _run(self, job: ExtractionJob):
+        lease = asyncio.create_task(self._renew_lease(job.id))
+        try:
+            result = await self.handler(job.payload, job.filename, job.language)
+            error = None if result.get("success") else result.get("error", "Extraction failed")
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        finally:
+            lease.cancel()
+
+        if error is None:
+            await self._finish(job, result, status="completed", error=None, payload=None)
+        # A quality-gate rejection would only be rejected again
+        elif job.attempts <= self.max_retries and not (result or {}).get("rejected"):
+            print(f"[WARNING] Job {job.id} failed (attempt {job.attempts}), retrying: {error}")
+            run_after = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+            await self._finish(job, status="queued", error=error, run_after=run_after)
+        else:
+            await self._finish(job, status="failed", error=error, payload=None)
@@ -1,28 +1,58 @@
 import os
 import json
+import time
+import asyncio
+import zipfile
+import io
+import base64
+from datetime import datetime
 from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from typing import List, Optional
+from contextlib import aclosing
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Depends, Request, Response, Query
+from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, and_, or_, Text, type_coerce
+from starlette.formparsers import MultiPartParser, MultiPartException
+from sqlalchemy.ext.asyncio import AsyncSession
 from agent import HandwritingExtractionAgent
-from database import get_db, FormData
+from database import get_db, init_db, async_session, ExtractionResult
+from jobs import JobQueue, QueueFullError, TERMINAL_STATUSES
+from cache import ExtractionCache, make_cache_key, CACHE_ENABLED
+import pdf
+import search
+import export
+import storage
+import changes
+import quality
+import migrations
+from http_pool import pool_stats
+import metrics
+from admission import AdmissionController, Rejected, client_key, INTERACTIVE, BATCH
+from metrics import timed_stage, STAGE_SECONDS, EXTRACTIONS_TOTAL
 
 # Load .env file from the backend directory
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf"}
 MAX_FILE_SIZE = 10 * 1024 * 1024
+FORMS_PAGE_SIZE = int(os.getenv("FORMS_PAGE_SIZE", "50"))
+FORMS_MAX_PAGE_SIZE = int(os.getenv("FORMS_MAX_PAGE_SIZE", "500"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Allowance for multipart boundaries and form fields on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
 
 agent = None
+job_queue = None
+extraction_cache = ExtractionCache()
+admission = AdmissionController()
 
 class FormDataCreate(BaseModel):
     form_name: str
@@ -45,16 +75,25 @@ class FormDataResponse(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global agent
+    global agent, job_queue
+    await init_db()
+    await search.init_search_index()
+    if migrations.MIGRATE_ON_STARTUP:
+        await migrations.migrate()
     try:
         agent = HandwritingExtractionAgent()
         print("[OK] Handwriting Extraction Agent initialized")
     except Exception as e:
         print(f"[WARNING] Agent initialization failed: {e}")
         print("Please ensure Ollama is running and reachable (see README)")
+    job_queue = JobQueue(process_job, on_complete=save_job_result)
+    await job_queue.start()
     yield
-    # Shutdown (if needed)
-    pass
+    # Shutdown
+    await job_queue.stop()
+    pdf.shutdown_pool()
+    if agent:
+        agent.shutdown()
 
 app = FastAPI(
     title="Handwriting Extraction API",
@@ -63,6 +102,173 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Interactive lanes are admitted ahead of batch work when the server is busy
+UPLOAD_LANES = {"/upload": INTERACTIVE, "/upload/stream": INTERACTIVE, "/upload/batch": BATCH, "/jobs": BATCH}
+
+@app.middleware("http")
+async def admit_uploads(request: Request, call_next):
+    """Rate-limit, cap in-flight uploads and budget their buffered bytes (see admission.py)"""
+    lane = UPLOAD_LANES.get(request.url.path)
+    if request.method != "POST" or lane is None:
+        return await call_next(request)
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        nbytes = int(content_length)
+    else:
+        nbytes = MAX_FILE_SIZE * (BATCH_MAX_FILES if request.url.path == "/upload/batch" else 1)
+    try:
+        ticket = await admission.admit(client_key(request), lane, nbytes)
+    except Rejected as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers={"Retry-After": str(e.retry_after)})
+    
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await ticket.release()
+        raise
+    
+    # Streaming responses keep working after call_next returns; release once the body is sent
+    body = response.body_iterator
+    
+    async def release_when_sent():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await ticket.release()
+    
+    response.body_iterator = release_when_sent()
+    return response
+
+UPLOAD_SIZE_LIMITS = {
+    "/upload": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/upload/stream": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/jobs": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/upload/batch": MAX_FILE_SIZE * BATCH_MAX_FILES + MULTIPART_OVERHEAD,
+}
+
+class UploadSizeLimit:
+    """Refuse upload bodies over UPLOAD_SIZE_LIMITS with 413.
+    
+    A Content-Length over the limit is refused before the body is read at all.
+    The body is also counted as it is received, so chunked requests and a
+    Content-Length that understates the body stop at the limit too: the 413 is
+    sent, and the endpoint sees the client disconnect.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        limit = UPLOAD_SIZE_LIMITS.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB"}
+        )
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            return await response(scope, receive, send)
+        
+        received = 0
+        started = False
+        refused = False
+        
+        async def limited_receive():
+            nonlocal received, refused
+            if refused:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit and not started:
+                    refused = True
+                    await response(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+        
+        async def guarded_send(message):
+            nonlocal started
+            # Whatever the endpoint answers after the 413 goes nowhere
+            if refused:
+                return
+            started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not refused:
+                raise
+
+app.add_middleware(UploadSizeLimit)
+
+class InMemoryMultiPartParser(MultiPartParser):
+    """MultiPartParser that keeps file parts in memory up to spool_max_size"""
+    
+    def __init__(self, *args, spool_max_size: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spool_max_size = spool_max_size
+
+class InMemoryUploadRequest(Request):
+    """A request whose multipart files are never written to disk.
+    
+    Starlette rolls a file part over 1MB into a temporary file. Upload bodies
+    are already capped at UPLOAD_SIZE_LIMITS by UploadSizeLimit, so up to that
+    limit the parts stay in memory.
+    """
+    
+    async def form(self, *, max_files=1000, max_fields=1000, max_part_size=1024 * 1024):
+        if self._form is not None or not self.headers.get("content-type", "").startswith("multipart/form-data"):
+            return await super().form(max_files=max_files, max_fields=max_fields, max_part_size=max_part_size)
+        try:
+            async with aclosing(self.stream()) as stream:
+                parser = InMemoryMultiPartParser(
+                    self.headers, stream, max_files=max_files, max_fields=max_fields, max_part_size=max_part_size,
+                    spool_max_size=UPLOAD_SIZE_LIMITS.get(self.scope["path"], MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+                )
+                self._form = await parser.parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        return self._form
+
+class InMemoryUploadRoute(APIRoute):
+    """Route that parses its multipart body with InMemoryUploadRequest"""
+    
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        
+        async def in_memory_handler(request: Request) -> Response:
+            return await handler(InMemoryUploadRequest(request.scope, request.receive))
+        
+        return in_memory_handler
+
+# Upload endpoints; included into the app after the last of them is defined
+uploads = APIRouter(route_class=InMemoryUploadRoute)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+        # Label by route template (/forms/{form_id}) rather than raw path to bound cardinality
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -78,8 +284,16 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "/upload": "POST - Upload handwritten image for extraction",
+            "/upload/batch": "POST - Upload many images or a zip archive, streams NDJSON results",
+            "/upload/stream": "POST - Upload an image and stream model output as it is generated (SSE)",
+            "/jobs": "POST - Queue handwritten image for background extraction",
+            "/jobs/{id}": "GET - Get job status and result",
+            "/jobs/{id}/events": "GET - Stream job status updates (SSE)",
             "/health": "GET - Health check",
+            "/metrics": "GET - Prometheus metrics (stage latency histograms, in-flight gauges)",
             "/forms": "GET - Get all form data",
+            "/forms/search": "GET - Full-text (q=) and field=value (where=) search",
+            "/forms/export": "GET - Stream all forms flattened to JSONL, CSV or Parquet (format=)",
             "/forms": "POST - Create new form data",
             "/forms/{id}": "GET - Get form data by ID",
             "/forms/{id}": "PUT - Update form data",
@@ -95,81 +309,244 @@ async def health_check():
     return {
         "status": "healthy",
         "agent_initialized": agent is not None,
+        "extraction_workers": agent.max_workers if agent else 0,
+        "vision_backends": agent.vision.stats() if agent else [],
+        "http_pool": pool_stats(),
+        "job_queue_depth": await job_queue.depth() if job_queue else 0,
+        "extraction_cache": extraction_cache.stats(),
+        "admission": await admission.stats(),
+        "translation_cache": agent.translator.stats() if agent and agent.translator else None,
         "ollama_host": ollama_host,
         "ollama_model": ollama_model,
         "backend_url": backend,
-        "langfuse_configured": bool(os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY"))
+        "langfuse_configured": bool(os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY")),
+        "tracing": agent.tracer.stats() if agent and agent.tracer else None
     }
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), language: str = "English", db: Session = Depends(get_db)):
+@app.get("/metrics")
+async def prometheus_metrics():
+    metrics.JOB_QUEUE_DEPTH.set(await job_queue.depth() if job_queue else 0)
+    metrics.MODEL_CALLS_IN_FLIGHT.set(pool_stats()["in_flight"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def require_agent():
     if not agent:
         raise HTTPException(
             status_code=503,
             detail="Agent not initialized. Please ensure the Ollama service is running."
         )
-    
-    filename = file.filename or "unknown.jpg"
+
+def validate_upload_filename(filename: str):
     file_ext = Path(filename).suffix.lower()
     if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail=f"File type {file_ext} not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
-    
-    if file_ext == ".pdf":
+
+def validate_upload_size(contents: bytes):
+    if len(contents) > MAX_FILE_SIZE:
         raise HTTPException(
             status_code=400,
-            detail="PDF processing requires additional setup with poppler-utils. Please upload JPG or PNG images."
+            detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB"
         )
-    
-    file_path = None
-    try:
-        contents = await file.read()
-        
-        if len(contents) > MAX_FILE_SIZE:
+
+async def read_upload(file: UploadFile, limit: int = MAX_FILE_SIZE) -> bytes:
+    """Read an upload in chunks, stopping as soon as it goes over the size limit"""
+    contents = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        contents.extend(chunk)
+        if len(contents) > limit:
             raise HTTPException(
                 status_code=400,
-                detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB"
+                detail=f"File size exceeds maximum allowed size of {limit / (1024*1024)}MB"
             )
-        
-        file_path = UPLOAD_DIR / filename
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        
-        result = agent.extract_handwriting(str(file_path), filename, language)
-        
+    return bytes(contents)
+
+async def lookup_cache(contents: bytes, filename: str, language: str):
+    """Return (cache_key, cached result or None); the key is None when caching is disabled"""
+    if not CACHE_ENABLED:
+        return None, None
+    cache_key = make_cache_key(contents, language, agent.cache_version, agent.model_name)
+    cached = await extraction_cache.get(cache_key)
+    if cached is None:
+        return cache_key, None
+    return cache_key, {
+        "success": True,
+        "filename": filename,
+        "extracted_data": cached,
+        "message": "Handwriting extraction served from cache",
+        "cached": True
+    }
+
+async def store_in_cache(cache_key, result):
+    if cache_key and result["success"]:
         try:
-            os.remove(file_path)
+            await extraction_cache.put(cache_key, result["extracted_data"])
         except Exception as e:
-            print(f"[WARNING] Failed to delete temporary file: {e}")
+            print(f"[WARNING] Failed to write extraction cache: {e}")
+
+def record_extraction(result, start: float):
+    """Count the outcome and add total_ms (since start) to result["timings"]"""
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage="total")
+    if result.get("cached"):
+        outcome = "cached"
+    elif result.get("rejected"):
+        outcome = "rejected"
+    else:
+        outcome = "success" if result["success"] else "error"
+    EXTRACTIONS_TOTAL.inc(outcome=outcome)
+    result.setdefault("timings", {})["total_ms"] = round(elapsed * 1000, 1)
+
+async def check_quality(contents: bytes, filename: str):
+    """Run the local quality gate (see quality.py).
+    
+    Returns (report, rejected result or None); report is None when the gate is
+    off or the image could not be analysed, and the model gets to try anyway.
+    """
+    if quality.QUALITY_GATE == "off":
+        return None, None
+    timings = {}
+    try:
+        with timed_stage("quality", timings):
+            report = await asyncio.to_thread(quality.assess, contents)
+            async with async_session() as db:
+                report["duplicate_of"] = await quality.find_duplicates(db, report["phash"], report["detail_hash"])
+    except Exception as e:
+        print(f"[WARNING] Quality check failed for {filename}: {e}")
+        return None, None
+    
+    reason = quality.rejection_reason(report)
+    action = "rejected" if reason else "flagged" if report["verdict"] != "ok" or report["duplicate_of"] else "passed"
+    quality.QUALITY_CHECKS.inc(verdict=report["verdict"], action=action)
+    if not reason:
+        return report, None
+    print(f"[WARNING] Rejected {filename} before extraction: {reason}")
+    return report, {
+        "success": False,
+        "rejected": True,
+        "filename": filename,
+        "error": reason,
+        "quality": report,
+        "timings": timings,
+        "message": "Image rejected by the quality check; it was not sent to the model"
+    }
+
+async def extract_image(contents: bytes, filename: str, language: str):
+    report, rejected = await check_quality(contents, filename)
+    if rejected:
+        return rejected
+    result = await agent.extract_handwriting_async(contents, filename, language)
+    if report:
+        result["quality"] = report
+    return result
+
+async def run_extraction(contents: bytes, filename: str, language: str):
+    """Extract from the cache, a PDF or an image; result["timings"] holds per-stage milliseconds"""
+    start = time.perf_counter()
+    cache_key, result = await lookup_cache(contents, filename, language)
+    if not result:
+        if Path(filename).suffix.lower() == ".pdf":
+            result = await pdf.extract_pdf(agent, contents, filename, language)
+        else:
+            result = await extract_image(contents, filename, language)
+        await store_in_cache(cache_key, result)
+    
+    record_extraction(result, start)
+    return result
+
+async def process_job(contents: bytes, filename: str, language: str):
+    """Job queue handler: extract; a successful result is saved by save_job_result"""
+    if not agent:
+        return {"success": False, "filename": filename, "error": "Agent not initialized"}
+    
+    return await run_extraction(contents, filename, language)
+
+async def save_job_result(db, job, result):
+    """Save a job's result like /upload does, in the transaction that completes the job"""
+    item = (job.filename, result["extracted_data"], len(job.payload), result["timings"], image_hash(result))
+    [result["form_id"]] = await save_extractions([item], result["timings"], db=db)
+    result["saved_to_database"] = True
+
+def image_hash(result):
+    report = result.get("quality") or {}
+    return (report["phash"], report["detail_hash"]) if report.get("phash") else None
+
+async def save_extractions(items, timings=None, db=None):
+    """Insert (filename, extracted_data, file_size, timings, image_hash) tuples in one transaction, returning their ids.
+    
+    The time taken is recorded as the db stage, and as db_ms in timings when given.
+    Given a session, the rows are written in its transaction and the caller commits.
+    """
+    with timed_stage("db", timings):
+        if db is not None:
+            return await insert_extractions(db, items)
+        async with async_session() as db:
+            ids = await insert_extractions(db, items)
+            await db.commit()
+            return ids
+
+async def insert_extractions(db, items):
+    records = [
+        ExtractionResult(
+            filename=filename,
+            json_data=json.dumps(data),
+            file_size=file_size,
+            processing_time=(item_timings or {}).get("total_ms", 0.0) / 1000,
+            timings=json.dumps(item_timings) if item_timings else None
+        )
+        for filename, data, file_size, item_timings, _ in items
+    ]
+    db.add_all(records)
+    await db.flush()
+    for record, item in zip(records, items):
+        await search.index_form(db, record.id, record.filename, record.json_data)
+        await quality.index_hash(db, record.id, item[4])
+    for record in records:
+        await changes.stamp(db, record)
+    return [record.id for record in records]
+
+@uploads.post("/upload")
+async def upload_file(file: UploadFile = File(...), language: str = "English"):
+    require_agent()
+    
+    filename = file.filename or "unknown.jpg"
+    validate_upload_filename(filename)
+    
+    try:
+        timings = {}
+        with timed_stage("upload_read", timings):
+            contents = await read_upload(file)
+        
+        result = await run_extraction(contents, filename, language)
+        timings.update(result["timings"])
         
         if result["success"]:
             try:
-                db_form = FormData(
-                    form_name=filename,
-                    data=json.dumps(result["extracted_data"])
-                )
-                db.add(db_form)
-                db.commit()
-                db.refresh(db_form)
+                [form_id] = await save_extractions([(filename, result["extracted_data"], len(contents), timings, image_hash(result))], timings)
                 
                 formatted_result = {
                     "success": result["success"],
                     "filename": result["filename"],
                     "message": result["message"],
                     "extracted_data": result["extracted_data"],
-                    "form_id": db_form.id,
+                    "timings": timings,
+                    "quality": result.get("quality"),
+                    "preprocessing": result.get("preprocessing"),
+                    "form_id": form_id,
                     "saved_to_database": True
                 }
             except Exception as db_error:
-                db.rollback()
                 print(f"[WARNING] Failed to save to database: {db_error}")
                 formatted_result = {
                     "success": result["success"],
                     "filename": result["filename"],
                     "message": result["message"],
                     "extracted_data": result["extracted_data"],
+                    "timings": timings,
+                    "quality": result.get("quality"),
+                    "preprocessing": result.get("preprocessing"),
                     "saved_to_database": False
                 }
             
@@ -177,6 +554,8 @@ async def upload_file(file: UploadFile = File(...), language: str = "English", d
                 content=formatted_result,
                 media_type="application/json"
             )
+        elif result.get("rejected"):
+            raise HTTPException(status_code=422, detail=result["error"])
         else:
             raise HTTPException(status_code=500, detail=result.get("error", "Extraction failed"))
             
@@ -189,103 +568,504 @@ async def upload_file(file: UploadFile = File(...), language: str = "English", d
         print(f"[ERROR] Upload error: {error_type}: {error_details}")
         print(f"[ERROR] Traceback: {traceback.format_exc()}")
         
-        if file_path and file_path.exists():
-            try:
-                os.remove(file_path)
-            except:
-                pass
-        
         raise HTTPException(
             status_code=500,
             detail=f"Error processing file: {error_type}: {error_details}"
         )
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@uploads.post("/upload/stream")
+async def upload_stream(file: UploadFile = File(...), language: str = "English"):
+    require_agent()
+    
+    filename = file.filename or "unknown.jpg"
+    validate_upload_filename(filename)
+    if Path(filename).suffix.lower() == ".pdf":
+        raise HTTPException(status_code=400, detail="Streaming is not supported for PDFs; use /upload or /jobs")
+    
+    contents = await read_upload(file)
+    
+    async def event_stream():
+        start = time.perf_counter()
+        cache_key, result = await lookup_cache(contents, filename, language)
+        if result is None:
+            report, result = await check_quality(contents, filename)
+        if result is None:
+            async for event in agent.stream_extraction_async(contents, filename, language):
+                if event["type"] == "delta":
+                    yield sse_event("delta", {"text": event["text"]})
+                else:
+                    result = event["result"]
+            if report:
+                result["quality"] = report
+            await store_in_cache(cache_key, result)
+        record_extraction(result, start)
+        
+        if not result["success"]:
+            yield sse_event("error", result)
+            return
+        
+        try:
+            [result["form_id"]] = await save_extractions([(filename, result["extracted_data"], len(contents), result.get("timings"), image_hash(result))], result.get("timings"))
+            result["saved_to_database"] = True
+        except Exception as db_error:
+            print(f"[WARNING] Failed to save to database: {db_error}")
+            result["saved_to_database"] = False
+        yield sse_event("result", result)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def batch_too_large(count: int):
+    return HTTPException(status_code=400, detail=f"Batch contains {count} files; maximum is {BATCH_MAX_FILES}")
+
+def expand_batch_upload(filename: str, contents: bytes, room: int) -> list:
+    """(filename, contents) for a single upload, or for every image inside a zip archive.
+    
+    room is how many more files the batch may hold. Zip limits are checked from the
+    central directory before anything is decompressed, and each member is read with
+    a bound, so a forged header size cannot get past them.
+    """
+    if Path(filename).suffix.lower() != ".zip":
+        if room < 1:
+            raise batch_too_large(BATCH_MAX_FILES + 1)
+        return [(filename, contents)]
+    
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        members = archive.infolist()
+        if len(members) > room:
+            raise batch_too_large(BATCH_MAX_FILES - room + len(members))
+        images = [m for m in members if not m.is_dir() and Path(m.filename).suffix.lower() in ALLOWED_EXTENSIONS]
+        declared = sum(m.file_size for m in images if m.file_size <= MAX_FILE_SIZE)
+        if declared > MAX_FILE_SIZE * BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"{filename} expands to more than {MAX_FILE_SIZE * BATCH_MAX_FILES / (1024*1024)}MB")
+        
+        entries = []
+        for member in images:
+            if member.file_size > MAX_FILE_SIZE:
+                entries.append((member.filename, None))
+                continue
+            with archive.open(member) as f:
+                data = f.read(member.file_size + 1)
+            # More data than the header declared: the header is forged
+            entries.append((member.filename, data if len(data) <= member.file_size else None))
+        return entries
+
+@uploads.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...), language: str = "English"):
+    require_agent()
+    
+    if len(files) > BATCH_MAX_FILES:
+        raise batch_too_large(len(files))
+    
+    # Read everything up front: the upload files are closed once this handler returns
+    entries = []
+    for file in files:
+        filename = file.filename or "unknown.jpg"
+        contents = await read_upload(file, MAX_FILE_SIZE * BATCH_MAX_FILES)
+        try:
+            entries.extend(expand_batch_upload(filename, contents, BATCH_MAX_FILES - len(entries)))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"{filename} is not a valid zip archive")
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def process(index: int, filename: str, contents: bytes):
+        async with semaphore:
+            try:
+                validate_upload_filename(filename)
+                if contents is None:
+                    raise HTTPException(status_code=400, detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB")
+                validate_upload_size(contents)
+                result = await run_extraction(contents, filename, language)
+            except HTTPException as e:
+                result = {"success": False, "filename": filename, "error": e.detail}
+            except Exception as e:
+                result = {"success": False, "filename": filename, "error": f"{type(e).__name__}: {e}"}
+            return index, len(contents or b""), result
+    
+    async def result_stream():
+        tasks = [asyncio.create_task(process(i, name, data)) for i, (name, data) in enumerate(entries)]
+        completed = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, file_size, result = await next_done
+                if result["success"]:
+                    completed.append((index, result["filename"], result["extracted_data"], file_size, result.get("timings"), image_hash(result)))
+                yield json.dumps({"type": "result", "index": index, **result}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        summary = {"type": "summary", "total": len(entries), "succeeded": len(completed), "form_ids": {}}
+        if completed:
+            completed.sort()
+            try:
+                ids = await save_extractions([item[1:] for item in completed])
+                summary["form_ids"] = {index: form_id for (index, *_), form_id in zip(completed, ids)}
+                summary["saved_to_database"] = True
+            except Exception as db_error:
+                print(f"[WARNING] Failed to save batch to database: {db_error}")
+                summary["saved_to_database"] = False
+        yield json.dumps(summary) + "\n"
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@uploads.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...), language: str = "English"):
+    require_agent()
+    
+    filename = file.filename or "unknown.jpg"
+    validate_upload_filename(filename)
+    
+    contents = await read_upload(file)
+    
+    try:
+        return await job_queue.submit(contents, filename, language)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+app.include_router(uploads)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with id {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with id {job_id} not found")
+    
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event(last_status, current)
+            if last_status in TERMINAL_STATUSES:
+                return
+            await job_queue.wait_for_change(job_id, timeout=15)
+            current = await job_queue.get(job_id)
+            # Keep idle connections alive through proxies
+            yield ": ping\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+def serialize_form(record: ExtractionResult):
+    return {
+        "id": record.id,
+        "form_name": record.filename,
+        "data": record.json_data,
+        "created_at": record.created_at.isoformat(),
+        "updated_at": record.updated_at.isoformat()
+    }
+
 @app.post("/forms", response_model=FormDataResponse)
-async def create_form(form_data: FormDataCreate, db: Session = Depends(get_db)):
+async def create_form(form_data: FormDataCreate, db: AsyncSession = Depends(get_db)):
     try:
-        db_form = FormData(form_name=form_data.form_name, data=form_data.data)
-        db.add(db_form)
-        db.commit()
-        db.refresh(db_form)
-        return {
-            "id": db_form.id,
-            "form_name": db_form.form_name,
-            "data": db_form.data,
-            "created_at": db_form.created_at.isoformat(),
-            "updated_at": db_form.updated_at.isoformat()
-        }
+        record = ExtractionResult(filename=form_data.form_name, json_data=form_data.data)
+        db.add(record)
+        await db.flush()
+        await search.index_form(db, record.id, record.filename, record.json_data)
+        await changes.stamp(db, record)
+        await db.commit()
+        await db.refresh(record)
+        return serialize_form(record)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-def serialize_form(form: FormData):
-    return {
-        "id": form.id,
-        "form_name": form.form_name,
-        "data": form.data,
-        "created_at": form.created_at.isoformat(),
-        "updated_at": form.updated_at.isoformat()
-    }
+# API field name -> column, for projections and sorting on GET /forms
+FORM_COLUMNS = {
+    "id": ExtractionResult.id,
+    "form_name": ExtractionResult.filename,
+    "data": ExtractionResult.json_data,
+    "created_at": ExtractionResult.created_at,
+    "updated_at": ExtractionResult.updated_at,
+    "version": ExtractionResult.version
+}
+FORM_SORT_FIELDS = {"id", "form_name", "created_at", "updated_at", "version"}
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode("utf-8")).decode("ascii")
+
+def form_column(field: str):
+    # The stored data is read as is and written into responses without parsing (see storage.encode_rows)
+    column = FORM_COLUMNS[field]
+    return (type_coerce(column, Text) if field == "data" else column).label(field)
+
+def cache_headers(etag: str, last_modified: datetime, version: int) -> dict:
+    # no-cache: clients may keep the response but must revalidate it, which costs a 304 when nothing changed.
+    # Last-Modified is informational; only the ETag is used for 304s (see changes.not_modified)
+    return {"ETag": etag, "Last-Modified": changes.http_date(last_modified), "Cache-Control": "no-cache", "X-Forms-Version": str(version)}
+
+def decode_cursor(cursor: str, sort_field: str):
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if sort_field in ("created_at", "updated_at"):
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/forms")
-async def get_all_forms(db: Session = Depends(get_db)):
+async def get_all_forms(
+    request: Request,
+    limit: int = Query(FORMS_PAGE_SIZE, ge=1, le=FORMS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    name_prefix: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    data_format: str = "string",
+    db: AsyncSession = Depends(get_db)
+):
+    """List forms one page at a time.
+    
+    Pages are keyset-paginated: pass the X-Next-Cursor response header back as
+    ?cursor= to get the next page. sort is a field name, prefixed with "-" for
+    descending. fields is a comma-separated projection, e.g. fields=id,form_name,created_at
+    to leave out the data payload. data_format=object returns data as JSON
+    instead of a JSON-encoded string.
+    
+    The ETag changes with every write to any form, so a client repeating a
+    request with If-None-Match gets 304 until something changes. X-Forms-Version
+    is the version to pass to /forms/changes to follow later writes.
+    """
+    if data_format not in ("string", "object"):
+        raise HTTPException(status_code=400, detail="data_format must be string or object")
+    descending = sort.startswith("-")
+    sort_field = sort.lstrip("-")
+    if sort_field not in FORM_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by {sort_field}. Allowed: {', '.join(sorted(FORM_SORT_FIELDS))}")
+    
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(FORM_COLUMNS)
+    unknown = [f for f in selected if f not in FORM_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # The cursor needs the sort key and id even when they are not requested
+    query_fields = list(dict.fromkeys(selected + [sort_field, "id"]))
+    
+    sort_column = FORM_COLUMNS[sort_field]
+    id_column = ExtractionResult.id
+    stmt = select(*[form_column(f) for f in query_fields])
+    
+    if name_prefix:
+        # A range instead of LIKE so the filename index can be used
+        stmt = stmt.where(ExtractionResult.filename >= name_prefix, ExtractionResult.filename < name_prefix + "\uffff")
+    if created_after:
+        stmt = stmt.where(ExtractionResult.created_at >= created_after)
+    if created_before:
+        stmt = stmt.where(ExtractionResult.created_at < created_before)
+    
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_field)
+        if sort_field == "id":
+            stmt = stmt.where(id_column < row_id if descending else id_column > row_id)
+        elif descending:
+            stmt = stmt.where(or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id)))
+        else:
+            stmt = stmt.where(or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > row_id)))
+    
+    order = [sort_column.desc(), id_column.desc()] if descending else [sort_column.asc(), id_column.asc()]
+    stmt = stmt.order_by(*order).limit(limit + 1)
+    
+    try:
+        # Read in the same transaction as the rows, so the version matches them
+        version, changed_at, _ = await changes.current(db)
+        headers = cache_headers(f'"forms-{version}"', changed_at, version)
+        if changes.not_modified(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        rows = (await db.execute(stmt)).mappings().all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last[sort_field], last["id"])
+    
+    return Response(storage.encode_rows(rows, selected, data_format == "object"), media_type="application/json", headers=headers)
+
+@app.get("/forms/export")
+async def export_forms(
+    format: str = "jsonl",
+    columns: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+):
+    """Stream every matching form with its extracted JSON flattened into columns.
+
+    format is jsonl, csv or parquet. columns is a comma-separated list of field
+    paths (applicant.name,items.0.qty) for csv/parquet, written as data.<path>
+    columns; by default every path seen in the matching forms is a column.
+    Filters are the same as GET /forms.
+    """
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format}. Allowed: {', '.join(export.FORMATS)}")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow installed on the server")
+
+    filters = export.ExportFilter(name_prefix, created_after, created_before)
+    if format == "jsonl":
+        body = export.export_jsonl(filters)
+    else:
+        if columns:
+            # Duplicate columns would make an invalid Parquet schema
+            selected = list(dict.fromkeys(c.strip() for c in columns.split(",") if c.strip()))
+        else:
+            try:
+                selected = await export.discover_columns(filters)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+        writer = export.export_csv if format == "csv" else export.export_parquet
+        body = writer(filters, selected)
+
+    filename = f"forms-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/forms/search")
+async def search_forms(
+    q: Optional[str] = None,
+    where: List[str] = Query(default=[]),
+    limit: int = Query(FORMS_PAGE_SIZE, ge=1, le=FORMS_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search extracted data: q is full text, each where is field=value (e.g. where=policy_number=PN-1).
+    
+    Field names match case-insensitively with spaces as underscores; use a dotted
+    path (applicant.name) to match a nested field exactly.
+    """
+    filters = []
+    for condition in where:
+        field, sep, value = condition.partition("=")
+        if not sep or not field.strip():
+            raise HTTPException(status_code=400, detail=f"Invalid where clause '{condition}', expected field=value")
+        filters.append((field.strip(), value))
+    if not q and not filters:
+        raise HTTPException(status_code=400, detail="Provide q and/or at least one where=field=value")
+    
     try:
-        stmt = select(FormData)
-        forms = db.execute(stmt).scalars().all()
-        return [serialize_form(form) for form in forms]
+        ids = await search.search_form_ids(db, q, filters, limit)
+        if not ids:
+            return []
+        records = (await db.execute(select(ExtractionResult).where(ExtractionResult.id.in_(ids)))).scalars().all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    by_id = {record.id: record for record in records}
+    return [serialize_form(by_id[form_id]) for form_id in ids if form_id in by_id]
+
+@app.get("/forms/changes")
+async def get_form_changes(
+    since: int = Query(..., ge=0),
+    limit: int = Query(FORMS_MAX_PAGE_SIZE, ge=1, le=FORMS_MAX_PAGE_SIZE),
+    data_format: str = "string",
+    db: AsyncSession = Depends(get_db)
+):
+    """Forms written and ids deleted after version since, oldest change first.
+    
+    Returns {"version", "forms", "deleted", "more"}. Pass version back as since
+    to continue; when more is false the client is up to date. Start from the
+    X-Forms-Version header of GET /forms, or since=0 for everything.
+    """
+    if data_format not in ("string", "object"):
+        raise HTTPException(status_code=400, detail="data_format must be string or object")
+    
+    try:
+        version, _, pruned_version = await changes.current(db)
+        if since < pruned_version:
+            raise HTTPException(status_code=410, detail=f"Changes before version {pruned_version} are no longer kept; reload /forms")
+        fields = list(FORM_COLUMNS)
+        forms, deleted, last = await changes.changes_since(db, since, limit, [form_column(f) for f in fields])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    more = last is not None and last < version
+    body = b"".join([
+        b'{"version":', storage.dumps(last if more else max(version, since)),
+        b',"forms":', storage.encode_rows(forms, fields, data_format == "object"),
+        b',"deleted":', storage.dumps(deleted),
+        b',"more":', storage.dumps(more), b"}"
+    ])
+    return Response(body, media_type="application/json", headers={"X-Forms-Version": str(version)})
 
 @app.get("/forms/{form_id}", response_model=FormDataResponse)
-async def get_form(form_id: int, db: Session = Depends(get_db)):
+async def get_form(form_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     try:
-        stmt = select(FormData).where(FormData.id == form_id)
-        form = db.execute(stmt).scalar_one_or_none()
-        if not form:
+        # Version and timestamp first, so a 304 does not load the data
+        state = (await db.execute(
+            select(ExtractionResult.version, ExtractionResult.updated_at).where(ExtractionResult.id == form_id)
+        )).first()
+        if not state:
             raise HTTPException(status_code=404, detail=f"Form with id {form_id} not found")
-        return serialize_form(form)
+        headers = cache_headers(f'"form-{form_id}-{state.version}"', state.updated_at, state.version)
+        if changes.not_modified(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        
+        record = await db.get(ExtractionResult, form_id)
+        response.headers.update(headers)
+        return serialize_form(record)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/forms/{form_id}", response_model=FormDataResponse)
-async def update_form(form_id: int, form_data: FormDataUpdate, db: Session = Depends(get_db)):
+async def update_form(form_id: int, form_data: FormDataUpdate, db: AsyncSession = Depends(get_db)):
     try:
-        stmt = select(FormData).where(FormData.id == form_id)
-        form = db.execute(stmt).scalar_one_or_none()
-        if not form:
+        record = await db.get(ExtractionResult, form_id)
+        if not record:
             raise HTTPException(status_code=404, detail=f"Form with id {form_id} not found")
         
         if form_data.form_name is not None:
-            form.form_name = form_data.form_name
+            record.filename = form_data.form_name
         if form_data.data is not None:
-            form.data = form_data.data
+            record.json_data = form_data.data
         
-        db.commit()
-        db.refresh(form)
-        return serialize_form(form)
+        await search.index_form(db, record.id, record.filename, record.json_data)
+        await changes.stamp(db, record)
+        await db.commit()
+        await db.refresh(record)
+        return serialize_form(record)
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/forms/{form_id}")
-async def delete_form(form_id: int, db: Session = Depends(get_db)):
+async def delete_form(form_id: int, db: AsyncSession = Depends(get_db)):
     try:
-        stmt = select(FormData).where(FormData.id == form_id)
-        form = db.execute(stmt).scalar_one_or_none()
-        if not form:
+        record = await db.get(ExtractionResult, form_id)
+        if not record:
             raise HTTPException(status_code=404, detail=f"Form with id {form_id} not found")
         
-        db.delete(form)
-        db.commit()
+        await db.delete(record)
+        await search.remove_form(db, form_id)
+        await quality.remove_hash(db, form_id)
+        await changes.record_deletion(db, form_id)
+        await db.commit()
         return {"message": f"Form with id {form_id} deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+"""
+Versioned schema migrations.
+
+Each migration has a version number and runs once; applied versions are
+recorded in the schema_version table. A migration's schema step runs in a
+single transaction. Its optional backfill runs in keyset batches that commit
+separately, so a large table is never locked for the whole run and an
+interrupted backfill picks up where it stopped on the next run.
+
+Migrations run at startup (unless MIGRATE_ON_STARTUP=false) or by hand:
+    python migrations.py status
+    python migrations.py upgrade
+"""
+import os
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import select, update, func, inspect, text, exists, Column, DateTime, Float, Integer, MetaData, String, Text
+from sqlalchemy.schema import CreateTable
+from database import (engine, async_session, init_db, ExtractionResult, ExtractionJob, FormField, FormTombstone,
+                      FormVersion, SchemaVersion)
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+# Pause between backfill batches so live requests get the database in between
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.getenv("MIGRATION_BATCH_PAUSE_SECONDS", "0.05"))
+
+
+class Migration:
+    def __init__(self, version: int, name: str, schema: Optional[Callable] = None,
+                 backfill: Optional[Callable[[], Awaitable[int]]] = None):
+        self.version = version
+        self.name = name
+        self.schema = schema
+        self.backfill = backfill
+
+
+async def _column_names(conn, table: str) -> List[str]:
+    return await conn.run_sync(lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)])
+
+
+async def add_column(conn, table: str, column: Column):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there (fresh databases get it from create_all)"""
+    if column.name in await _column_names(conn, table):
+        return
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if column.default is not None and column.default.is_scalar:
+        ddl += f" DEFAULT {column.default.arg!r}"
+    await conn.execute(text(ddl))
+    print(f"[OK] Added column {table}.{column.name}")
+
+
+async def create_indexes(conn, model):
+    # create_all skips indexes on tables that already exist
+    def create(sync_conn):
+        existing = {c["name"] for c in inspect(sync_conn).get_columns(model.__tablename__)}
+        for index in model.__table__.indexes:
+            # Indexes on columns added by a later migration are created by that migration
+            if all(column.name in existing for column in index.columns):
+                index.create(sync_conn, checkfirst=True)
+    await conn.run_sync(create)
+
+
+async def backfill_in_batches(select_ids, apply: Callable, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Page through select_ids (a select of one integer id column) by keyset and apply(db, ids) per batch.
+
+    Each batch is its own transaction.
+    """
+    id_column = select_ids.selected_columns[0]
+    last_id = 0
+    total = 0
+    while True:
+        async with async_session() as db:
+            stmt = select_ids.where(id_column > last_id).order_by(id_column).limit(batch_size)
+            ids = list((await db.execute(stmt)).scalars().all())
+            if not ids:
+                return total
+            await apply(db, ids)
+            await db.commit()
+        last_id = ids[-1]
+        total += len(ids)
+        print(f"[OK] Backfilled {total} rows")
+        await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+
+async def _add_timing_columns(conn):
+    await add_column(conn, "extraction_results", Column("processing_time", Float, default=0.0))
+    await add_column(conn, "extraction_results", Column("file_size", Integer, default=0))
+
+
+async def _add_extraction_indexes(conn):
+    await create_indexes(conn, ExtractionResult)
+
+
+async def _add_timings_column(conn):
+    await add_column(conn, "extraction_results", Column("timings", Text))
+
+
+async def _add_job_lease_columns(conn):
+    await add_column(conn, "extraction_jobs", Column("claimed_by", String(64)))
+    await add_column(conn, "extraction_jobs", Column("lease_expires_at", DateTime))
+    await add_column(conn, "extraction_jobs", Column("run_after", DateTime))
+    await create_indexes(conn, ExtractionJob)
+
+
+async def _backfill_search_index() -> int:
+    import search
+
+    await search.init_search_index()
+    unindexed = select(ExtractionResult.id).where(~exists().where(FormField.form_id == ExtractionResult.id))
+
+    async def index_batch(db, ids):
+        rows = await db.execute(
+            select(ExtractionResult.id, ExtractionResult.filename, ExtractionResult.json_data)
+            .where(ExtractionResult.id.in_(ids))
+        )
+        for form_id, filename, json_data in rows:
+            await search.index_form(db, form_id, filename, json_data)
+
+    return await backfill_in_batches(unindexed, index_batch)
+
+
+async def _add_form_version_column(conn):
+    await add_column(conn, "extraction_results", Column("version", Integer, default=0))
+    await create_indexes(conn, ExtractionResult)
+
+
+async def _backfill_form_versions() -> int:
+    # Existing forms all count as written at version 1, so /forms/changes?since=0 returns them
+    async with async_session() as db:
+        if not await db.get(FormVersion, 1):
+            db.add(FormVersion(id=1, version=1))
+            await db.commit()
+
+    async def stamp_batch(db, ids):
+        await db.execute(update(ExtractionResult).where(ExtractionResult.id.in_(ids)).values(
+            version=1, updated_at=ExtractionResult.updated_at))
+
+    return await backfill_in_batches(select(ExtractionResult.id).where(ExtractionResult.version == 0), stamp_batch)
+
+
+async def _add_image_detail_hash_column(conn):
+    await add_column(conn, "image_hashes", Column("detail_hash", String(64)))
+
+
+async def _rebuild_extraction_results_autoincrement(conn):
+    # SQLite reuses the highest rowid after a delete unless the table is AUTOINCREMENT,
+    # which only CREATE TABLE can set: copy the rows into a rebuilt table
+    if conn.dialect.name != "sqlite":
+        return
+    table = ExtractionResult.__table__
+    ddl = (await conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                              {"name": table.name})).scalar_one()
+    if "AUTOINCREMENT" in ddl.upper():
+        return
+
+    rebuilt = table.to_metadata(MetaData(), name=f"{table.name}_rebuild")
+    columns = ", ".join(column.name for column in table.columns)
+    await conn.execute(CreateTable(rebuilt))
+    await conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    await conn.execute(text(f"DROP TABLE {table.name}"))
+    await conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+    await create_indexes(conn, ExtractionResult)
+
+    # Start past the ids of forms already deleted as well as those still there
+    highest = (await conn.execute(select(func.max(FormTombstone.form_id)))).scalar() or 0
+    await conn.execute(text("UPDATE sqlite_sequence SET seq = max(seq, :highest) WHERE name = :name"),
+                       {"highest": highest, "name": table.name})
+    await conn.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT :name, :highest "
+                            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"),
+                       {"highest": highest, "name": table.name})
+    print(f"[OK] Rebuilt {table.name} with AUTOINCREMENT ids")
+
+
+# Append only: never renumber or edit a migration that has shipped
+MIGRATIONS = [
+    Migration(1, "extraction_results processing_time and file_size", schema=_add_timing_columns),
+    Migration(2, "extraction_results filename and created_at indexes", schema=_add_extraction_indexes),
+    Migration(3, "search index for existing forms", backfill=_backfill_search_index),
+    Migration(4, "extraction_results per-stage timings", schema=_add_timings_column),
+    Migration(5, "extraction_jobs leases for multi-worker claiming", schema=_add_job_lease_columns),
+    Migration(6, "extraction_results versions for conditional GETs and /forms/changes",
+              schema=_add_form_version_column, backfill=_backfill_form_versions),
+    Migration(7, "image_hashes detail hash for confirming duplicates", schema=_add_image_detail_hash_column),
+    Migration(8, "extraction_results ids never reused", schema=_rebuild_extraction_results_autoincrement),
+]
+
+
+async def applied_versions() -> List[int]:
+    async with async_session() as db:
+        return list((await db.execute(select(SchemaVersion.version).order_by(SchemaVersion.version))).scalars().all())
+
+
+async def migrate() -> List[Migration]:
+    """Apply every pending migration in order; returns the ones applied"""
+    await init_db()
+    done = set(await applied_versions())
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        print(f"[OK] Applying migration {migration.version}: {migration.name}")
+        if migration.schema:
+            async with engine.begin() as conn:
+                await migration.schema(conn)
+        if migration.backfill:
+            await migration.backfill()
+        async with async_session() as db:
+            db.add(SchemaVersion(version=migration.version, name=migration.name))
+            await db.commit()
+        applied.append(migration)
+    return applied
+
+
+async def status():
+    await init_db()
+    done = set(await applied_versions())
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        print(f"  {migration.version:>3}  {'applied' if migration.version in done else 'pending':<8} {migration.name}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "status":
+        asyncio.run(status())
+    elif command == "upgrade":
+        migrations = asyncio.run(migrate())
+        print(f"\n[OK] Applied {len(migrations)} migration(s)")
+    else:
+        print("Usage: python migrations.py status|upgrade")
+        sys.exit(1)
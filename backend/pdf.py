@@ -0,0 +1,181 @@
+import os
+import io
+import math
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+import pypdfium2 as pdfium
+from metrics import timed_stage
+
+PDF_DPI = int(os.getenv("PDF_DPI", "150"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "20"))
+PDF_RASTER_WORKERS = int(os.getenv("PDF_RASTER_WORKERS", str(os.cpu_count() or 2)))
+# Pages that would render larger than this are rendered at a lower scale
+PDF_MAX_PIXELS = int(os.getenv("PDF_MAX_PIXELS", str(25_000_000)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class PDFError(Exception):
+    pass
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Forking a running server would copy its event loop, threads and connections into the workers
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=PDF_RASTER_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def shutdown_pool(wait: bool = True):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait)
+        _pool = None
+
+
+def page_count(pdf_bytes: bytes) -> int:
+    try:
+        document = pdfium.PdfDocument(pdf_bytes)
+    except pdfium.PdfiumError as e:
+        raise PDFError(f"Could not open PDF: {e}")
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def render_scale(width: float, height: float, dpi: int, max_pixels: int = PDF_MAX_PIXELS) -> float:
+    """pdfium scale for a page of width x height points at dpi, lowered to stay within max_pixels"""
+    scale = dpi / 72
+    pixels = width * height * scale * scale
+    if pixels > max_pixels:
+        scale *= math.sqrt(max_pixels / pixels)
+    return scale
+
+
+def render_pages(pdf_bytes: bytes, page_indexes: List[int], dpi: int) -> List[bytes]:
+    """Rasterise pages to JPEG bytes (runs inside a worker process, which gets the PDF once)"""
+    document = pdfium.PdfDocument(pdf_bytes)
+    try:
+        rendered = []
+        for page_index in page_indexes:
+            page = document[page_index]
+            image = page.render(scale=render_scale(*page.get_size(), dpi)).to_pil()
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=95)
+            rendered.append(buffer.getvalue())
+        return rendered
+    finally:
+        document.close()
+
+
+async def rasterise_pdf(pdf_bytes: bytes, dpi: int = PDF_DPI, max_pages: int = PDF_MAX_PAGES) -> List[bytes]:
+    """Render every page in parallel on the process pool, preserving page order.
+
+    Pages are dealt round-robin into one task per worker, so each worker is
+    sent the PDF once rather than once per page. Counting the pages parses the
+    whole PDF, so that runs on the pool too.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        count = await loop.run_in_executor(pool, page_count, pdf_bytes)
+        if count == 0:
+            raise PDFError("PDF has no pages")
+        if count > max_pages:
+            raise PDFError(f"PDF has {count} pages; maximum is {max_pages}")
+
+        tasks = min(PDF_RASTER_WORKERS, count)
+        chunks = await asyncio.gather(*[
+            loop.run_in_executor(pool, render_pages, pdf_bytes, list(range(task, count, tasks)), dpi)
+            for task in range(tasks)
+        ])
+    except BrokenProcessPool:
+        # A worker died (out of memory, or pdfium crashed); a broken pool never recovers
+        shutdown_pool(wait=False)
+        raise
+    pages: List[bytes] = [b""] * count
+    for task, chunk in enumerate(chunks):
+        pages[task::tasks] = chunk
+    return pages
+
+
+def merge_page_results(pages: List[Any]) -> Dict[str, Any]:
+    """Merge per-page JSON into one record.
+
+    Identical values are kept once, nested objects are merged recursively and
+    conflicting values are kept under a "<key> (page N)" name. Pages given
+    as None (failed extractions) are skipped.
+    """
+    merged: Dict[str, Any] = {}
+    for number, data in enumerate(pages, start=1):
+        if data is None:
+            continue
+        if isinstance(data, dict):
+            _merge_into(merged, data, number)
+        else:
+            merged[f"page {number}"] = data
+    return merged
+
+
+def _merge_into(target: Dict[str, Any], data: Dict[str, Any], page_number: int):
+    for key, value in data.items():
+        if key not in target:
+            target[key] = value
+        elif target[key] == value:
+            continue
+        elif isinstance(target[key], dict) and isinstance(value, dict):
+            _merge_into(target[key], value, page_number)
+        else:
+            target[f"{key} (page {page_number})"] = value
+
+
+async def extract_pdf(agent, pdf_bytes: bytes, filename: str, language: str = "English") -> Dict[str, Any]:
+    """Rasterise a PDF and run its pages through the extraction agent concurrently"""
+    timings: Dict[str, float] = {}
+    try:
+        with timed_stage("rasterise", timings):
+            pages = await rasterise_pdf(pdf_bytes)
+    except PDFError as e:
+        return {"success": False, "filename": filename, "error": str(e), "message": "Failed to read PDF"}
+    except BrokenProcessPool:
+        return {"success": False, "filename": filename, "error": "A PDF rendering worker crashed",
+                "message": "Failed to read PDF"}
+    except Exception as e:
+        # pdfium.PdfiumError from a page that cannot be loaded, or an image that cannot be encoded
+        return {"success": False, "filename": filename, "error": f"Could not render PDF: {type(e).__name__}: {e}",
+                "message": "Failed to read PDF"}
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        agent.extract_handwriting_async(page, f"{filename} (page {number})", language)
+        for number, page in enumerate(pages, start=1)
+    ])
+    # Per-page stages are already recorded by the agent; this is the wall time for all pages
+    timings["pages_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    succeeded = [r for r in results if r["success"]]
+    failed_pages = [number for number, r in enumerate(results, start=1) if not r["success"]]
+    if not succeeded:
+        return {
+            "success": False,
+            "filename": filename,
+            "error": results[0].get("error", "Extraction failed"),
+            "message": "Failed to extract handwriting from any PDF page"
+        }
+
+    return {
+        "success": True,
+        "filename": filename,
+        "extracted_data": merge_page_results([r.get("extracted_data") if r["success"] else None for r in results]),
+        "page_count": len(pages),
+        "failed_pages": failed_pages,
+        "timings": timings,
+        "message": f"Handwriting extracted from {len(succeeded)} of {len(pages)} PDF pages"
+    }
@@ -0,0 +1,208 @@
+"""
+Local image-quality gate, run before the paid vision model call.
+
+Each upload is decoded at QUALITY_ANALYSIS_SIDE pixels (JPEGs are
+downscaled while decoding) and scored on:
+  - ink_ratio: the share of pixels darker than the paper by more than the
+    paper's own brightness spread, so faint pencil and dim photos still
+    count as written on
+  - sharpness: the share of edge contrast lost when the image is blurred
+    again; an already blurred image loses little
+  - phash: a 64-bit difference hash, to look up candidate duplicates
+  - detail_hash: a 256-bit difference hash that confirms them; pages of
+    text all look alike at 9x8 pixels
+
+Blank and blurry images are only flagged by default (QUALITY_GATE=flag);
+QUALITY_GATE=reject keeps them from the model. Near-duplicates of stored
+forms are flagged with the matching form ids, and rejected only when
+QUALITY_REJECT_DUPLICATES=true, since two copies of the same printed form
+can hash alike.
+
+Hashes are kept in image_hashes, with phash split into four 16-bit bands.
+Two hashes within 3 bits of each other share at least one band exactly, so
+a lookup only compares the rows that match a band through its index.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+from sqlalchemy import select, delete, or_
+from database import ImageHash
+from agent import decode_image, ImageSource
+from metrics import Counter
+
+QUALITY_GATE = os.getenv("QUALITY_GATE", "flag").lower()  # flag | reject | off
+QUALITY_ANALYSIS_SIDE = int(os.getenv("QUALITY_ANALYSIS_SIDE", "512"))
+QUALITY_MIN_INK_RATIO = float(os.getenv("QUALITY_MIN_INK_RATIO", "0.0005"))
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "0.4"))
+QUALITY_DUPLICATE_DISTANCE = min(int(os.getenv("QUALITY_DUPLICATE_DISTANCE", "3")), 3)
+QUALITY_DUPLICATE_DETAIL_DISTANCE = int(os.getenv("QUALITY_DUPLICATE_DETAIL_DISTANCE", "16"))
+QUALITY_REJECT_DUPLICATES = os.getenv("QUALITY_REJECT_DUPLICATES", "false").lower() == "true"
+
+# Ink is darker than the paper (the median brightness) by this many times the
+# paper's own spread (estimated from the brighter half), and by at least MIN_INK_GAP levels
+INK_NOISE_SIGMAS = 4.0
+MIN_INK_GAP = 24
+# Lighting is flattened over this grid, and the paper moved to this brightness
+LIGHTING_CELLS = (16, 16)
+PAPER_LEVEL = 192
+# Below this standard deviation the image is one flat colour
+MIN_CONTRAST_STDDEV = 3.0
+# Neighbouring pixels closer than this are texture or noise, not an edge
+EDGE_NOISE_FLOOR = 8
+# Sharpness scores below this come from shadows and paper edges, not writing
+SHADING_SHARPNESS = 0.05
+HASH_BANDS = 4
+
+QUALITY_CHECKS = Counter("quality_gate_total", "Image quality checks by verdict and action", ("verdict", "action"))
+
+_REBLUR = ImageFilter.BoxBlur(2)
+_STROKE_REMOVAL = ImageFilter.MaxFilter(5)
+
+
+def difference_hash(gray: Image.Image, side: int = 8, margin: int = 0) -> str:
+    """side*side-bit dHash in hex: is each pixel brighter than its right neighbour by more than margin,
+    on a (side+1)xside thumbnail"""
+    # BOX averages whole cells, so paper texture does not flip bits between copies
+    pixels = gray.resize((side + 1, side), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(side):
+        for col in range(side):
+            bits = (bits << 1) | (pixels[row * (side + 1) + col] > pixels[row * (side + 1) + col + 1] + margin)
+    return f"{bits:0{side * side // 4}x}"
+
+
+def hash_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def hash_bands(phash: str) -> List[int]:
+    value = int(phash, 16)
+    return [(value >> (16 * (HASH_BANDS - 1 - band))) & 0xFFFF for band in range(HASH_BANDS)]
+
+
+def percentile(histogram: List[int], total: int, fraction: float) -> int:
+    running = 0
+    for level, count in enumerate(histogram):
+        running += count
+        if running >= total * fraction:
+            return level
+    return len(histogram) - 1
+
+
+def flatten_lighting(gray: Image.Image) -> Image.Image:
+    """The image relative to its local paper brightness, centred on PAPER_LEVEL.
+
+    The paper is estimated by removing strokes with a max filter and averaging
+    over coarse cells, so uneven light across a photo is not mistaken for ink
+    or for noise.
+    """
+    paper = gray.filter(_STROKE_REMOVAL).resize(LIGHTING_CELLS, Image.Resampling.BOX)
+    return ImageChops.subtract(gray, paper.resize(gray.size, Image.Resampling.BILINEAR), 1.0, PAPER_LEVEL)
+
+
+def ink_threshold(histogram: List[int], total: int) -> int:
+    """Brightness below which a pixel is ink, from the page's own contrast.
+
+    The paper is the median; its spread is taken from the quartile above it,
+    which ink (covering far less than half a page) does not reach.
+    """
+    paper = percentile(histogram, total, 0.5)
+    spread = (percentile(histogram, total, 0.75) - paper) / 0.674
+    return paper - max(int(INK_NOISE_SIGMAS * spread), MIN_INK_GAP)
+
+
+def edge_sharpness(gray: Image.Image) -> float:
+    """How much of the edge contrast a further blur removes (0 = already blurred, ~1 = crisp).
+
+    Only neighbouring pixels that differ by more than EDGE_NOISE_FLOOR count, so
+    paper texture and sensor noise do not make an out-of-focus page look sharp,
+    and the score does not depend on how much of the page is written on.
+    """
+    reblurred = gray.filter(_REBLUR)
+    removed = 0.0
+    total = 0.0
+    for shift in ((1, 0), (0, 1)):
+        original = ImageChops.difference(gray, ImageChops.offset(gray, *shift))
+        mask = original.point(lambda value: 255 if value > EDGE_NOISE_FLOOR else 0)
+        blurred = ImageChops.difference(reblurred, ImageChops.offset(reblurred, *shift))
+        removed += ImageStat.Stat(ImageChops.subtract(original, blurred), mask).sum[0]
+        total += ImageStat.Stat(original, mask).sum[0]
+    return removed / total if total else 0.0
+
+
+def assess_image(gray: Image.Image) -> Dict[str, Any]:
+    """Score a grayscale image; verdict is ok, blank or blurry"""
+    histogram = flatten_lighting(gray).histogram()
+    total = sum(histogram)
+    ink_ratio = sum(histogram[:max(ink_threshold(histogram, total), 0)]) / total
+
+    stddev = ImageStat.Stat(gray).stddev[0]
+    sharpness = edge_sharpness(gray)
+
+    # Checked before ink coverage: heavy blur fades strokes until no pixel counts as ink
+    if stddev >= MIN_CONTRAST_STDDEV and SHADING_SHARPNESS <= sharpness < QUALITY_MIN_SHARPNESS:
+        verdict, reason = "blurry", f"Image is too blurry to read (sharpness {sharpness:.2f}, minimum {QUALITY_MIN_SHARPNESS})"
+    elif stddev < MIN_CONTRAST_STDDEV or ink_ratio < QUALITY_MIN_INK_RATIO:
+        verdict, reason = "blank", f"Image looks blank (ink coverage {ink_ratio:.2%})"
+    else:
+        verdict, reason = "ok", None
+    return {
+        "verdict": verdict,
+        "reason": reason,
+        "ink_ratio": round(ink_ratio, 4),
+        "sharpness": round(sharpness, 4),
+        "phash": difference_hash(gray),
+        # Blank paper between lines gives cells of equal brightness; the margin keeps their bits at 0
+        "detail_hash": difference_hash(gray, 16, margin=1),
+    }
+
+
+def assess(image: ImageSource) -> Dict[str, Any]:
+    """Decode at analysis size and score; CPU-bound, call from a worker thread"""
+    start = time.perf_counter()
+    report = assess_image(decode_image(image, QUALITY_ANALYSIS_SIDE, mode="L"))
+    report["analysis_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return report
+
+
+async def find_duplicates(db, phash: str, detail_hash: str, max_distance: int = QUALITY_DUPLICATE_DISTANCE,
+                          max_detail_distance: int = QUALITY_DUPLICATE_DETAIL_DISTANCE) -> List[int]:
+    """Ids of stored forms whose image hashes are within max_distance and max_detail_distance bits, nearest first.
+
+    Forms stored before detail hashes were kept cannot be confirmed and are never matched.
+    """
+    bands = hash_bands(phash)
+    stmt = select(ImageHash.form_id, ImageHash.phash, ImageHash.detail_hash).where(
+        or_(*[getattr(ImageHash, f"band{band}") == value for band, value in enumerate(bands)])
+    )
+    matches = []
+    for form_id, other, other_detail in (await db.execute(stmt)).all():
+        if not other_detail or hash_distance(phash, other) > max_distance:
+            continue
+        distance = hash_distance(detail_hash, other_detail)
+        if distance <= max_detail_distance:
+            matches.append((distance, form_id))
+    return [form_id for _, form_id in sorted(matches)]
+
+
+async def index_hash(db, form_id: int, hashes: Optional[Tuple[str, str]]):
+    """Store a form's (phash, detail_hash) inside the caller's transaction"""
+    if not hashes:
+        return
+    phash, detail_hash = hashes
+    db.add(ImageHash(form_id=form_id, phash=phash, detail_hash=detail_hash,
+                     **{f"band{band}": value for band, value in enumerate(hash_bands(phash))}))
+
+
+async def remove_hash(db, form_id: int):
+    await db.execute(delete(ImageHash).where(ImageHash.form_id == form_id))
+
+
+def rejection_reason(report: Dict[str, Any]) -> Optional[str]:
+    """Why the image should not be sent to the model under the current settings, or None"""
+    if QUALITY_GATE == "reject" and report["verdict"] != "ok":
+        return report["reason"]
+    if QUALITY_REJECT_DUPLICATES and report.get("duplicate_of"):
+        return f"Near-duplicate of form {report['duplicate_of'][0]}"
+    return None
@@ -0,0 +1,191 @@
+"""
+Search index over extracted form JSON.
+
+Every stored form is flattened into form_fields rows (one per leaf value)
+for field=value lookups. On SQLite the same text also goes into an FTS5
+table, forms_fts, for full-text queries. Both are written in the same
+transaction as the form itself.
+
+Rebuild the index for existing rows with:
+    python search.py rebuild
+"""
+import re
+import asyncio
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import select, delete, text, and_, or_, case, func
+from database import engine, async_session, ExtractionResult, FormField
+import storage
+
+SEARCH_VALUE_MAX_LENGTH = 255
+
+_fts_enabled: Optional[bool] = None
+
+
+def normalize_key(key: str) -> str:
+    """'Policy Number' -> 'policy_number'"""
+    return re.sub(r"[^0-9a-z]+", "_", str(key).lower()).strip("_")
+
+
+def normalize_value(value: Any) -> str:
+    return str(value).strip().lower()[:SEARCH_VALUE_MAX_LENGTH]
+
+
+def flatten(data: Any, prefix: str = "", text: bool = True) -> List[Tuple[str, str, Any]]:
+    """Flatten nested JSON into (normalized path, normalized leaf key, value) tuples.
+
+    Values are converted to strings for the index; text=False keeps the JSON values.
+    """
+    convert = str if text else (lambda value: value)
+    items = []
+    if isinstance(data, dict):
+        for key, value in data.items():
+            leaf = normalize_key(key)
+            path = f"{prefix}.{leaf}" if prefix else leaf
+            if isinstance(value, (dict, list)):
+                items.extend(flatten(value, path, text))
+            elif value is not None:
+                items.append((path, leaf, convert(value)))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            path = f"{prefix}.{index}" if prefix else str(index)
+            if isinstance(value, (dict, list)):
+                items.extend(flatten(value, path, text))
+            elif value is not None:
+                items.append((path, prefix.rsplit(".", 1)[-1], convert(value)))
+    elif data is not None:
+        items.append((prefix or "value", prefix.rsplit(".", 1)[-1] or "value", convert(data)))
+    return items
+
+
+def _load(json_text: str) -> Any:
+    try:
+        return storage.loads(json_text)
+    except (TypeError, ValueError):
+        return {"raw_text": json_text}
+
+
+async def init_search_index():
+    """Create the FTS5 table when running on SQLite with FTS5 compiled in"""
+    global _fts_enabled
+    if engine.dialect.name != "sqlite":
+        _fts_enabled = False
+        return
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS forms_fts USING fts5(form_name, content, tokenize='unicode61')"
+            ))
+        _fts_enabled = True
+    except Exception as e:
+        print(f"[WARNING] SQLite FTS5 unavailable, full-text search falls back to LIKE: {e}")
+        _fts_enabled = False
+
+
+async def index_form(db, form_id: int, form_name: str, json_text: str):
+    """(Re)index one form inside the caller's transaction"""
+    await remove_form(db, form_id)
+    fields = flatten(_load(json_text))
+    if fields:
+        db.add_all([
+            FormField(form_id=form_id, path=path[:512], key=key[:255], value=value, value_norm=normalize_value(value))
+            for path, key, value in fields
+        ])
+    if _fts_enabled:
+        content = "\n".join(f"{path} {value}" for path, _, value in fields)
+        await db.execute(
+            text("INSERT INTO forms_fts(rowid, form_name, content) VALUES (:id, :name, :content)"),
+            {"id": form_id, "name": form_name, "content": content}
+        )
+
+
+async def remove_form(db, form_id: int):
+    await db.execute(delete(FormField).where(FormField.form_id == form_id))
+    if _fts_enabled:
+        await db.execute(text("DELETE FROM forms_fts WHERE rowid = :id"), {"id": form_id})
+
+
+def _fts_query(query: str) -> str:
+    # Quote every term so user input can't break FTS5 syntax; prefix-match each one
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+async def search_form_ids(db, query: Optional[str] = None, filters: Optional[List[Tuple[str, str]]] = None,
+                          limit: int = 50) -> List[int]:
+    """Return ids of forms matching the full-text query and every field=value filter, best match first"""
+    candidate_sets = []
+
+    for field, value in filters or []:
+        field_norm = ".".join(normalize_key(part) for part in field.split("."))
+        column = FormField.path if "." in field else FormField.key
+        stmt = select(FormField.form_id).where(column == field_norm, FormField.value_norm == normalize_value(value))
+        candidate_sets.append(set((await db.execute(stmt)).scalars().all()))
+
+    allowed = set.intersection(*candidate_sets) if candidate_sets else None
+    if allowed is not None and not allowed:
+        return []
+
+    ranked: Optional[List[int]] = None
+    if query and query.strip():
+        if _fts_enabled:
+            sql = "SELECT rowid FROM forms_fts WHERE forms_fts MATCH :q ORDER BY rank"
+            # Without field filters nothing is dropped afterwards, so let SQLite stop early
+            if allowed is None:
+                sql += f" LIMIT {int(limit)}"
+            ranked = list((await db.execute(text(sql), {"q": _fts_query(query)})).scalars().all())
+        else:
+            # Like FTS5, a form matches only when every term is found in it (in any of its fields)
+            conditions = [
+                or_(FormField.value_norm.contains(term, autoescape=True), FormField.path.contains(term, autoescape=True))
+                for term in query.lower().split()
+            ]
+            stmt = select(FormField.form_id).where(or_(*conditions)).group_by(FormField.form_id) \
+                .having(and_(*(func.max(case((condition, 1), else_=0)) == 1 for condition in conditions))) \
+                .order_by(func.count().desc())
+            ranked = list((await db.execute(stmt)).scalars().all())
+
+    if ranked is not None:
+        ids = [form_id for form_id in ranked if allowed is None or form_id in allowed]
+    elif allowed is not None:
+        ids = sorted(allowed, reverse=True)
+    else:
+        ids = []
+    return ids[:limit]
+
+
+async def rebuild_index(batch_size: int = 500):
+    """Reindex every stored form, one committed batch at a time"""
+    await init_search_index()
+    last_id = 0
+    total = 0
+    while True:
+        async with async_session() as db:
+            stmt = select(ExtractionResult.id, ExtractionResult.filename, ExtractionResult.json_data) \
+                .where(ExtractionResult.id > last_id).order_by(ExtractionResult.id).limit(batch_size)
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+            for form_id, filename, json_data in rows:
+                await index_form(db, form_id, filename, json_data)
+            await db.commit()
+        last_id = rows[-1][0]
+        total += len(rows)
+        print(f"[OK] Indexed {total} forms")
+    return total
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("Usage: python search.py rebuild")
+        sys.exit(1)
+
+    from database import init_db
+
+    async def main():
+        await init_db()
+        return await rebuild_index()
+
+    count = asyncio.run(main())
+    print(f"\n[OK] Search index rebuilt for {count} forms")
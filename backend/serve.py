@@ -0,0 +1,55 @@
+"""
+Production entry point: the API under uvicorn with several worker processes.
+
+    python serve.py --workers 4
+
+Migrations run once here, before any worker starts, so workers never race
+each other on schema changes. Each worker then imports main.py and builds
+its own agent and HTTP pool in the lifespan hook; nothing is created at
+import time. State that must agree across workers lives in the database:
+extraction cache (persistent tier), search index, jobs (claimed with
+leases) and, with ADMISSION_STORE=database, per-client rate limits.
+"""
+import os
+import asyncio
+import argparse
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+
+def configure_workers(workers: int):
+    """Defaults that make sense once there is more than one process; explicit env vars win"""
+    if workers > 1:
+        os.environ.setdefault("ADMISSION_STORE", "database")
+        # Every worker has its own PDF raster pool; share the cores between them
+        os.environ.setdefault("PDF_RASTER_WORKERS", str(max(1, (os.cpu_count() or 2) // workers)))
+
+
+async def migrate_once():
+    from database import engine
+    from migrations import migrate
+
+    await migrate()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Handwriting Extraction API")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    configure_workers(args.workers)
+    asyncio.run(migrate_once())
+    os.environ["MIGRATE_ON_STARTUP"] = "false"
+
+    import uvicorn
+    print(f"[OK] Starting {args.workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, proxy_headers=True)
+
+
+if __name__ == "__main__":
+    main()
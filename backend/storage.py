@@ -0,0 +1,211 @@
+"""
+How extracted JSON is stored, and a fast path for writing it into responses.
+
+FORM_STORAGE picks the format that extraction_results.json_data and
+extraction_cache.json_data are written in:
+  - text: the JSON text as given
+  - compact: minified JSON text
+  - zlib: minified, then zlib-compressed
+  - zstd: minified, then zstd-compressed (needs the zstandard package,
+    zlib is used without it)
+
+Compressed values are BLOBs in the same TEXT column (SQLite keeps whatever
+type it is given), so rows in different formats can live side by side and
+are told apart on read by their first bytes. Changing FORM_STORAGE needs no
+migration; `python storage.py repack` rewrites the rows already stored.
+Text that is not valid JSON is always stored as given, and other databases
+than SQLite get compact text instead of BLOBs.
+
+orjson is used for parsing and serializing when it is installed.
+"""
+import os
+import json
+import zlib
+import threading
+from datetime import datetime
+from typing import Any, Iterable, List, Mapping, Optional, Union
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+STORAGE_FORMATS = ("text", "compact", "zlib", "zstd")
+FORM_STORAGE = os.getenv("FORM_STORAGE", "text").lower()
+ZLIB_LEVEL = int(os.getenv("FORM_STORAGE_ZLIB_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("FORM_STORAGE_ZSTD_LEVEL", "3"))
+
+if FORM_STORAGE not in STORAGE_FORMATS:
+    print(f"[WARNING] Unknown FORM_STORAGE '{FORM_STORAGE}', storing JSON as text")
+    FORM_STORAGE = "text"
+elif FORM_STORAGE == "zstd" and zstandard is None:
+    print("[WARNING] FORM_STORAGE=zstd needs the zstandard package; using zlib")
+    FORM_STORAGE = "zlib"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# zstd contexts are not safe to share between threads
+_zstd = threading.local()
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON as UTF-8 bytes"""
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _compress(data: bytes, storage: str) -> bytes:
+    if storage == "zstd":
+        if not hasattr(_zstd, "compressor"):
+            _zstd.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return _zstd.compressor.compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(data: bytes) -> bytes:
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("Stored JSON is zstd-compressed; install the zstandard package to read it")
+        if not hasattr(_zstd, "decompressor"):
+            _zstd.decompressor = zstandard.ZstdDecompressor()
+        return _zstd.decompressor.decompress(data)
+    return zlib.decompress(data)
+
+
+def pack(text: str, storage: str = FORM_STORAGE) -> Union[str, bytes]:
+    """The value to store for a JSON document in the given format"""
+    if storage == "text":
+        return text
+    try:
+        compact = dumps(loads(text))
+    except (TypeError, ValueError):
+        return text
+    if storage != "compact":
+        packed = _compress(compact, storage)
+        # Very small documents can grow when compressed
+        if len(packed) < len(compact):
+            return packed
+    return compact.decode("utf-8")
+
+
+def raw_json(value: Union[str, bytes]) -> bytes:
+    """A stored value as UTF-8 JSON bytes, without parsing it"""
+    if isinstance(value, bytes):
+        return _decompress(value)
+    return value.encode("utf-8")
+
+
+def unpack(value: Union[str, bytes, None]) -> Optional[str]:
+    if isinstance(value, bytes):
+        return _decompress(value).decode("utf-8")
+    return value
+
+
+class PackedJSON(TypeDecorator):
+    """JSON text column stored in the FORM_STORAGE format; always reads back as text"""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return pack(value, FORM_STORAGE if dialect.name == "sqlite" or FORM_STORAGE == "text" else "compact")
+
+    def process_result_value(self, value, dialect):
+        return unpack(value)
+
+
+def _data_json(value: Union[str, bytes], embed: bool) -> bytes:
+    data = raw_json(value)
+    if embed:
+        # Compressed values were valid JSON when packed; text may be anything
+        if isinstance(value, bytes):
+            return data
+        try:
+            loads(data)
+            return data
+        except ValueError:
+            pass
+    return dumps(data.decode("utf-8"))
+
+
+def encode_rows(rows: Iterable[Mapping[str, Any]], fields: List[str], embed_data: bool = False) -> bytes:
+    """A JSON array of rows written straight to bytes.
+
+    rows hold the raw stored data column (select it with type_coerce(column, Text)),
+    which is spliced in as a string or, with embed_data, as the JSON value itself,
+    without building Python objects from it.
+    """
+    names = {field: dumps(field) + b":" for field in fields}
+    encoded = []
+    for row in rows:
+        pieces = []
+        for field in fields:
+            value = row[field]
+            if field == "data":
+                piece = _data_json(value, embed_data)
+            else:
+                piece = dumps(value.isoformat() if isinstance(value, datetime) else value)
+            pieces.append(names[field] + piece)
+        encoded.append(b"{" + b",".join(pieces) + b"}")
+    return b"[" + b",".join(encoded) + b"]"
+
+
+async def repack(batch_size: int = 1000) -> int:
+    """Rewrite stored forms and cache entries in the current FORM_STORAGE format"""
+    from sqlalchemy import select, update, bindparam
+    from database import async_session, engine, ExtractionResult, CachedExtraction
+
+    total = 0
+    for model, key in ((ExtractionResult, "id"), (CachedExtraction, "cache_key")):
+        table = model.__table__
+        column = getattr(model, key)
+        stmt = update(table).where(table.c[key] == bindparam("row_key")).values(json_data=bindparam("data"))
+        if "updated_at" in table.c:
+            # Not an edit, so keep the modification time
+            stmt = stmt.values(updated_at=table.c.updated_at)
+        last = None
+        while True:
+            query = select(column, model.json_data).order_by(column).limit(batch_size)
+            if last is not None:
+                query = query.where(column > last)
+            async with async_session() as db:
+                rows = (await db.execute(query)).all()
+                if not rows:
+                    break
+                await db.execute(stmt, [{"row_key": row_key, "data": text} for row_key, text in rows])
+                await db.commit()
+            last = rows[-1][0]
+            total += len(rows)
+
+    if engine.dialect.name == "sqlite":
+        # Freed pages are only returned to the file system by VACUUM
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("VACUUM")
+    return total
+
+
+if __name__ == "__main__":
+    import sys
+    import asyncio
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "repack":
+        print(f"[OK] Repacked {asyncio.run(repack())} rows as {FORM_STORAGE}")
+    else:
+        print("Usage: FORM_STORAGE=text|compact|zlib|zstd python storage.py repack")
+        sys.exit(1)
@@ -0,0 +1,27 @@
+"""
+Tests run from the backend directory: python -m pytest tests
+
+The database lives in a temporary directory, never in handwriting.db.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_workdir = tempfile.mkdtemp(prefix="handwriting_tests_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.setdefault("TRANSLATION_CACHE_PATH", os.path.join(_workdir, "translations.db"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its startup run, on the temporary database"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,116 @@
+"""
+Upload admission (admission.py): rate limits, priority lanes and the batch share.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import admission
+from admission import AdmissionController, DatabaseAdmissionStore, InMemoryAdmissionStore, Rejected, INTERACTIVE, BATCH
+from database import async_session, engine, init_db, RateLimitBucket
+
+
+def controller(**options) -> AdmissionController:
+    settings = dict(rate_per_minute=0, max_in_flight=2, batch_share=0.5, memory_budget_bytes=1000, max_wait=1)
+    settings.update(options)
+    return AdmissionController(InMemoryAdmissionStore(), **settings)
+
+
+def test_rate_limit_is_per_client():
+    async def scenario():
+        gate = controller(rate_per_minute=60, burst=2, max_in_flight=10)
+        for _ in range(2):
+            await (await gate.admit("a", INTERACTIVE, 1)).release()
+        with pytest.raises(Rejected) as rejected:
+            await gate.admit("a", INTERACTIVE, 1)
+        assert rejected.value.status_code == 429
+        await (await gate.admit("b", INTERACTIVE, 1)).release()
+
+    asyncio.run(scenario())
+
+
+def test_batch_is_held_to_its_share_of_slots():
+    async def scenario():
+        gate = controller(max_wait=0)
+        batch = await gate.admit("a", BATCH, 1)
+        with pytest.raises(Rejected) as rejected:
+            await gate.admit("b", BATCH, 1)
+        assert rejected.value.status_code == 503
+        # The other slot is still free for interactive work
+        interactive = await gate.admit("c", INTERACTIVE, 1)
+        await batch.release()
+        await interactive.release()
+
+    asyncio.run(scenario())
+
+
+def test_interactive_waiter_is_served_before_an_earlier_batch_waiter():
+    async def scenario():
+        gate = controller(max_in_flight=1, batch_share=1)
+        holder = await gate.admit("a", INTERACTIVE, 1)
+        order = []
+
+        async def wait(client, lane):
+            ticket = await gate.admit(client, lane, 1)
+            order.append(lane)
+            await ticket.release()
+
+        waiting = [asyncio.create_task(wait("b", BATCH))]
+        await asyncio.sleep(0.01)
+        waiting.append(asyncio.create_task(wait("c", INTERACTIVE)))
+        await asyncio.sleep(0.01)
+        await holder.release()
+        await asyncio.gather(*waiting)
+        assert order == [INTERACTIVE, BATCH]
+
+    asyncio.run(scenario())
+
+
+def test_memory_budget_rejects_when_full():
+    async def scenario():
+        gate = controller()
+        first = await gate.admit("a", INTERACTIVE, 800)
+        with pytest.raises(Rejected) as rejected:
+            await gate.admit("b", INTERACTIVE, 800)
+        assert rejected.value.status_code == 503
+        await first.release()
+
+    asyncio.run(scenario())
+
+
+def test_database_store_prunes_buckets_that_have_refilled(monkeypatch):
+    monkeypatch.setattr(DatabaseAdmissionStore, "PRUNE_EVERY", 3)
+
+    async def scenario():
+        await init_db()
+        try:
+            async with async_session() as db:
+                db.add(RateLimitBucket(key="prune-idle", tokens=0.0, updated_at=admission.time.time() - 3600))
+                await db.commit()
+            store = DatabaseAdmissionStore()
+            for _ in range(3):
+                assert await store.take_token("prune-busy", 1.0, 5) == 0.0
+            async with async_session() as db:
+                return {bucket.key for bucket in (await db.execute(
+                    select(RateLimitBucket).where(RateLimitBucket.key.like("prune-%"))
+                )).scalars()}
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == {"prune-busy"}
+
+
+class Request:
+    def __init__(self, peer, forwarded=None):
+        self.client = type("Client", (), {"host": peer})
+        self.headers = {"x-forwarded-for": forwarded} if forwarded else {}
+
+
+def test_client_key_uses_forwarded_client_only_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_TRUST_FORWARDED", True)
+    monkeypatch.setattr(admission, "ADMISSION_TRUSTED_PROXIES", [admission.ipaddress.ip_network("10.0.0.5/32")])
+    assert admission.client_key(Request("10.0.0.5", "1.2.3.4")) == "1.2.3.4"
+    # A client cannot choose its key by sending its own header through the proxy
+    assert admission.client_key(Request("10.0.0.5", "6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    assert admission.client_key(Request("10.0.0.9", "1.2.3.4")) == "10.0.0.9"
@@ -0,0 +1,137 @@
+"""
+Vision backend routing (backends.py): circuit breakers, failover and hedging, with stub backends.
+"""
+import threading
+import time
+
+import pytest
+
+from backends import BackendRouter, BackendUnavailableError, CircuitBreaker, VisionBackend
+
+
+class StubBackend(VisionBackend):
+    def __init__(self, name, answer="{}", error=None, delay=0.0):
+        self.name = name
+        self.model = f"{name}-model"
+        self.answer = answer
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt, image_b64):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.answer
+
+
+def router(*backends, hedge_after=0.0, failure_threshold=5, reset_timeout=30.0):
+    routed = BackendRouter(list(backends), hedge_after=hedge_after)
+    routed.breakers = {
+        backend.name: CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout) for backend in backends
+    }
+    return routed
+
+
+def test_breaker_opens_after_consecutive_failures_and_closes_after_a_good_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    # One trial call at a time
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_fails_over_to_the_next_backend():
+    primary = StubBackend("primary", error=ConnectionError("down"))
+    fallback = StubBackend("fallback", answer='{"Name": "Jane"}')
+    routed = router(primary, fallback)
+    try:
+        text, backend = routed.complete("prompt", "image")
+        assert (text, backend) == ('{"Name": "Jane"}', fallback)
+        stats = {entry["name"]: entry for entry in routed.stats()}
+        assert stats["primary"]["failures"] == 1 and stats["fallback"]["successes"] == 1
+    finally:
+        routed.shutdown()
+
+
+def test_an_open_circuit_is_skipped_until_its_reset_timeout():
+    primary = StubBackend("primary", error=ConnectionError("down"))
+    fallback = StubBackend("fallback")
+    routed = router(primary, fallback, failure_threshold=1, reset_timeout=0.05)
+    try:
+        routed.complete("prompt", "image")
+        routed.complete("prompt", "image")
+        assert primary.calls == 1 and fallback.calls == 2
+
+        time.sleep(0.06)
+        primary.error = None
+        _, backend = routed.complete("prompt", "image")
+        assert backend is primary and routed.breakers["primary"].state == "closed"
+    finally:
+        routed.shutdown()
+
+
+def test_the_last_error_is_raised_when_every_backend_fails():
+    routed = router(StubBackend("a", error=ConnectionError("a down")), StubBackend("b", error=ValueError("b bad")),
+                    failure_threshold=1)
+    try:
+        with pytest.raises(ValueError):
+            routed.complete("prompt", "image")
+        with pytest.raises(BackendUnavailableError):
+            routed.complete("prompt", "image")
+    finally:
+        routed.shutdown()
+
+
+def test_a_slow_backend_is_hedged_with_the_next_one():
+    slow = StubBackend("slow", answer="slow", delay=0.5)
+    fast = StubBackend("fast", answer="fast")
+    routed = router(slow, fast, hedge_after=0.05)
+    try:
+        start = time.monotonic()
+        assert routed.complete("prompt", "image") == ("fast", fast)
+        assert time.monotonic() - start < 0.4
+    finally:
+        routed.shutdown()
+
+
+def test_stream_fails_over_before_the_first_piece_only():
+    class BrokenStream(StubBackend):
+        def stream(self, prompt, image_b64):
+            yield from self.answer
+            raise ConnectionError("dropped")
+
+    routed = router(BrokenStream("broken", answer=""), StubBackend("fallback", answer="ok"))
+    try:
+        assert [piece for piece, _ in routed.stream("prompt", "image")] == ["ok"]
+    finally:
+        routed.shutdown()
+
+    routed = router(BrokenStream("broken", answer="ab"), StubBackend("fallback", answer="ok"))
+    try:
+        pieces = []
+        with pytest.raises(ConnectionError):
+            for piece, _ in routed.stream("prompt", "image"):
+                pieces.append(piece)
+        assert pieces == ["a", "b"]
+    finally:
+        routed.shutdown()
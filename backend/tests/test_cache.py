@@ -0,0 +1,96 @@
+"""
+The extraction cache (cache.ExtractionCache): both tiers, expiry and trimming.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+import cache
+from cache import ExtractionCache
+from database import async_session, engine, init_db, CachedExtraction
+
+
+def run(scenario):
+    async def with_fresh_connections():
+        try:
+            await init_db()
+            async with async_session() as db:
+                await db.execute(delete(CachedExtraction))
+                await db.commit()
+            return await scenario()
+        finally:
+            # Pooled connections belong to this event loop
+            await engine.dispose()
+
+    return asyncio.run(with_fresh_connections())
+
+
+def test_hits_come_from_memory_then_from_the_table():
+    async def scenario():
+        first = ExtractionCache()
+        await first.put("hit", {"Name": "Jane"})
+        from_memory = await first.get("hit")
+        from_memory["Name"] = "changed by the caller"
+        # A new process starts with an empty memory tier
+        second = ExtractionCache()
+        return await first.get("hit"), await second.get("hit"), await second.get("hit"), first.stats(), second.stats()
+
+    first_hit, table_hit, memory_hit, first_stats, second_stats = run(scenario)
+    assert first_hit == table_hit == memory_hit == {"Name": "Jane"}
+    assert first_stats["memory_hits"] == 2
+    assert (second_stats["persistent_hits"], second_stats["memory_hits"]) == (1, 1)
+
+
+def test_miss():
+    async def scenario():
+        store = ExtractionCache()
+        return await store.get("never-put"), store.stats()
+
+    data, stats = run(scenario)
+    assert data is None and stats["misses"] == 1
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    # created_at is naive UTC; read as local time it would be hours off here
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+
+    async def scenario():
+        async with async_session() as db:
+            created = datetime.utcnow() - timedelta(seconds=120)
+            db.add(CachedExtraction(cache_key="old", json_data="{}", created_at=created, last_accessed=created))
+            db.add(CachedExtraction(cache_key="fresh", json_data="{}", created_at=datetime.utcnow(),
+                                    last_accessed=datetime.utcnow()))
+            await db.commit()
+        store = ExtractionCache(ttl_seconds=60)
+        return await store.get("old"), await store.get("fresh"), store._memory["fresh"][0]
+
+    try:
+        old, fresh, fresh_expires_at = run(scenario)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert old is None and fresh == {}
+    # The memory tier keeps a table hit until the entry's own expiry
+    assert 55 < fresh_expires_at - time.time() <= 60
+
+
+def test_table_is_trimmed_every_n_puts(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_EVICT_EVERY", 5)
+
+    async def scenario():
+        store = ExtractionCache(max_persistent_entries=3)
+        counts = []
+        for n in range(10):
+            await store.put(f"trim-{n}", {"n": n})
+            async with async_session() as db:
+                counts.append((await db.execute(select(func.count()).select_from(CachedExtraction))).scalar_one())
+        async with async_session() as db:
+            kept = (await db.execute(select(CachedExtraction.cache_key).order_by(CachedExtraction.cache_key))).scalars().all()
+        return counts, kept
+
+    counts, kept = run(scenario)
+    assert counts == [1, 2, 3, 4, 3, 4, 5, 6, 7, 3]
+    assert kept == ["trim-7", "trim-8", "trim-9"]
@@ -0,0 +1,69 @@
+"""
+Conditional GETs on /forms and the /forms/changes feed.
+
+Every test names its forms with its own prefix, since the database is
+shared by the whole session.
+"""
+import json
+
+from test_forms import create
+
+
+def test_etag_revalidation_sees_a_write_in_the_same_second(client):
+    form_id = create(client, "etag.jpg", {"n": 1})
+    first = client.get(f"/forms/{form_id}")
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert client.get(f"/forms/{form_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/forms/{form_id}", json={"data": json.dumps({"n": 2})})
+    # Last-Modified has not moved on within the second; the ETag has
+    assert client.get(f"/forms/{form_id}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(f"/forms/{form_id}", headers={"If-Modified-Since": last_modified}).status_code == 200
+
+
+def test_changes_feed_returns_writes_and_deletions_since_a_version(client):
+    kept = create(client, "feed-kept.jpg", {"n": 1})
+    removed = create(client, "feed-removed.jpg", {"n": 1})
+    since = int(client.get("/forms", params={"limit": 1}).headers["x-forms-version"])
+
+    client.put(f"/forms/{kept}", json={"data": json.dumps({"n": 2})})
+    client.put(f"/forms/{kept}", json={"data": json.dumps({"n": 3})})
+    added = create(client, "feed-added.jpg", {"n": 1})
+    client.delete(f"/forms/{removed}")
+
+    body = client.get("/forms/changes", params={"since": since}).json()
+    assert [form["id"] for form in body["forms"]] == [kept, added]
+    assert json.loads(body["forms"][0]["data"]) == {"n": 3}
+    assert body["deleted"] == [removed]
+    assert body["more"] is False
+
+    later = client.get("/forms/changes", params={"since": body["version"]}).json()
+    assert later["forms"] == [] and later["deleted"] == []
+
+
+def test_changes_feed_pages_in_version_order(client):
+    since = int(client.get("/forms", params={"limit": 1}).headers["x-forms-version"])
+    ids = [create(client, f"feed-page-{n}.jpg", {"n": n}) for n in range(5)]
+
+    seen, more = [], True
+    while more:
+        body = client.get("/forms/changes", params={"since": since, "limit": 2}).json()
+        seen += [form["id"] for form in body["forms"]]
+        since, more = body["version"], body["more"]
+    assert seen == ids
+
+
+def test_delete_recreate_delete_keeps_ids_apart(client):
+    since = int(client.get("/forms", params={"limit": 1}).headers["x-forms-version"])
+    first = create(client, "reuse.jpg", {"n": 1})
+    assert client.delete(f"/forms/{first}").status_code == 200
+    second = create(client, "reuse.jpg", {"n": 2})
+    assert second != first
+
+    body = client.get("/forms/changes", params={"since": since}).json()
+    assert [form["id"] for form in body["forms"]] == [second]
+    assert body["deleted"] == [first]
+
+    assert client.delete(f"/forms/{second}").status_code == 200
+    body = client.get("/forms/changes", params={"since": since}).json()
+    assert body["forms"] == [] and body["deleted"] == [first, second]
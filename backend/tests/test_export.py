@@ -0,0 +1,48 @@
+"""
+GET /forms/export: extracted fields never collide with the form's own columns.
+"""
+import csv
+import io
+import json
+
+import pytest
+
+import export
+
+FORM = {"ID": 7, "created_at": "yesterday", "Amount": 12.5, "Paid": True, "Items": [{"Qty": 2}]}
+
+
+@pytest.fixture(scope="module")
+def form_id(client):
+    response = client.post("/forms", json={"form_name": "export-clash.jpg", "data": json.dumps(FORM)})
+    return response.json()["id"]
+
+
+def test_jsonl_nests_fields_with_their_json_types(client, form_id):
+    response = client.get("/forms/export", params={"name_prefix": "export-"})
+    [row] = [json.loads(line) for line in response.text.splitlines()]
+    assert row["id"] == form_id
+    assert row["form_name"] == "export-clash.jpg"
+    assert row["created_at"] != "yesterday"
+    assert row["data"] == {"id": 7, "created_at": "yesterday", "amount": 12.5, "paid": True, "items.0.qty": 2}
+
+
+def test_csv_prefixes_field_columns(client, form_id):
+    response = client.get("/forms/export", params={"format": "csv", "name_prefix": "export-"})
+    header, row = list(csv.reader(io.StringIO(response.text)))
+    assert header == export.META_COLUMNS + ["data.amount", "data.created_at", "data.id", "data.items.0.qty", "data.paid"]
+    assert len(set(header)) == len(header)
+    values = dict(zip(header, row))
+    assert values["id"] == str(form_id)
+    assert values["data.id"] == "7"
+    assert values["data.paid"] == "true"
+
+
+def test_parquet_has_unique_columns(client, form_id):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/forms/export", params={"format": "parquet", "name_prefix": "export-", "columns": "id,id,amount"})
+    assert response.status_code == 200
+    [row] = pq.read_table(io.BytesIO(response.content)).to_pylist()
+    assert row["id"] == form_id
+    assert row["data.id"] == "7"
+    assert row["data.amount"] == "12.5"
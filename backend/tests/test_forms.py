@@ -0,0 +1,36 @@
+"""
+GET /forms pagination, sorting and projection.
+
+Every test names its forms with its own prefix, since the database is
+shared by the whole session.
+"""
+import json
+
+
+def create(client, name: str, data: dict) -> int:
+    response = client.post("/forms", json={"form_name": name, "data": json.dumps(data)})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_pages_cover_every_form_once(client):
+    ids = [create(client, f"page-{n:02d}.jpg", {"n": n}) for n in range(7)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, "sort": "id", "name_prefix": "page-", **({"cursor": cursor} if cursor else {})}
+        response = client.get("/forms", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 3
+        seen += [form["id"] for form in page]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == ids
+
+
+def test_descending_sort_and_projection(client):
+    ids = [create(client, f"desc-{n}.jpg", {"n": n}) for n in range(3)]
+    response = client.get("/forms", params={"sort": "-id", "name_prefix": "desc-", "fields": "id,form_name"})
+    assert response.json() == [{"id": i, "form_name": f"desc-{n}.jpg"} for n, i in reversed(list(enumerate(ids)))]
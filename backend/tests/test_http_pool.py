@@ -0,0 +1,96 @@
+"""
+Model call retries and pool metrics (http_pool.py), against httpx.MockTransport.
+"""
+import time
+
+import httpx
+import pytest
+
+import http_pool
+from backends import OllamaBackend
+from http_pool import InstrumentedTransport, call_with_retries
+
+
+def scripted(*responses):
+    """A client that answers with the given (status, headers) in turn and records each request's timeout"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        status, headers = responses[min(len(requests), len(responses)) - 1]
+        body = {"message": {"content": "answer"}} if status == 200 else {"error": "busy"}
+        return httpx.Response(status, headers=headers, json=body)
+
+    return httpx.Client(transport=httpx.MockTransport(handler)), requests
+
+
+def get(client):
+    return lambda timeout: client.get("http://model.test/api", timeout=timeout).raise_for_status()
+
+
+def test_429_and_5xx_are_retried_until_success():
+    client, requests = scripted((503, {"retry-after": "0.01"}), (429, {"retry-after": "0.01"}), (200, {}))
+    assert call_with_retries(get(client), deadline=5).status_code == 200
+    assert len(requests) == 3
+
+
+def test_other_client_errors_are_not_retried():
+    client, requests = scripted((400, {}))
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_retries(get(client), deadline=5)
+    assert len(requests) == 1
+
+
+def test_retries_stop_after_max_retries():
+    client, requests = scripted((502, {"retry-after": "0.01"}))
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_retries(get(client), deadline=5, max_retries=2)
+    assert len(requests) == 3
+
+
+def test_retries_stop_at_the_deadline():
+    client, requests = scripted((503, {"retry-after": "0.2"}))
+    start = time.monotonic()
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_retries(get(client), deadline=0.3, max_retries=10)
+    # The second wait would end past the deadline, so the call gives up instead of sleeping
+    assert len(requests) == 2
+    assert time.monotonic() - start < 0.3
+
+
+def test_each_attempt_gets_what_is_left_of_the_deadline():
+    timeouts = []
+
+    def call(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) < 3:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert call_with_retries(call, deadline=10, base_delay=0.01) == "ok"
+    assert timeouts[0] <= 10 and timeouts[0] > timeouts[1] > timeouts[2]
+
+
+def test_ollama_backend_retries_through_the_shared_client():
+    client, requests = scripted((503, {"retry-after": "0.01"}), (200, {}))
+    backend = OllamaBackend()
+    backend.client = client
+    assert backend.complete("prompt", "aW1hZ2U=") == "answer"
+    assert len(requests) == 2 and requests[0].url.path == "/api/chat"
+
+
+def test_instrumented_transport_counts_responses_by_class():
+    statuses = iter([200, 503])
+    mock = httpx.MockTransport(lambda request: httpx.Response(next(statuses)))
+    instrumented = httpx.Client(transport=InstrumentedTransport(mock))
+    before = dict(http_pool.metrics.responses_by_status)
+    requests_before = http_pool.metrics.requests
+
+    instrumented.get("http://model.test/")
+    instrumented.get("http://model.test/")
+
+    after = http_pool.metrics.responses_by_status
+    assert after.get("2xx", 0) - before.get("2xx", 0) == 1
+    assert after.get("5xx", 0) - before.get("5xx", 0) == 1
+    assert http_pool.metrics.requests - requests_before == 2
+    assert http_pool.metrics.in_flight == 0
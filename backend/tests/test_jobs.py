@@ -0,0 +1,81 @@
+"""
+Job queue depth limit and lease ownership (jobs.JobQueue).
+
+The queues here run no workers of their own; jobs are written straight to
+the table where a test needs a given state.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+
+from database import async_session, engine, init_db, ExtractionJob, ExtractionResult
+from jobs import JobQueue, QueueFullError
+
+
+async def failing_handler(contents, filename, language):
+    return {"success": False, "error": "not run in tests"}
+
+
+def run(scenario):
+    async def with_fresh_connections():
+        try:
+            await init_db()
+            return await scenario()
+        finally:
+            # Pooled connections belong to this event loop
+            await engine.dispose()
+
+    return asyncio.run(with_fresh_connections())
+
+
+def test_concurrent_submits_stop_at_max_depth():
+    async def scenario():
+        queue = JobQueue(failing_handler, workers=0)
+        queue.max_depth = await queue.depth() + 3
+        outcomes = await asyncio.gather(
+            *(queue.submit(b"image", f"depth-{n}.jpg", "English") for n in range(10)), return_exceptions=True
+        )
+        async with async_session() as db:
+            await db.execute(delete(ExtractionJob).where(ExtractionJob.filename.like("depth-%")))
+            await db.commit()
+        return outcomes
+
+    outcomes = run(scenario)
+    assert sum(isinstance(outcome, dict) for outcome in outcomes) == 3
+    assert sum(isinstance(outcome, QueueFullError) for outcome in outcomes) == 7
+
+
+def test_only_the_worker_holding_a_job_saves_its_result():
+    async def save(db, job, result):
+        db.add(ExtractionResult(filename=job.filename, json_data="{}"))
+
+    async def saved(filename):
+        async with async_session() as db:
+            return (await db.execute(
+                select(func.count()).select_from(ExtractionResult).where(ExtractionResult.filename == filename)
+            )).scalar_one()
+
+    async def scenario():
+        queue = JobQueue(failing_handler, workers=0, on_complete=save)
+        # Taken over by another worker after this one's lease expired
+        job = ExtractionJob(id=str(uuid.uuid4()), status="running", filename="lease-lost.jpg", payload=b"image",
+                            claimed_by="another-worker", lease_expires_at=datetime.utcnow() + timedelta(minutes=5))
+        async with async_session() as db:
+            db.add(job)
+            await db.commit()
+
+        lost = await queue._finish(job, {"success": True}, status="completed")
+        lost_saves = await saved("lease-lost.jpg")
+
+        async with async_session() as db:
+            await db.execute(update(ExtractionJob).where(ExtractionJob.id == job.id).values(claimed_by=queue.worker_id))
+            await db.commit()
+        held = await queue._finish(job, {"success": True}, status="completed")
+        return lost, lost_saves, held, await saved("lease-lost.jpg"), await queue.get(job.id)
+
+    lost, lost_saves, held, saves, job = run(scenario)
+    assert lost is False and lost_saves == 0
+    assert held is True and saves == 1
+    assert job["status"] == "completed"
@@ -0,0 +1,61 @@
+"""
+Schema migrations (migrations.py) on a database from before any of them.
+
+Each run is a separate process, since the app's engine is bound to the
+test database when the module is imported.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+
+import migrations
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# extraction_results as the first releases created it
+BASELINE_SCHEMA = """
+CREATE TABLE extraction_results (
+    id INTEGER NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    json_data TEXT NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+INSERT INTO extraction_results VALUES (1, 'a.jpg', '{"Name": "Jane Doe"}', '2024-01-01 10:00:00', '2024-01-01 10:00:00');
+INSERT INTO extraction_results VALUES (2, 'b.jpg', '{"Name": "John Roe"}', '2024-01-02 10:00:00', '2024-01-02 10:00:00');
+"""
+
+
+def upgrade(path: str) -> str:
+    env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{path}", "MIGRATION_BATCH_PAUSE_SECONDS": "0"}
+    done = subprocess.run([sys.executable, "migrations.py", "upgrade"], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert done.returncode == 0, done.stderr
+    return done.stdout
+
+
+def test_upgrade_from_the_baseline_schema_then_nothing_to_do(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    with sqlite3.connect(path) as db:
+        db.executescript(BASELINE_SCHEMA)
+
+    assert f"Applied {len(migrations.MIGRATIONS)} migration(s)" in upgrade(path)
+
+    with sqlite3.connect(path) as db:
+        columns = {row[1] for row in db.execute("PRAGMA table_info(extraction_results)")}
+        assert {"processing_time", "file_size", "timings", "version"} <= columns
+        assert db.execute("SELECT id, filename, version FROM extraction_results ORDER BY id").fetchall() == [
+            (1, "a.jpg", 1), (2, "b.jpg", 1)
+        ]
+        assert db.execute("SELECT count(DISTINCT form_id) FROM form_fields").fetchone() == (2,)
+        assert "AUTOINCREMENT" in db.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'extraction_results'"
+        ).fetchone()[0]
+        indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"ix_extraction_results_filename", "ix_extraction_results_created_at"} <= indexes
+        applied = [row[0] for row in db.execute("SELECT version FROM schema_version ORDER BY version")]
+        assert applied == [migration.version for migration in migrations.MIGRATIONS]
+
+    assert "Applied 0 migration(s)" in upgrade(path)
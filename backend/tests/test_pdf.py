@@ -0,0 +1,72 @@
+"""
+PDF pages (pdf.py): render scale, merging per-page results and unreadable PDFs.
+"""
+import asyncio
+import io
+from concurrent.futures.process import BrokenProcessPool
+
+import pypdfium2 as pdfium
+import pytest
+from PIL import Image
+
+import pdf
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    pdf.shutdown_pool()
+
+
+def test_render_scale_is_the_dpi_until_the_page_gets_too_large():
+    # A4 in points
+    assert pdf.render_scale(595, 842, 144) == 2.0
+    scale = pdf.render_scale(595, 842, 600, max_pixels=1_000_000)
+    assert scale < 600 / 72
+    assert 999_000 < 595 * 842 * scale * scale <= 1_000_000
+
+
+def test_merge_keeps_identical_values_once_and_conflicts_per_page():
+    merged = pdf.merge_page_results([
+        {"Name": "Jane Doe", "Address": {"City": "Lisbon"}, "Page": 1},
+        {"Name": "Jane Doe", "Address": {"City": "Lisbon", "Zip": "1000"}, "Page": 2},
+        {"Page": 3},
+    ])
+    assert merged == {
+        "Name": "Jane Doe",
+        "Address": {"City": "Lisbon", "Zip": "1000"},
+        "Page": 1,
+        "Page (page 2)": 2,
+        "Page (page 3)": 3,
+    }
+
+
+def test_merge_skips_failed_pages_and_keeps_non_object_pages():
+    assert pdf.merge_page_results([None, {"Name": "Jane"}, "raw text"]) == {"Name": "Jane", "page 3": "raw text"}
+
+
+def test_unreadable_pdf_is_a_failed_result():
+    result = asyncio.run(pdf.extract_pdf(None, b"%PDF-1.4 not really a pdf", "broken.pdf"))
+    assert result["success"] is False
+    assert result["filename"] == "broken.pdf"
+    assert result["error"].startswith("Could not open PDF")
+
+
+@pytest.mark.parametrize("error", [BrokenProcessPool("worker died"), pdfium.PdfiumError("bad page"), OSError("disk")])
+def test_rendering_errors_are_failed_results(monkeypatch, error):
+    async def failing_rasterise(pdf_bytes):
+        raise error
+
+    monkeypatch.setattr(pdf, "rasterise_pdf", failing_rasterise)
+    result = asyncio.run(pdf.extract_pdf(None, b"%PDF", "broken.pdf"))
+    assert result["success"] is False and result["message"] == "Failed to read PDF"
+
+
+def test_pages_render_in_order():
+    buffer = io.BytesIO()
+    pages = [Image.new("RGB", (200, 100), color) for color in ("red", "green", "blue")]
+    pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:])
+
+    rendered = asyncio.run(pdf.rasterise_pdf(buffer.getvalue(), dpi=36))
+    corners = [Image.open(io.BytesIO(page)).convert("RGB").getpixel((10, 10)) for page in rendered]
+    assert [max(range(3), key=color.__getitem__) for color in corners] == [0, 1, 2]
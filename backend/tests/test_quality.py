@@ -0,0 +1,52 @@
+"""
+Quality gate thresholds and duplicate hashes (quality.py).
+
+The fixtures are 600x800 JPEG phone-style pages: pencil at 150 on 245 and
+170 on 240, pen at 110 on a dim 170 photo with darker corners, two lines of
+pen, and the same papers left blank.
+"""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import quality
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "quality")
+
+
+def load(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", ["pencil_light.jpg", "pencil_faint.jpg", "dim_photo.jpg", "sparse_pen.jpg"])
+def test_faint_handwriting_is_not_blank(name):
+    report = quality.assess(load(name))
+    assert report["verdict"] == "ok", report
+    assert report["ink_ratio"] >= quality.QUALITY_MIN_INK_RATIO
+
+
+@pytest.mark.parametrize("name", ["blank_paper.jpg", "blank_dim_photo.jpg"])
+def test_blank_pages_are_blank(name):
+    assert quality.assess(load(name))["verdict"] == "blank"
+
+
+def test_gate_flags_by_default():
+    assert quality.QUALITY_GATE == "flag"
+    assert quality.rejection_reason({"verdict": "blank", "reason": "Image looks blank"}) is None
+
+
+def test_different_pages_are_not_duplicates():
+    light, faint = quality.assess(load("pencil_light.jpg")), quality.assess(load("pencil_faint.jpg"))
+    assert quality.hash_distance(light["detail_hash"], faint["detail_hash"]) > quality.QUALITY_DUPLICATE_DETAIL_DISTANCE
+
+
+def test_rescaled_copy_is_a_duplicate():
+    original = quality.assess(load("pencil_light.jpg"))
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(load("pencil_light.jpg"))).resize((450, 600)).save(buffer, format="JPEG", quality=70)
+    copy = quality.assess(buffer.getvalue())
+    assert quality.hash_distance(original["phash"], copy["phash"]) <= quality.QUALITY_DUPLICATE_DISTANCE
+    assert quality.hash_distance(original["detail_hash"], copy["detail_hash"]) <= quality.QUALITY_DUPLICATE_DETAIL_DISTANCE
@@ -0,0 +1,32 @@
+"""
+/forms/search: the FTS5 index and the LIKE fallback answer a query the same way.
+"""
+import pytest
+
+import search
+from test_forms import create
+
+
+@pytest.fixture(scope="module")
+def forms(client):
+    return {
+        "both": create(client, "search-both.jpg", {"Name": "Quentin Zebrowski", "City": "Lisbon"}),
+        "name": create(client, "search-name.jpg", {"Name": "Quentin Marlowe", "City": "Porto"}),
+        "city": create(client, "search-city.jpg", {"Name": "Ana Souza", "City": "Lisbon"}),
+    }
+
+
+@pytest.mark.parametrize("fts", [True, False], ids=["fts5", "like"])
+def test_every_term_must_match(client, forms, monkeypatch, fts):
+    if fts and not search._fts_enabled:
+        pytest.skip("SQLite built without FTS5")
+    monkeypatch.setattr(search, "_fts_enabled", fts)
+
+    def found(query):
+        return {form["id"] for form in client.get("/forms/search", params={"q": query}).json()}
+
+    assert found("quentin lisbon") == {forms["both"]}
+    assert found("quentin") == {forms["both"], forms["name"]}
+    assert found("zebrowski porto") == set()
+    assert found("QUENTIN") == found("quentin")
+
@@ -0,0 +1,30 @@
+"""
+Merging the JSON read from overlapping tiles (tiling.merge_results).
+"""
+import tiling
+
+
+def test_value_cut_by_a_tile_edge_keeps_the_complete_reading():
+    assert tiling.merge_results([{"Name": "Jane"}, {"name": "Jane Doe"}]) == {"Name": "Jane Doe"}
+    assert tiling.merge_results([{"Street": "Main Street"}, {"Street": "12 Main Street"}]) == {"Street": "12 Main Street"}
+
+
+def test_numbers_that_contain_each_other_are_both_kept():
+    assert tiling.merge_results([{"Amount": "5"}, {"Amount": "15"}]) == {"Amount": "5", "Amount (2)": "15"}
+    assert tiling.merge_results([{"Amount": "15"}, {"Amount": "150"}]) == {"Amount": "15", "Amount (2)": "150"}
+
+
+def test_unreadable_gives_way_to_a_reading():
+    assert tiling.merge_results([{"Date": "unreadable"}, {"Date": "2024-01-15"}]) == {"Date": "2024-01-15"}
+
+
+def test_nested_objects_and_lists_merge():
+    merged = tiling.merge_results([
+        {"Address": {"City": "Springfield"}, "Items": ["X-ray"]},
+        {"Address": {"Postcode": "12345"}, "Items": ["X-ray", "Prescription"]},
+    ])
+    assert merged == {"Address": {"City": "Springfield", "Postcode": "12345"}, "Items": ["X-ray", "Prescription"]}
+
+
+def test_raw_text_from_each_tile_is_joined():
+    assert tiling.merge_results(["top half", "bottom half"]) == {"raw_text": "top half\nbottom half"}
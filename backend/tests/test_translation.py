@@ -0,0 +1,70 @@
+"""
+Phrase translation (translation.py): splitting, chunking and the cache-then-LLM flow.
+"""
+import json
+
+import translation
+from translation import PhraseCache, Translator, chunk_phrases, estimate_tokens, split_phrase
+
+
+class StubModel:
+    """Answers every prompt by prefixing each string with "en:"; records the strings it was asked for"""
+
+    def __init__(self):
+        self.asked = []
+
+    def __call__(self, prompt: str) -> str:
+        phrases = json.loads(prompt[prompt.rindex("["):])
+        self.asked.append(phrases)
+        return json.dumps([f"en:{phrase}" for phrase in phrases])
+
+
+def test_split_phrase_cuts_at_spaces_within_the_budget():
+    phrase = " ".join(f"word{n}" for n in range(40))
+    pieces = split_phrase(phrase, budget=10)
+    assert " ".join(pieces) == phrase
+    assert all(estimate_tokens(piece) <= 10 for piece in pieces)
+    assert split_phrase("short", budget=10) == ["short"]
+
+
+def test_split_phrase_cuts_a_long_word_by_characters():
+    pieces = split_phrase("é" * 40, budget=10)
+    assert "".join(pieces) == "é" * 40
+    assert all(len(piece.encode("utf-8")) <= 18 for piece in pieces)
+
+
+def test_chunk_phrases_keeps_each_chunk_under_the_budget():
+    phrases = [f"phrase number {n}" for n in range(20)]
+    chunks = chunk_phrases(phrases, budget=30)
+    assert [phrase for chunk in chunks for phrase in chunk] == phrases
+    assert all(sum(estimate_tokens(phrase) for phrase in chunk) <= 30 for chunk in chunks)
+    assert len(chunks) > 1
+
+
+def test_translate_calls_the_model_only_for_uncached_phrases(tmp_path):
+    model = StubModel()
+    translator = Translator(model, PhraseCache(str(tmp_path / "cache.db")))
+    data = {"Nombre": "Juana", "Items": [{"Nombre": "Pan"}], "Total": "12.50"}
+
+    assert translator.translate(data, "Spanish") == {
+        "en:Nombre": "en:Juana", "en:Items": [{"en:Nombre": "en:Pan"}], "en:Total": "12.50"
+    }
+    assert model.asked == [["Nombre", "Juana", "Items", "Pan", "Total"]]
+
+    translator.translate({"Nombre": "Pedro"}, "Spanish")
+    assert model.asked[-1] == ["Pedro"]
+    assert translator.stats()["llm_requests"] == 2
+
+
+def test_a_piece_that_is_also_a_phrase_keeps_its_translation(tmp_path, monkeypatch):
+    monkeypatch.setattr(translation, "TRANSLATION_CHUNK_TOKENS", 10)
+    model = StubModel()
+    cache = PhraseCache(str(tmp_path / "cache.db"))
+    translator = Translator(model, cache)
+    long_phrase = "uno dos tres cuatro cinco seis siete ocho"
+    piece = split_phrase(long_phrase, budget=10)[0]
+
+    translated = translator.translate({"Nota": long_phrase, "Otra": piece}, "Spanish")
+    assert translated["en:Otra"] == f"en:{piece}"
+    assert translated["en:Nota"].startswith(f"en:{piece} en:")
+    assert cache.get_many("Spanish", [piece]) == {piece: f"en:{piece}"}
@@ -0,0 +1,20 @@
+"""
+Uploads are parsed in memory: no temporary files, whatever their size.
+"""
+import tempfile
+
+
+def test_upload_over_a_megabyte_never_touches_disk(client, monkeypatch):
+    opened = []
+    real_temporary_file = tempfile.TemporaryFile
+
+    def recording_temporary_file(*args, **kwargs):
+        opened.append(args)
+        return real_temporary_file(*args, **kwargs)
+
+    # SpooledTemporaryFile rolls over into a TemporaryFile once it outgrows memory
+    monkeypatch.setattr(tempfile, "TemporaryFile", recording_temporary_file)
+    response = client.post("/upload", files={"file": ("big.png", b"\0" * (2 * 1024 * 1024), "image/png")})
+
+    assert response.status_code != 413
+    assert opened == []
@@ -0,0 +1,172 @@
+"""
+Tiled extraction helpers: where to cut a page and how to merge the
+per-tile answers back into one JSON document.
+
+With EXTRACTION_TILES=grid the page is cut into TILE_ROWS x TILE_COLS
+equal cells. With EXTRACTION_TILES=layout it is cut into TILE_ROWS
+horizontal bands whose edges are moved to the nearest blank row, so lines
+of writing are not split. In both modes each tile reaches TILE_OVERLAP of
+its size into its neighbours, so nothing on a cut line is lost. Fields
+that appear in two tiles are de-duplicated by merge_results.
+"""
+import os
+import re
+import json
+from typing import Any, Dict, List, Tuple
+from PIL import Image
+
+EXTRACTION_TILES = os.getenv("EXTRACTION_TILES", "off").lower()  # off | grid | layout
+TILE_ROWS = int(os.getenv("TILE_ROWS", "2"))
+TILE_COLS = int(os.getenv("TILE_COLS", "1"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.08"))
+# Pages whose longest side is shorter than this are sent whole
+TILE_MIN_SIDE = int(os.getenv("TILE_MIN_SIDE", "2000"))
+
+# A row whose mean brightness is within this of the paper's counts as blank
+BLANK_ROW_TOLERANCE = 4
+UNREADABLE = {"", "unreadable", "illegible", "n/a", "none"}
+
+Box = Tuple[int, int, int, int]
+
+
+def tiling_enabled() -> bool:
+    return EXTRACTION_TILES in ("grid", "layout") and TILE_ROWS * TILE_COLS > 1
+
+
+def _with_overlap(start: int, end: int, limit: int, overlap: float) -> Tuple[int, int]:
+    margin = int((end - start) * overlap)
+    return max(0, start - margin), min(limit, end + margin)
+
+
+def grid_boxes(size: Tuple[int, int], rows: int = TILE_ROWS, cols: int = TILE_COLS, overlap: float = TILE_OVERLAP) -> List[Box]:
+    width, height = size
+    boxes = []
+    for row in range(rows):
+        top, bottom = _with_overlap(row * height // rows, (row + 1) * height // rows, height, overlap)
+        for col in range(cols):
+            left, right = _with_overlap(col * width // cols, (col + 1) * width // cols, width, overlap)
+            boxes.append((left, top, right, bottom))
+    return boxes
+
+
+def layout_boxes(image: Image.Image, rows: int = TILE_ROWS, overlap: float = TILE_OVERLAP) -> List[Box]:
+    """Horizontal bands cut at the blank rows nearest to equal divisions"""
+    width, height = image.size
+    # One mean brightness per row, from a column-averaged copy
+    profile = list(image.convert("L").resize((1, height), Image.Resampling.BOX).tobytes())
+    paper = sorted(profile)[int(len(profile) * 0.9)]
+    blank = [value >= paper - BLANK_ROW_TOLERANCE for value in profile]
+
+    cuts = [0]
+    window = height // (2 * rows)
+    for band in range(1, rows):
+        target = band * height // rows
+        candidates = [y for y in range(max(cuts[-1] + 1, target - window), min(height, target + window)) if blank[y]]
+        cuts.append(min(candidates, key=lambda y: abs(y - target)) if candidates else target)
+    cuts.append(height)
+
+    boxes = []
+    for top, bottom in zip(cuts, cuts[1:]):
+        top, bottom = _with_overlap(top, bottom, height, overlap)
+        boxes.append((0, top, width, bottom))
+    return boxes
+
+
+def should_tile(size: Tuple[int, int]) -> bool:
+    return tiling_enabled() and max(size) >= TILE_MIN_SIDE
+
+
+def tile_count() -> int:
+    if not tiling_enabled():
+        return 1
+    return TILE_ROWS if EXTRACTION_TILES == "layout" else TILE_ROWS * TILE_COLS
+
+
+def plan_tiles(image: Image.Image) -> List[Box]:
+    if EXTRACTION_TILES == "layout":
+        return layout_boxes(image, TILE_ROWS, TILE_OVERLAP)
+    return grid_boxes(image.size, TILE_ROWS, TILE_COLS, TILE_OVERLAP)
+
+
+def _norm_key(key: str) -> str:
+    return re.sub(r"[^0-9a-z]+", "_", str(key).lower()).strip("_")
+
+
+def _norm_value(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return re.sub(r"\s+", " ", str(value)).strip().lower()
+
+
+_CONFLICT = object()
+
+
+def _better_value(current: Any, new: Any) -> Any:
+    """Pick between two readings of the same field from overlapping tiles, or _CONFLICT if they differ"""
+    if isinstance(current, dict) and isinstance(new, dict):
+        return _merge_dicts(current, new)
+    if isinstance(current, list) and isinstance(new, list):
+        return _merge_lists(current, new)
+    if _norm_value(current) in UNREADABLE:
+        return new
+    if _norm_value(new) in UNREADABLE:
+        return current
+    short, long = sorted((_norm_value(current), _norm_value(new)), key=len)
+    if short == long or _is_cut_reading(short, long):
+        return new if long == _norm_value(new) else current
+    return _CONFLICT
+
+
+def _is_cut_reading(short: str, long: str) -> bool:
+    """Whether short reads as long cut off by a tile edge: its start or its end.
+
+    A number is not taken for part of a longer one ("5" and "15" are two readings),
+    since a tile edge does not split the digits of one number.
+    """
+    if long.startswith(short) and not (short[-1:].isdigit() and long[len(short)].isdigit()):
+        return True
+    if long.endswith(short) and not (short[:1].isdigit() and long[-len(short) - 1].isdigit()):
+        return True
+    return False
+
+
+def _merge_lists(current: List[Any], new: List[Any]) -> List[Any]:
+    seen = {_norm_value(item) for item in current}
+    merged = list(current)
+    for item in new:
+        if _norm_value(item) not in seen:
+            seen.add(_norm_value(item))
+            merged.append(item)
+    return merged
+
+
+def _merge_dicts(current: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(current)
+    keys = {_norm_key(key): key for key in merged}
+    for key, value in new.items():
+        existing = keys.get(_norm_key(key))
+        if existing is None:
+            merged[key] = value
+            keys[_norm_key(key)] = key
+            continue
+        better = _better_value(merged[existing], value)
+        if better is not _CONFLICT:
+            merged[existing] = better
+        elif _norm_key(key) == "raw_text":
+            merged[existing] = f"{merged[existing]}\n{value}"
+        else:
+            # Same label in two parts of the page (e.g. two Date fields): keep both
+            number = 2
+            while _norm_key(f"{key} ({number})") in keys:
+                number += 1
+            merged[f"{key} ({number})"] = value
+            keys[_norm_key(f"{key} ({number})")] = f"{key} ({number})"
+    return merged
+
+
+def merge_results(parts: List[Any]) -> Dict[str, Any]:
+    """Merge per-tile JSON, top to bottom; keys match ignoring case and punctuation"""
+    merged: Dict[str, Any] = {}
+    for part in parts:
+        merged = _merge_dicts(merged, part if isinstance(part, dict) else {"raw_text": part})
+    return merged
@@ -0,0 +1,107 @@
+"""
+Langfuse tracing off the request path.
+
+record() only samples and enqueues, so a slow or unreachable Langfuse
+never adds to extraction latency. A daemon thread drains the bounded queue
+in batches and hands them to the Langfuse client; when the queue is full
+new events are dropped and counted rather than blocking or growing memory.
+"""
+import os
+import time
+import queue
+import random
+import threading
+from typing import Any, Dict, List, Optional
+from metrics import Counter
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_QUEUE_MAX = int(os.getenv("TRACE_QUEUE_MAX", "1000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "50"))
+TRACE_FLUSH_INTERVAL_SECONDS = float(os.getenv("TRACE_FLUSH_INTERVAL_SECONDS", "2"))
+
+TRACE_EVENTS = Counter("trace_events_total", "Langfuse trace events by outcome", ("outcome",))
+
+
+class TraceBuffer:
+    def __init__(self, langfuse, sample_rate: float = TRACE_SAMPLE_RATE, max_queue: int = TRACE_QUEUE_MAX,
+                 batch_size: int = TRACE_BATCH_SIZE, flush_interval: float = TRACE_FLUSH_INTERVAL_SECONDS):
+        self.langfuse = langfuse
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counts = {"recorded": 0, "sampled_out": 0, "dropped": 0, "sent": 0, "failed": 0}
+        # Counts are updated from request threads and the flusher
+        self._counts_lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="trace-flusher", daemon=True)
+        self._thread.start()
+
+    def record(self, name: str, input: Dict[str, Any], output: Dict[str, Any]):
+        """Queue one trace; never blocks"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._count("sampled_out")
+            return
+        try:
+            # Shallow copy: callers keep adding keys (form_id, timings) to the result after tracing
+            self._queue.put_nowait({"name": name, "input": input, "output": dict(output)})
+        except queue.Full:
+            self._count("dropped")
+            return
+        self._count("recorded")
+
+    def _count(self, outcome: str, amount: int = 1):
+        with self._counts_lock:
+            self.counts[outcome] += amount
+        TRACE_EVENTS.inc(amount, outcome=outcome)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch: List[Dict[str, Any]]):
+        sent = 0
+        for event in batch:
+            try:
+                trace = self.langfuse.trace(name=event["name"])  # type: ignore
+                trace.update(input=event["input"], output=event["output"])
+                sent += 1
+            except Exception as e:
+                print(f"[WARNING] Langfuse trace failed: {e}")
+        try:
+            self.langfuse.flush()
+        except Exception as e:
+            print(f"[WARNING] Langfuse flush failed: {e}")
+            sent = 0
+        self._count("sent", sent)
+        if len(batch) - sent:
+            self._count("failed", len(batch) - sent)
+
+    def stop(self, timeout: float = 5.0):
+        """Send what is queued (up to timeout) and stop the flusher"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {**counts, "queued": self._queue.qsize(), "sample_rate": self.sample_rate}
@@ -0,0 +1,280 @@
+"""
+Phrase-level translation of extracted JSON with a persistent cache.
+
+Instead of sending the whole document to the LLM, every key and string
+value is looked up in a (language, phrase) cache first. Only phrases not
+seen before are translated, as one JSON-array request per document, or
+several when the phrases would not fit under the model's max_tokens.
+
+The cache lives in its own SQLite file because translation runs on the
+extraction worker threads, which have no event loop for the async engine.
+By default the file sits next to the SQLite database, on the same volume.
+
+A phrase too long for one request on its own is split at spaces into
+pieces that fit, and the translated pieces are joined again.
+"""
+import os
+import re
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+from sqlalchemy.engine import make_url
+from database import DATABASE_URL
+from metrics import Counter
+
+
+def default_cache_path() -> str:
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return os.path.join(os.path.dirname(url.database), "translation_cache.db")
+    return "translation_cache.db"
+
+
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH") or default_cache_path()
+TRANSLATION_CACHE_MAX_MEMORY = int(os.getenv("TRANSLATION_CACHE_MAX_MEMORY", "5000"))
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "mixtral-8x7b-32768")
+TRANSLATION_MAX_TOKENS = int(os.getenv("TRANSLATION_MAX_TOKENS", "2000"))
+# Output is roughly as long as the input, so keep each chunk's input well under max_tokens
+TRANSLATION_CHUNK_TOKENS = int(os.getenv("TRANSLATION_CHUNK_TOKENS", str(TRANSLATION_MAX_TOKENS * 3 // 4)))
+
+TRANSLATION_LOOKUPS = Counter("translation_cache_lookups_total", "Phrase translation cache lookups by result", ("result",))
+
+# Kept as is: no letters to translate, or the model was told to leave it alone
+_UNTRANSLATABLE = re.compile(r"^[\W\d_]*$", re.UNICODE)
+_KEEP_AS_IS = {"unreadable"}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~3 UTF-8 bytes per token holds for Latin text and over-counts safely for other scripts
+    return len(text.encode("utf-8")) // 3 + 4
+
+
+def needs_translation(text: str) -> bool:
+    return bool(text.strip()) and not _UNTRANSLATABLE.match(text) and text.strip().lower() not in _KEEP_AS_IS
+
+
+def collect_phrases(data: Any) -> List[str]:
+    """Every translatable key and string value in document order, without duplicates"""
+    phrases: Dict[str, None] = {}
+    _collect(data, phrases)
+    return list(phrases)
+
+
+def _collect(data: Any, phrases: Dict[str, None]):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if needs_translation(key):
+                phrases.setdefault(key)
+            _collect(value, phrases)
+    elif isinstance(data, list):
+        for value in data:
+            _collect(value, phrases)
+    elif isinstance(data, str) and needs_translation(data):
+        phrases.setdefault(data)
+
+
+def apply_translations(data: Any, translations: Dict[str, str]) -> Any:
+    if isinstance(data, dict):
+        translated = {}
+        for key, value in data.items():
+            new_key = translations.get(key, key)
+            # Two source labels can translate to the same English one; keep both
+            if new_key in translated:
+                new_key = key
+            translated[new_key] = apply_translations(value, translations)
+        return translated
+    if isinstance(data, list):
+        return [apply_translations(value, translations) for value in data]
+    if isinstance(data, str):
+        return translations.get(data, data)
+    return data
+
+
+def split_phrase(phrase: str, budget: int = TRANSLATION_CHUNK_TOKENS) -> List[str]:
+    """Pieces of phrase that each fit in budget tokens, cut at spaces where possible"""
+    # Bytes one piece may hold, by the same rule as estimate_tokens
+    limit = max((budget - 4) * 3, 3)
+    pieces: List[str] = []
+    current = ""
+    for word in re.findall(r"\S+\s*", phrase):
+        if current and len((current + word).encode("utf-8")) > limit:
+            pieces.append(current)
+            current = ""
+        while len(word.encode("utf-8")) > limit:
+            # A single word longer than the budget: cut it by characters
+            cut = len(word.encode("utf-8")[:limit].decode("utf-8", "ignore"))
+            pieces.append(word[:cut])
+            word = word[cut:]
+        current += word
+    if current:
+        pieces.append(current)
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def chunk_phrases(phrases: List[str], budget: int = TRANSLATION_CHUNK_TOKENS) -> List[List[str]]:
+    """Group phrases so each request's estimated size stays under budget tokens"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for phrase in phrases:
+        cost = estimate_tokens(phrase)
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(phrase)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class PhraseCache:
+    """(language, phrase) -> English, in an in-memory LRU in front of a SQLite table"""
+
+    def __init__(self, path: str = TRANSLATION_CACHE_PATH, max_memory: int = TRANSLATION_CACHE_MAX_MEMORY):
+        self.max_memory = max_memory
+        self._memory: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS phrase_translations ("
+            "language TEXT NOT NULL, source TEXT NOT NULL, translation TEXT NOT NULL, "
+            "PRIMARY KEY (language, source))"
+        )
+        self._db.commit()
+
+    def get_many(self, language: str, phrases: List[str]) -> Dict[str, str]:
+        language = language.lower()
+        found: Dict[str, str] = {}
+        with self._lock:
+            missing = []
+            for phrase in phrases:
+                translation = self._memory.get((language, phrase))
+                if translation is None:
+                    missing.append(phrase)
+                else:
+                    self._memory.move_to_end((language, phrase))
+                    found[phrase] = translation
+            # SQLite allows 999 bound parameters per statement
+            for start in range(0, len(missing), 900):
+                batch = missing[start:start + 900]
+                rows = self._db.execute(
+                    f"SELECT source, translation FROM phrase_translations WHERE language = ? AND source IN ({','.join('?' * len(batch))})",
+                    [language, *batch]
+                ).fetchall()
+                for source, translation in rows:
+                    found[source] = translation
+                    self._remember(language, source, translation)
+            hits = len(found)
+            self.hits += hits
+            self.misses += len(phrases) - hits
+        TRANSLATION_LOOKUPS.inc(hits, result="hit")
+        TRANSLATION_LOOKUPS.inc(len(phrases) - hits, result="miss")
+        return found
+
+    def put_many(self, language: str, translations: Dict[str, str]):
+        language = language.lower()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO phrase_translations (language, source, translation) VALUES (?, ?, ?)",
+                [(language, source, translation) for source, translation in translations.items()]
+            )
+            self._db.commit()
+            for source, translation in translations.items():
+                self._remember(language, source, translation)
+
+    def _remember(self, language: str, source: str, translation: str):
+        self._memory[(language, source)] = translation
+        self._memory.move_to_end((language, source))
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def build_prompt(phrases: List[str], source_language: str) -> str:
+    return f"""You are a translation assistant. Translate each string in the following JSON array from {source_language} to English.
+
+IMPORTANT RULES:
+1. Return ONLY a JSON array of strings with exactly {len(phrases)} items, in the same order
+2. Keep all numbers, dates, and special characters unchanged
+3. Do not translate strings that are already in English; return them unchanged
+4. If a string is "unreadable", keep it as is
+
+Strings to translate:
+{json.dumps(phrases, ensure_ascii=False)}"""
+
+
+class Translator:
+    """Translates extracted JSON to English phrase by phrase, calling the LLM only for uncached phrases"""
+
+    def __init__(self, complete: Callable[[str], str], cache: PhraseCache):
+        # complete(prompt) -> model answer text
+        self.complete = complete
+        self.cache = cache
+        self.requests = 0
+        # Translations run on worker threads, several at a time
+        self._requests_lock = threading.Lock()
+
+    def translate(self, data: Any, source_language: str) -> Any:
+        phrases = collect_phrases(data)
+        if not phrases:
+            return data
+
+        translations = self.cache.get_many(source_language, phrases)
+        missing = {phrase: None for phrase in phrases if phrase not in translations}
+        oversized = {phrase: split_phrase(phrase, TRANSLATION_CHUNK_TOKENS) for phrase in missing
+                     if estimate_tokens(phrase) > TRANSLATION_CHUNK_TOKENS}
+        requested = [piece for phrase in missing for piece in oversized.get(phrase, [phrase])]
+        fresh: Dict[str, str] = {}
+        for chunk in chunk_phrases(list(dict.fromkeys(requested)), TRANSLATION_CHUNK_TOKENS):
+            fresh.update(self._translate_chunk(chunk, source_language))
+        for phrase, pieces in oversized.items():
+            if all(piece in fresh for piece in pieces):
+                fresh[phrase] = " ".join(fresh[piece] for piece in pieces)
+            else:
+                print(f"[WARNING] Part of a {len(pieces)}-piece phrase was not translated; leaving it as is")
+            # A piece that is also a phrase of its own keeps its translation
+            for piece in pieces:
+                if piece not in missing:
+                    fresh.pop(piece, None)
+        if fresh:
+            self.cache.put_many(source_language, fresh)
+            translations.update(fresh)
+        return apply_translations(data, translations)
+
+    def _translate_chunk(self, phrases: List[str], source_language: str) -> Dict[str, str]:
+        with self._requests_lock:
+            self.requests += 1
+        answer = self.complete(build_prompt(phrases, source_language)).strip()
+        if answer.startswith("```"):
+            answer = answer.strip("`").removeprefix("json").strip()
+        try:
+            translated = json.loads(answer)
+        except json.JSONDecodeError:
+            print(f"[WARNING] Translation answer was not JSON; leaving {len(phrases)} phrases untranslated")
+            return {}
+        if not isinstance(translated, list) or len(translated) != len(phrases):
+            print(f"[WARNING] Translation returned {len(translated) if isinstance(translated, list) else 'no'} items "
+                  f"for {len(phrases)} phrases; leaving them untranslated")
+            return {}
+        return {source: str(target) for source, target in zip(phrases, translated) if isinstance(target, (str, int, float))}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "llm_requests": self.requests}
@@ -11,6 +11,8 @@ export default defineConfig({
       '/api': {
         target: process.env.BACKEND_URL || 'http://localhost:8000',
         changeOrigin: true,
+        // Send X-Forwarded-For so the backend rate-limits each browser, not the proxy
+        xfwd: true,
         rewrite: (path) => path.replace(/^\/api/, '')
       }
     }